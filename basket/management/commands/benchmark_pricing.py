@@ -0,0 +1,101 @@
+import random
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from basket import pricing
+
+
+def build_offers(offer_count):
+    condition_types = ("count", "value", "coverage")
+    benefit_types = ("percentage", "absolute", "multibuy", "fixed-price")
+    offers = {}
+    for pk in range(1, offer_count + 1):
+        condition_type = random.choice(condition_types)
+        benefit_type = random.choice(benefit_types)
+        offers[pk] = pricing.OfferRule(
+            pk=pk,
+            condition_type=condition_type,
+            condition_value={
+                "count": Decimal(random.randint(1, 10)),
+                "value": Decimal(random.randint(10, 1000)),
+                "coverage": Decimal(random.randint(1, 5)),
+            }[condition_type],
+            benefit_type=benefit_type,
+            benefit_value={
+                "percentage": Decimal(random.randint(1, 50)),
+                "absolute": Decimal(random.randint(1, 100)),
+                "multibuy": Decimal(0),
+                "fixed-price": Decimal(random.randint(100, 1000)),
+            }[benefit_type],
+            order_limit=random.randint(0, 3),
+        )
+    return offers
+
+
+def build_basket(line_count, offer_pks):
+    lines = []
+    for unit_id in range(1, line_count + 1):
+        lines.append(
+            pricing.Line(
+                unit_id=unit_id,
+                quantity=Decimal(random.randint(1, 5000)) / 1000,
+                # some product units are out of stock
+                price=(
+                    Decimal(random.randint(10, 50000)) / 100
+                    if random.random() > 0.05
+                    else None
+                ),
+                condition_offers=frozenset(
+                    random.sample(offer_pks, k=random.randint(0, 3))
+                ),
+                benefit_offers=frozenset(
+                    random.sample(offer_pks, k=random.randint(0, 3))
+                ),
+            )
+        )
+    return lines
+
+
+class Command(BaseCommand):
+    help = "Измерение скорости расчёта скидок для корзин разного размера."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000],
+            help="Basket sizes (lines per basket)",
+        )
+        parser.add_argument(
+            "--offers",
+            type=int,
+            default=20,
+            help="Number of offers in the offer table",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Number of timing runs (the best one is reported)",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, sizes, offers, repeat, seed, *args, **options):
+        random.seed(seed)
+        offer_table = build_offers(offers)
+        offer_pks = list(offer_table.keys())
+
+        for size in sizes:
+            basket = build_basket(size, offer_pks)
+            timer = timeit.Timer(
+                lambda basket=basket: pricing.price_basket(basket, offer_table)
+            )
+            number, _ = timer.autorange()
+            best = min(timer.repeat(repeat=repeat, number=number)) / number
+            self.stdout.write(
+                f"{size:>6} lines: {best * 1000:10.3f} ms per basket, "
+                f"{1 / best:10.1f} baskets/s"
+            )
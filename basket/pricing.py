@@ -0,0 +1,186 @@
+"""
+Basket pricing engine.
+
+Works on plain tuples and does not touch the database, so that a basket can be
+priced with data prepared beforehand (see `basket.views.OfferMixin`), and many
+baskets can be priced with the same compiled offer table.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import (
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+
+class PricingError(ValueError):
+    pass
+
+
+class Line(NamedTuple):
+    unit_id: int
+    quantity: Decimal
+    # `None` if the product unit is not in stock in a given shop
+    price: Optional[Decimal]
+    # offers which condition (or benefit) range includes the product unit
+    condition_offers: FrozenSet[int] = frozenset()
+    benefit_offers: FrozenSet[int] = frozenset()
+
+
+class OfferRule(NamedTuple):
+    pk: int
+    # types are keys of `discounts.models.Condition.TYPES`
+    # and `discounts.models.Benefit.TYPES`
+    condition_type: str
+    condition_value: Decimal
+    benefit_type: str
+    benefit_value: Decimal
+    # 0 means no limit
+    order_limit: int = 0
+
+
+class PricedLine(NamedTuple):
+    unit_id: int
+    discounted_price: Optional[Decimal]
+    # (offer Id, apply times) pairs
+    offers: Tuple[Tuple[int, int], ...]
+
+
+def compile_offers(offers: Iterable) -> Dict[int, OfferRule]:
+    """
+    Build an offer table from `Offer` objects (with `condition` and `benefit`
+    selected), preserving their order.
+    """
+    return {
+        offer.pk: OfferRule(
+            pk=offer.pk,
+            condition_type=offer.condition.type,
+            condition_value=offer.condition.value,
+            benefit_type=offer.benefit.type,
+            benefit_value=offer.benefit.value,
+            order_limit=offer.order_limit,
+        )
+        for offer in offers
+    }
+
+
+def count_applications(rule: OfferRule, lines: Sequence[Line]) -> int:
+    """How many times an offer may be applied to its condition lines."""
+    match rule.condition_type:
+        case "value":
+            in_basket = sum(
+                (x.quantity * x.price for x in lines if x.price is not None),
+                Decimal("0.00"),
+            )
+        case "count":
+            in_basket = sum((x.quantity for x in lines), Decimal("0.000"))
+        case "coverage":
+            in_basket = len(lines)
+        case unknown:  # noqa: F821
+            raise PricingError(f"Unknown condition type: {unknown}")  # noqa: F821
+
+    # condition value should not be 0
+    if rule.condition_value <= 0:
+        return 0
+    apply_times = int(in_basket // rule.condition_value)
+
+    # abide offer limit per purchase
+    if rule.order_limit > 0:
+        apply_times = min(apply_times, rule.order_limit)
+    return max(apply_times, 0)
+
+
+def apply_benefit(
+    rule: OfferRule,
+    apply_times: int,
+    lines: Sequence[Line],
+    prices: Dict[int, Decimal],
+):
+    """
+    Discount `prices` (line position to unit price) of the priced benefit
+    `lines` in place.
+    """
+    match rule.benefit_type:
+        case "percentage":
+            factor = ((100 - rule.benefit_value) / 100) ** apply_times
+            for position in prices:
+                prices[position] *= factor
+        case "absolute" | "fixed-price":
+            full_total = sum(
+                (prices[position] * lines[position].quantity for position in prices),
+                Decimal("0.00"),
+            )
+            if full_total <= 0:
+                return
+            if rule.benefit_type == "absolute":
+                target_total = full_total - rule.benefit_value * apply_times
+            else:
+                target_total = rule.benefit_value * apply_times
+            # share the discount proportionally to line totals, never going
+            # below zero or above the full price
+            factor = min(max(target_total, Decimal(0)), full_total) / full_total
+            for position in prices:
+                prices[position] *= factor
+        case "multibuy":
+            if prices:
+                cheapest = min(
+                    prices,
+                    key=lambda position: prices[position] * lines[position].quantity,
+                )
+                prices[cheapest] = Decimal("0.00")
+        case unknown:  # noqa: F821
+            raise PricingError(f"Unknown benefit type: {unknown}")  # noqa: F821
+
+
+def price_basket(
+    lines: Sequence[Line],
+    offers: Mapping[int, OfferRule],
+) -> List[PricedLine]:
+    """
+    Apply offers to basket lines. Returns priced lines in the same order.
+
+    Offers are evaluated against the full prices, then their benefits are
+    applied in the order of `offers`.
+    """
+    condition_lines, benefit_positions = defaultdict(list), defaultdict(list)
+    for position, line in enumerate(lines):
+        for offer_pk in line.condition_offers:
+            condition_lines[offer_pk].append(line)
+        for offer_pk in line.benefit_offers:
+            benefit_positions[offer_pk].append(position)
+
+    # decide how many times each offer may be applied
+    applied = {}
+    for offer_pk, rule in offers.items():
+        apply_times = count_applications(rule, condition_lines[offer_pk])
+        if apply_times > 0:
+            applied[offer_pk] = apply_times
+
+    # calculate discounted prices
+    prices = [line.price for line in lines]
+    line_offers = [[] for _ in lines]
+    for offer_pk, apply_times in applied.items():
+        positions = benefit_positions[offer_pk]
+        benefit_prices = {x: prices[x] for x in positions if prices[x] is not None}
+        apply_benefit(offers[offer_pk], apply_times, lines, benefit_prices)
+        for position, price in benefit_prices.items():
+            prices[position] = price
+        for position in positions:
+            line_offers[position].append((offer_pk, apply_times))
+
+    return [
+        PricedLine(
+            unit_id=line.unit_id,
+            # align the decimal point
+            discounted_price=None if price is None else round(price, 2),
+            offers=tuple(offers_applied),
+        )
+        for line, price, offers_applied in zip(lines, prices, line_offers)
+    ]
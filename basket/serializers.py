@@ -1,15 +1,11 @@
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
-from django.contrib.postgres.expressions import ArrayField, ArraySubquery
-from django.db.models import BigAutoField, DecimalField, OuterRef, Subquery
 from rest_framework import serializers
 from rest_framework_nested.serializers import NestedHyperlinkedRelatedField
 
 from discounts.models import LoyaltyCard, Voucher
-from internal_api.models import Warehouse
 from products.models import ProductUnit
-from utils.models_utils import build_offer_subquery
 
 
 class BasketOfferSerializer(serializers.Serializer):
@@ -25,25 +21,7 @@ class BasketOfferSerializer(serializers.Serializer):
 class ProductUnitFieldMixin:
     def get_queryset(self):
         if self.queryset is None:
-            view = self.context["view"]
-            offer_qs = view.offer_queryset
-            warehouse_qs = Warehouse.objects.filter(
-                shop_id=view.kwargs["shop_id"],
-                product_unit_id=OuterRef("pk"),
-            )
-
-            self.queryset = ProductUnit.objects.filter(
-                product__is_archive=False,
-            ).annotate(
-                full_price=Subquery(
-                    warehouse_qs.values("price"),
-                    output_field=DecimalField("цена", decimal_places=2, max_digits=6),
-                ),
-                cond_range=ArraySubquery(
-                    build_offer_subquery(offer_qs, "condition").values("pk"),
-                    output_field=ArrayField(BigAutoField, verbose_name="предложения"),
-                ),
-            )
+            self.queryset = ProductUnit.objects.filter(product__is_archive=False)
         return self.queryset
 
 
@@ -131,3 +109,99 @@ class BasketSerializer(serializers.Serializer):
         required=False,
         allow_empty=True,
     )
+
+
+class BatchBasketLineSerializer(serializers.Serializer):
+    # Ids are resolved for the whole batch, see `BasketBatchSerializer`
+    product_unit = serializers.IntegerField(label="единица хранения")
+    quantity = serializers.DecimalField(
+        label="количество в складских единицах",
+        max_digits=8,
+        decimal_places=3,
+        min_value=Decimal("0.001"),
+    )
+
+
+class BatchBasketSerializer(serializers.Serializer):
+    lines = BatchBasketLineSerializer(label="строки", many=True)
+    buyer = serializers.IntegerField(
+        label="покупатель",
+        required=False,
+        allow_null=True,
+    )
+    card = serializers.UUIDField(
+        label="программа лояльности",
+        required=False,
+        allow_null=True,
+    )
+    vouchers = serializers.ListField(
+        label="ваучеры",
+        child=serializers.UUIDField(),
+        required=False,
+        allow_empty=True,
+    )
+
+
+class BasketBatchSerializer(serializers.Serializer):
+    MAX_BASKETS = 1000
+
+    baskets = BatchBasketSerializer(label="корзины", many=True)
+
+    def validate_baskets(self, value):
+        if len(value) > self.MAX_BASKETS:
+            raise serializers.ValidationError(
+                f"Не более {self.MAX_BASKETS} корзин за один запрос."
+            )
+        return value
+
+    def validate(self, data):
+        # replace Ids with model objects, one query per model
+        baskets = data["baskets"]
+        units = ProductUnit.objects.filter(product__is_archive=False).in_bulk(
+            {line["product_unit"] for x in baskets for line in x["lines"]}
+        )
+        buyers = get_user_model().objects.in_bulk(
+            {x["buyer"] for x in baskets if x.get("buyer") is not None}
+        )
+        cards = LoyaltyCard.objects.in_bulk(
+            {x["card"] for x in baskets if x.get("card") is not None}
+        )
+        vouchers = Voucher.objects.in_bulk(
+            {pk for x in baskets for pk in x.get("vouchers", [])}
+        )
+
+        errors, has_errors = [], False
+        for basket in baskets:
+            basket_errors = {}
+            line_errors = []
+            for line in basket["lines"]:
+                unit = units.get(line["product_unit"])
+                if unit is None:
+                    line_errors.append({"product_unit": ["Товар не найден."]})
+                else:
+                    line["product_unit"] = unit
+                    line_errors.append({})
+            if any(line_errors):
+                basket_errors["lines"] = line_errors
+
+            if basket.get("buyer") is not None:
+                basket["buyer"] = buyers.get(basket["buyer"])
+                if basket["buyer"] is None:
+                    basket_errors["buyer"] = ["Покупатель не найден."]
+
+            if basket.get("card") is not None:
+                basket["card"] = cards.get(basket["card"])
+                if basket["card"] is None:
+                    basket_errors["card"] = ["Программа лояльности не найдена."]
+
+            voucher_objects = [vouchers.get(pk) for pk in basket.get("vouchers", [])]
+            if None in voucher_objects:
+                basket_errors["vouchers"] = ["Ваучер не найден."]
+            basket["vouchers"] = voucher_objects
+
+            errors.append(basket_errors)
+            has_errors = has_errors or bool(basket_errors)
+
+        if has_errors:
+            raise serializers.ValidationError({"baskets": errors})
+        return data
@@ -1,9 +1,14 @@
 from django.urls import path
 
-from .views import ApplicableOffersView
+from .views import ApplicableOffersView, BatchApplicableOffersView
 
 urlpatterns = [
     path(
         "outlets/<int:shop_id>/offers/", ApplicableOffersView.as_view(), name="offers"
     ),
+    path(
+        "outlets/<int:shop_id>/offers/batch/",
+        BatchApplicableOffersView.as_view(),
+        name="offers-batch",
+    ),
 ]
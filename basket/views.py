@@ -1,24 +1,21 @@
-from decimal import Decimal, DecimalException
 from itertools import chain
-from typing import Dict
+from typing import Dict, List, Sequence, Set, Tuple
 
 from django.contrib.auth import get_user_model
-from django.contrib.postgres.expressions import ArraySubquery
-from django.contrib.postgres.fields import ArrayField
-from django.db.models import BigAutoField, DecimalField, OuterRef, Subquery
+from django.db.models import Q, Subquery
 from django.utils.functional import cached_property
 from rest_framework import status
 from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from discounts.models import Benefit, Condition, LoyaltyCard, Offer, Voucher
+from discounts.models import LoyaltyCard, Offer, Voucher
+from discounts.offer_index import get_offer_index
 from internal_api.models import Shop, Warehouse
-from products.models import ProductUnit
 from utils import permissions as perms
-from utils.models_utils import build_offer_subquery
 
-from .serializers import BasketSerializer
+from . import pricing
+from .serializers import BasketBatchSerializer, BasketSerializer
 
 
 class OfferMixin:
@@ -94,196 +91,8 @@ class OfferMixin:
 
     def apply_offers(self, shop_id: int) -> Dict:
         lines = self.basket_data["lines"]
-
-        # accelerate product unit lookup
-        unit_dict = {x["product_unit"].pk: x for x in lines}
-
-        # get offer queryset using condition ranges
-        cond_offer_pks = set(
-            chain.from_iterable(
-                x["product_unit"].cond_range or [] for x in unit_dict.values()
-            )
-        )
-        offer_qs = Offer.objects.filter(pk__in=cond_offer_pks)
-
-        # accelerate offer lookup
-        offer_dict = {x.pk: {"offer": x} for x in offer_qs}
-
-        # evaluate offers' application
-        for offer_line in offer_dict.copy().values():
-            offer = offer_line["offer"]
-            units = [
-                x["product_unit"]
-                for x in unit_dict.values()
-                if offer.pk in x["product_unit"].cond_range or []
-            ]
-
-            # decide how many times the offer may be applied
-            match offer.condition.type:
-                case Condition.TYPES.value:
-                    in_basket = Decimal("0.00")
-                    for unit in units:
-                        quantity = unit_dict[unit.pk]["quantity"]
-                        in_basket += quantity * unit.full_price
-                case Condition.TYPES.count:
-                    in_basket = sum(unit_dict[x.pk]["quantity"] for x in units)
-                case Condition.TYPES.coverage:
-                    in_basket = len(units)
-                case unknown:  # noqa: F821
-                    raise ValidationError(
-                        f"Unknown condition type: {unknown}"  # noqa: F821
-                    )
-            try:
-                apply_times = int(in_basket // offer.condition.value)
-            except (DecimalException, ZeroDivisionError):
-                # `offer.condition.value` should not be 0
-                apply_times = 0
-
-            # abide offer limit per purchase
-            if offer.order_limit > 0:
-                apply_times = min(apply_times, offer.order_limit)
-
-            if apply_times > 0:
-                offer_line["apply_times"] = apply_times
-            else:
-                # delete inapplicable offers
-                del offer_dict[offer.pk]
-
-        # adjust offer queryset again using application data
-        offer_qs = Offer.objects.filter(pk__in=offer_dict.keys())
-
-        # build a subquery of offers that match a benefit range
-        benefit_range_sub = build_offer_subquery(offer_qs, "benefit")
-
-        # annotate product units with applicable offers
-        unit_qs = ProductUnit.objects.filter(pk__in=unit_dict.keys(),).annotate(
-            warehouse=Subquery(
-                Warehouse.objects.filter(
-                    shop_id=shop_id,
-                    product_unit_id=OuterRef("pk"),
-                ).values("pk"),
-                output_field=BigAutoField("запас"),
-            ),
-            full_price=Subquery(
-                Warehouse.objects.filter(
-                    shop_id=shop_id,
-                    product_unit_id=OuterRef("pk"),
-                ).values("price"),
-                output_field=DecimalField("цена", decimal_places=2, max_digits=6),
-            ),
-            # empty array subqueries are represented as None, which is sucks
-            benefit_range=ArraySubquery(
-                benefit_range_sub.values("pk"),
-                output_field=ArrayField(BigAutoField, verbose_name="предложения"),
-            ),
-        )
-
-        # update dicts
-        for unit in unit_qs:
-            unit_dict[unit.pk].update(
-                {
-                    "product_unit": unit,
-                    "full_price": unit.full_price,
-                    "discounted_price": unit.full_price,
-                    "warehouse": unit.warehouse,
-                }
-            )
-
-        for offer_pk, offer_line in offer_dict.items():
-            offer_line["units"] = {}
-            for unit_pk, unit_line in unit_dict.items():
-                if offer_pk in unit_line["product_unit"].benefit_range or []:
-                    offer_line["units"][unit_pk] = unit_line
-
-        # calculate discounted prices
-        for offer_line in offer_dict.values():
-            match offer_line["offer"].benefit.type:
-                case Benefit.TYPES.percentage:
-                    for _ in range(offer_line["apply_times"]):
-                        for unit_line in offer_line["units"].values():
-                            unit_line["discounted_price"] *= (
-                                100 - offer_line["offer"].benefit.value
-                            ) / 100
-                case Benefit.TYPES.absolute:
-                    discount_avail = (
-                        offer_line["units"].benefit.value * offer_line["apply_times"]
-                    )
-                    full_total = sum(
-                        x["discounted_price"] * x["quantity"]
-                        for x in offer_line["units"]
-                    )
-                    for unit_line in offer_line["units"].values():
-                        # calculate discount share; on the last iteration
-                        # discounted price should be equal to the full total
-                        discount = (
-                            discount_avail
-                            * unit_line["discounted_price"]
-                            * unit_line["quantity"]
-                            / full_total
-                        )
-                        full_total -= (
-                            unit_line["discounted_price"] * unit_line["quantity"]
-                        )
-                        discount_avail -= discount
-                        # TODO: this sharing is improper:
-                        unit_line["discounted_price"] -= (
-                            discount / unit_line["quantity"]
-                        )
-                case Benefit.TYPES.multibuy:
-                    cheapest = sorted(
-                        offer_line["units"].values(),
-                        key=lambda x: x["discounted_price"] * x["quantity"],
-                    )[0]
-                    cheapest["discounted_price"] = Decimal("0.00")
-                case Benefit.TYPES.fixed_price:
-                    price_avail = offer_line["offer"].benefit.value
-                    full_total = sum(
-                        x["discounted_price"] * x["quantity"]
-                        for x in offer_line["units"].values()
-                    )
-                    for unit_line in offer_line["units"].values():
-                        price = (
-                            price_avail
-                            * unit_line["discounted_price"]
-                            * unit_line["quantity"]
-                            / full_total
-                        )
-                        full_total -= (
-                            unit_line["discounted_price"] * unit_line["quantity"]
-                        )
-                        price_avail -= price
-                        # TODO: this sharing may be improper:
-                        unit_line["discounted_price"] -= price / unit_line["quantity"]
-                case unknown:  # noqa: F821
-                    raise ValidationError(
-                        f"Unknown benefit type: {unknown}"  # noqa: F821
-                    )
-
-        # align the decimal point
-        for line in lines:
-            if line["discounted_price"] is not None:
-                line["discounted_price"] = round(line["discounted_price"], 2)
-
-        # prepare warehouse data
-        warehouse_qs = Warehouse.objects.filter(
-            shop_id=shop_id,
-            product_unit__in=unit_dict.keys(),
-        )
-        warehouse_dict = {x.pk: x for x in warehouse_qs}
-        for line in lines:
-            line["warehouse"] = warehouse_dict.get(line["warehouse"])
-
-        # prepare applied offers data
-        for line in lines:
-            line["offers"] = []
-            for offer_line in offer_dict.values():
-                if line["product_unit"].pk in offer_line["units"]:
-                    line["offers"].append(
-                        {
-                            "offer": offer_line["offer"],
-                            "apply_times": offer_line["apply_times"],
-                        }
-                    )
+        available_offer_pks = set(self.offer_queryset.values_list("pk", flat=True))
+        self.price_baskets(shop_id, [(lines, available_offer_pks)])
 
         # build output data with applied offers and discount prices
         return {
@@ -293,6 +102,82 @@ class OfferMixin:
             "lines": lines,
         }
 
+    @staticmethod
+    def price_baskets(
+        shop_id: int,
+        baskets: Sequence[Tuple[List[Dict], Set[int]]],
+    ):
+        """
+        Fill basket lines with warehouses, prices and applied offers.
+
+        Every basket is a pair of its lines and Ids of the offers available to
+        it. Warehouses and offers are looked up once for all the baskets.
+        """
+        unit_pks = {x["product_unit"].pk for lines, _ in baskets for x in lines}
+        all_offer_pks = set(chain.from_iterable(x for _, x in baskets))
+
+        # resolve condition and benefit ranges using the in-memory index
+        index = get_offer_index()
+        cond_offers = {
+            unit_pk: index.offers_for(unit_pk, "condition", all_offer_pks)
+            for unit_pk in unit_pks
+        }
+        offer_dict = {
+            x.pk: x
+            for x in Offer.objects.filter(
+                pk__in=set(chain.from_iterable(cond_offers.values())),
+            ).select_related("condition", "benefit")
+        }
+        offer_table = pricing.compile_offers(offer_dict.values())
+        benefit_offers = {
+            unit_pk: index.offers_for(unit_pk, "benefit", offer_dict.keys())
+            for unit_pk in unit_pks
+        }
+
+        # prices are taken from the outlet's warehouses (no annotations needed)
+        warehouse_dict = {
+            x.product_unit_id: x
+            for x in Warehouse._base_manager.filter(
+                shop_id=shop_id,
+                product_unit_id__in=unit_pks,
+            ).select_related("shop")
+        }
+
+        for lines, available_offer_pks in baskets:
+            # calculate discounted prices
+            pricing_lines = []
+            for line in lines:
+                unit_pk = line["product_unit"].pk
+                warehouse = warehouse_dict.get(unit_pk)
+                pricing_lines.append(
+                    pricing.Line(
+                        unit_id=unit_pk,
+                        quantity=line["quantity"],
+                        price=warehouse.price if warehouse else None,
+                        condition_offers=frozenset(
+                            cond_offers[unit_pk] & available_offer_pks
+                        ),
+                        benefit_offers=frozenset(
+                            benefit_offers[unit_pk] & available_offer_pks
+                        ),
+                    )
+                )
+            try:
+                priced_lines = pricing.price_basket(pricing_lines, offer_table)
+            except pricing.PricingError as e:
+                raise ValidationError(str(e))
+
+            for line, pricing_line, priced_line in zip(
+                lines, pricing_lines, priced_lines
+            ):
+                line["warehouse"] = warehouse_dict.get(pricing_line.unit_id)
+                line["full_price"] = pricing_line.price
+                line["discounted_price"] = priced_line.discounted_price
+                line["offers"] = [
+                    {"offer": offer_dict[offer_pk], "apply_times": apply_times}
+                    for offer_pk, apply_times in priced_line.offers
+                ]
+
 
 class ApplicableOffersView(OfferMixin, APIView):
     """Suggest discounts for a given basket object."""
@@ -327,3 +212,73 @@ class ApplicableOffersView(OfferMixin, APIView):
 
     def get_serializer_context(self):
         return {"request": self.request, "format": self.format_kwarg, "view": self}
+
+
+class BatchApplicableOffersView(ApplicableOffersView):
+    """Suggest discounts for a number of basket objects at once."""
+
+    serializer_class = BasketBatchSerializer
+
+    def post(self, request, shop_id, *args, **kwargs):
+        self.check_outlet(shop_id)
+        baskets = self.basket_data["baskets"]
+
+        # find offers available to any of the baskets in one go
+        card_offer_pks = {x["card"].offer_id for x in baskets if x.get("card")}
+        voucher_offer_pks = {
+            voucher.offer_id
+            for x in baskets
+            for voucher in x.get("vouchers", [])
+            if voucher.is_active
+        }
+        offer_types = dict(
+            Offer.objects.filter(is_active=True)
+            .filter(
+                Q(type__in=(Offer.TYPES.site, Offer.TYPES.buyer))
+                | Q(pk__in=card_offer_pks | voucher_offer_pks)
+            )
+            .values_list("pk", "type")
+        )
+
+        priced_baskets = []
+        for basket in baskets:
+            buyer = self.authorize_buyer(basket.get("buyer"))
+            card = basket.get("card")
+            if buyer and card and card.buyer_id != buyer.pk:
+                card = None
+
+            offer_pks = {
+                offer_pk
+                for offer_pk, offer_type in offer_types.items()
+                if offer_type == Offer.TYPES.site
+                or (buyer is not None and offer_type == Offer.TYPES.buyer)
+            }
+            if card is not None and card.offer_id in offer_types:
+                offer_pks.add(card.offer_id)
+            offer_pks.update(
+                voucher.offer_id
+                for voucher in basket.get("vouchers", [])
+                if voucher.is_active and voucher.offer_id in offer_types
+            )
+            priced_baskets.append((basket["lines"], offer_pks))
+
+        self.price_baskets(shop_id, priced_baskets)
+        return Response(
+            data={
+                "baskets": BasketSerializer(
+                    baskets,
+                    many=True,
+                    context=self.get_serializer_context(),
+                ).data
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def authorize_buyer(self, buyer):
+        # same as `OfferMixin.buyer`, but with the buyer object already found
+        user = self.request.user
+        if user.is_anonymous:
+            return None
+        elif user.is_superuser or user.is_staff:
+            return buyer
+        return user
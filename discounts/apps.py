@@ -5,3 +5,6 @@ class DiscountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "discounts"
     verbose_name = "скидки"
+
+    def ready(self):
+        from . import signals  # noqa
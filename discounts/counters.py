@@ -0,0 +1,67 @@
+"""
+Offer application counters. A counter is incremented by a single UPDATE,
+which checks the limit in the same statement, so concurrent applications
+neither lose increments nor exceed limits. Offers are not saved, so
+counting does not reschedule them.
+"""
+from django.db.models import Case, F, Q, When
+
+from utils import cache as response_cache
+
+from .models import BuyerCount, LoyaltyCard, Offer, OfferTransition
+
+
+def count_offer(offer: Offer, times: int = 1) -> bool:
+    """
+    Count applications of an active offer within its `site_limit`,
+    deactivating the offer as the limit is reached. Updates counter fields
+    of the instance; returns False if the offer is not available.
+    """
+    offers = Offer.objects.filter(pk=offer.pk)
+    count = F("application_count") + times
+    # `site_limit == 0` means unlimited offer
+    available = Q(is_active=True) & (Q(site_limit=0) | Q(site_limit__gte=count))
+    updated = offers.filter(available).update(
+        application_count=count,
+        is_active=Case(
+            When(site_limit__gt=0, site_limit__lte=count, then=False),
+            default=True,
+        ),
+    )
+    offer.application_count, offer.is_active = offers.values_list(
+        "application_count", "is_active"
+    ).get()
+    if updated and not offer.is_active:
+        # a used up offer is not enabled again
+        OfferTransition.objects.filter(offer=offer).delete()
+        response_cache.invalidate("offers")
+    return bool(updated)
+
+
+def count_buyer(offer: Offer, buyer) -> bool:
+    """
+    Count an application of an offer by a buyer within `buyer_limit`.
+    Returns False if the buyer is out of the limit.
+    """
+    BuyerCount.objects.bulk_create(
+        [BuyerCount(offer=offer, buyer=buyer)],
+        ignore_conflicts=True,
+    )
+    counts = BuyerCount.objects.filter(offer=offer, buyer=buyer)
+    if offer.buyer_limit:
+        # `buyer_limit == 0` means no limit for a single buyer
+        counts = counts.filter(application_count__lt=offer.buyer_limit)
+    return bool(counts.update(application_count=F("application_count") + 1))
+
+
+def count_card(card: LoyaltyCard) -> bool:
+    """
+    Count an application of an active loyalty card. Updates the counter of
+    the instance; returns False if the card is inactive.
+    """
+    cards = LoyaltyCard.objects.filter(pk=card.pk)
+    updated = cards.filter(is_active=True).update(
+        application_count=F("application_count") + 1
+    )
+    card.application_count = cards.values_list("application_count", flat=True).get()
+    return bool(updated)
@@ -34,4 +34,4 @@ class BuyerCountFilter(filters.FilterSet):
 class VoucherFilter(filters.FilterSet):
     class Meta:
         model = Voucher
-        fields = ("offer",)
+        fields = ("offer", "batch", "is_active")
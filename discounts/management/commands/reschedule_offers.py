@@ -1,28 +1,33 @@
-from itertools import chain
-
 from django.core.management.base import BaseCommand
-from loguru import logger
-
-from lime import app
+from django.utils import timezone
 
-from ...models import Offer
-from ...tasks import reschedule_offer
+from ... import scheduler
 
 
 class Command(BaseCommand):
     help = "Запланировать изменения актуальности предложений (скидок)."
 
-    def handle(self, *args, **options):
-        logger.info("Revoking stale tasks...")
-        tasks = chain.from_iterable(app.control.inspect().scheduled().values())
-        task_count = 0
-        for task in tasks:
-            if task["request"]["name"] == "discounts.tasks.reschedule_offer":
-                task_id = task["request"]["id"]
-                app.control.revoke(task_id)
-                task_count += 1
-        logger.info(f"{task_count} tasks has been tagged for revoke.")
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show the next changes instead of scheduling them",
+        )
+        parser.add_argument(
+            "--count",
+            type=int,
+            default=20,
+            help="Number of changes to show (default: 20)",
+        )
+
+    def handle(self, *args, dry_run=False, count=20, **options):
+        if not dry_run:
+            scheduler.reschedule_all()
+            self.stdout.write("Изменения актуальности предложений запланированы.")
+            return
 
-        # create new tasks
-        for offer_id in Offer.objects.values_list("id", flat=True).iterator():
-            reschedule_offer.apply_async(args=(offer_id,))
+        for at, is_active, offer in scheduler.preview(count):
+            action = "включение" if is_active else "отключение"
+            self.stdout.write(
+                f"{timezone.localtime(at):%Y-%m-%d %H:%M}: {action}: {offer}"
+            )
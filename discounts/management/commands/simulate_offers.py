@@ -0,0 +1,47 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ... import simulation
+
+
+class Command(BaseCommand):
+    help = "Оценить стоимость предложений (скидок) по истории продаж."
+
+    def add_arguments(self, parser):
+        parser.add_argument("offers", nargs="+", type=int, help="Offer Ids")
+        parser.add_argument(
+            "--from",
+            type=datetime.date.fromisoformat,
+            dest="date_from",
+            help="First day of sales, YYYY-MM-DD (a year ago by default)",
+        )
+        parser.add_argument(
+            "--to",
+            type=datetime.date.fromisoformat,
+            dest="date_to",
+            help="Last day of sales, YYYY-MM-DD (yesterday by default)",
+        )
+        parser.add_argument("--shop", type=int, help="Shop Id (all shops by default)")
+
+    def handle(self, offers, date_from, date_to, shop, *args, **options):
+        if date_to is None:
+            date_to = timezone.localdate() - datetime.timedelta(days=1)
+        if date_from is None:
+            date_from = date_to - datetime.timedelta(days=365)
+        if date_from > date_to:
+            raise CommandError(f"Invalid {date_from}:{date_to} range.")
+
+        report = simulation.simulate(offers, date_from, date_to, shop)
+        self.stdout.write(
+            f"Продажи с {date_from} по {date_to}: {report['baskets']} чеков, "
+            f"выручка {report['revenue']}.\n"
+            f"Скидка {report['discount']} в {report['affected_baskets']} чеках.\n"
+            f"Маржа {report['margin']} -> {report['simulated_margin']}."
+        )
+        for offer_pk, result in report["offers"].items():
+            self.stdout.write(
+                f"Предложение {offer_pk}: скидка {result['discount']} "
+                f"в {result['baskets']} чеках."
+            )
@@ -0,0 +1,75 @@
+"""
+Persisted range membership.
+
+Ranges include and exclude product units directly, or by their products and
+product categories. `RangeMembership` rows keep the product units every range
+covers, so offers are matched to product units by a single indexed join
+instead of expanding the range relations in every query.
+
+Memberships are refreshed by signals on changes to ranges and to the catalog
+(see `.signals`). Bulk writes and fixtures skip the signals, so bulk imports
+refresh memberships of their product units with `refresh`.
+"""
+from itertools import product
+from typing import Optional, Set, Tuple
+
+from django.db import models, transaction
+from django.db.models import QuerySet
+
+from products.models import Category, Product, ProductUnit
+
+from .models import Range, RangeMembership
+
+BATCH_SIZE = 10000
+# models which changes affect memberships
+TRACKED_MODELS = (Range, Category, Product, ProductUnit)
+
+
+def get_units(obj: models.Model) -> QuerySet:
+    """Product units of a product unit, product, or category."""
+    if isinstance(obj, Category):
+        return ProductUnit.objects.filter(product__category=obj)
+    if isinstance(obj, Product):
+        return ProductUnit.objects.filter(product=obj)
+    return ProductUnit.objects.filter(pk=obj.pk)
+
+
+def get_members(ranges: QuerySet, units: QuerySet) -> Set[Tuple[int, int]]:
+    """Range and product unit Ids of the ranges covering the product units."""
+    members = {}
+    for direction in ("include", "exclude"):
+        members[direction] = set()
+        for path in ("", "product__", "product__category__"):
+            lookup = f"{path}{direction}_ranges"
+            members[direction].update(
+                units.filter(**{f"{lookup}__in": ranges}).values_list(lookup, "pk")
+            )
+
+    range_pks = list(ranges.filter(includes_all=True).values_list("pk", flat=True))
+    if range_pks:
+        members["include"].update(
+            product(range_pks, units.values_list("pk", flat=True))
+        )
+    return members["include"] - members["exclude"]
+
+
+def refresh(ranges: Optional[QuerySet] = None, units: Optional[QuerySet] = None):
+    """Recompute memberships of ranges in product units (all by default)."""
+    if ranges is None:
+        ranges = Range.objects.all()
+    if units is None:
+        units = ProductUnit.objects.all()
+    with transaction.atomic():
+        members = get_members(ranges, units)
+        RangeMembership.objects.filter(
+            range__in=ranges, product_unit__in=units
+        ).delete()
+        # concurrent refreshes may add the same rows
+        RangeMembership.objects.bulk_create(
+            [
+                RangeMembership(range_id=range_pk, product_unit_id=unit_pk)
+                for range_pk, unit_pk in members
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,46 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "discounts",
+            "0002_offer_duration_offer_schedule_alter_offer_ended_at_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OfferTransition",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("at", models.DateTimeField(db_index=True, verbose_name="время")),
+                ("is_active", models.BooleanField(verbose_name="активно")),
+                (
+                    "offer",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transition",
+                        to="discounts.offer",
+                        verbose_name="предложение",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "изменение активности предложения",
+                "verbose_name_plural": "изменения активности предложений",
+            },
+        ),
+    ]
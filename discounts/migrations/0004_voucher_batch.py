@@ -0,0 +1,25 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("discounts", "0003_offertransition"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="voucher",
+            name="batch",
+            field=models.UUIDField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="Ваучеры, созданные одним запросом",
+                null=True,
+                verbose_name="выпуск",
+            ),
+        ),
+    ]
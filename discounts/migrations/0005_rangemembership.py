@@ -0,0 +1,51 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0046_category_image_svg_alter_category_is_excisable"),
+        ("discounts", "0004_voucher_batch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RangeMembership",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "product_unit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="products.productunit",
+                        verbose_name="товарная единица",
+                    ),
+                ),
+                (
+                    "range",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="discounts.range",
+                        verbose_name="диапазон товаров",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "товарная единица диапазона",
+                "verbose_name_plural": "товарные единицы диапазонов",
+                "default_related_name": "range_memberships",
+                "unique_together": {("product_unit", "range")},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+from itertools import product
+
+from django.db import migrations
+
+
+def fill_memberships(apps, schema_editor):
+    ProductUnit = apps.get_model("products", "ProductUnit")
+    Range = apps.get_model("discounts", "Range")
+    RangeMembership = apps.get_model("discounts", "RangeMembership")
+
+    units = ProductUnit.objects.all()
+    members = {}
+    for direction in ("include", "exclude"):
+        members[direction] = set()
+        for path in ("", "product__", "product__category__"):
+            lookup = f"{path}{direction}_ranges"
+            members[direction].update(
+                units.filter(**{f"{lookup}__isnull": False}).values_list(lookup, "pk")
+            )
+    members["include"].update(
+        product(
+            Range.objects.filter(includes_all=True).values_list("pk", flat=True),
+            units.values_list("pk", flat=True),
+        )
+    )
+
+    RangeMembership.objects.bulk_create(
+        [
+            RangeMembership(range_id=range_pk, product_unit_id=unit_pk)
+            for range_pk, unit_pk in members["include"] - members["exclude"]
+        ],
+        batch_size=10000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("discounts", "0005_rangemembership"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_memberships, reverse_code=lambda x, y: None),
+    ]
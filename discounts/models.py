@@ -9,7 +9,6 @@ from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 
-from lime import app
 from utils.choices import Choices
 
 
@@ -64,6 +63,33 @@ class Range(models.Model):
         return self.name
 
 
+class RangeMembership(models.Model):
+    """
+    A product unit covered by a range, maintained by `discounts.memberships`.
+    """
+
+    range = models.ForeignKey(
+        Range,
+        on_delete=models.CASCADE,
+        verbose_name="диапазон товаров",
+    )
+    product_unit = models.ForeignKey(
+        "products.ProductUnit",
+        on_delete=models.CASCADE,
+        verbose_name="товарная единица",
+    )
+
+    class Meta:
+        verbose_name = "товарная единица диапазона"
+        verbose_name_plural = "товарные единицы диапазонов"
+        default_related_name = "range_memberships"
+        # offers are looked up by product units
+        unique_together = ("product_unit", "range")
+
+    def __str__(self):
+        return f"{self.range}: {self.product_unit}"
+
+
 class Condition(models.Model):
     TYPES = Choices(
         ("count", "общее количество товаров из выборки"),
@@ -196,10 +222,27 @@ class Offer(models.Model):
             raise ValidationError(f"Invalid {self.started_at}:{self.ended_at} range.")
         super().clean()
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # reschedule now
-        app.send_task("discounts.tasks.reschedule_offer", args=(self.id,))
+
+class OfferTransition(models.Model):
+    """
+    The next change of an offer activity, queued by `discounts.scheduler`.
+    """
+
+    offer = models.OneToOneField(
+        Offer,
+        on_delete=models.CASCADE,
+        related_name="transition",
+        verbose_name="предложение",
+    )
+    at = models.DateTimeField("время", db_index=True)
+    is_active = models.BooleanField("активно")
+
+    class Meta:
+        verbose_name = "изменение активности предложения"
+        verbose_name_plural = "изменения активности предложений"
+
+    def __str__(self):
+        return f"{self.offer}: {self.at}: {self.is_active}"
 
 
 class BuyerCount(models.Model):
@@ -257,6 +300,14 @@ class Voucher(models.Model):
         verbose_name="предложение",
         related_name="vouchers",
     )
+    batch = models.UUIDField(
+        "выпуск",
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+        help_text="Ваучеры, созданные одним запросом",
+    )
 
     class Meta:
         verbose_name = "ваучер"
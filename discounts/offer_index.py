@@ -0,0 +1,183 @@
+"""
+In-process index of product ranges.
+
+Resolving a range in SQL takes six joins through `Range` include/exclude
+relations for every product unit. The index compiles all ranges into sets of
+product unit Ids once, so that basket pricing is reduced to dictionary lookups.
+
+Every process keeps its own copy of the index. Any change to offers, ranges,
+or catalog replaces the version stamp in the cache (see `.signals`), so each
+process rebuilds its index on next use. Writes that bypass signals (queryset
+updates) are picked up after `INDEX_TTL` seconds at most.
+"""
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, Literal, NamedTuple, Optional, Set
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from products.models import ProductUnit
+
+from .models import Offer, Range
+
+VERSION_KEY = "discounts:offer-index:version"
+INDEX_TTL = 300
+
+
+class CompiledRange(NamedTuple):
+    includes_all: bool
+    # included product units, with exclusions already subtracted
+    units: FrozenSet[int]
+    excluded: FrozenSet[int]
+
+    def covers(self, unit_id: int) -> bool:
+        if self.includes_all:
+            return unit_id not in self.excluded
+        return unit_id in self.units
+
+
+class OfferIndex:
+    """Maps product units to the offers which condition or benefit ranges apply."""
+
+    def __init__(
+        self,
+        ranges: Dict[int, CompiledRange],
+        offer_ranges: Dict[int, Dict[str, int]],
+    ):
+        self.ranges = ranges
+        self.offer_ranges = offer_ranges
+
+        self.unit_ranges = defaultdict(set)
+        for range_pk, compiled in ranges.items():
+            for unit_pk in compiled.units:
+                self.unit_ranges[unit_pk].add(range_pk)
+        self.universal_ranges = [
+            range_pk for range_pk, compiled in ranges.items() if compiled.includes_all
+        ]
+
+        self.range_offers = {"condition": defaultdict(set), "benefit": defaultdict(set)}
+        for offer_pk, by_range in offer_ranges.items():
+            for by, range_pk in by_range.items():
+                self.range_offers[by][range_pk].add(offer_pk)
+
+    @classmethod
+    def build(cls) -> "OfferIndex":
+        relations = {}
+        product_pks, category_pks = set(), set()
+        for direction in ("include", "exclude"):
+            for target in ("product_units", "products", "categories"):
+                through = getattr(Range, f"{direction}_{target}").through
+                target_field = {
+                    "product_units": "productunit_id",
+                    "products": "product_id",
+                    "categories": "category_id",
+                }[target]
+                pairs = list(through.objects.values_list("range_id", target_field))
+                relations[direction, target] = pairs
+                if target == "products":
+                    product_pks.update(x[1] for x in pairs)
+                elif target == "categories":
+                    category_pks.update(x[1] for x in pairs)
+
+        # units of the products and categories mentioned in ranges
+        product_units, category_units = defaultdict(set), defaultdict(set)
+        for unit_pk, product_pk, category_pk in ProductUnit.objects.filter(
+            Q(product_id__in=product_pks) | Q(product__category_id__in=category_pks)
+        ).values_list("pk", "product_id", "product__category_id"):
+            product_units[product_pk].add(unit_pk)
+            category_units[category_pk].add(unit_pk)
+
+        members = {direction: defaultdict(set) for direction in ("include", "exclude")}
+        for (direction, target), pairs in relations.items():
+            for range_pk, target_pk in pairs:
+                match target:
+                    case "product_units":
+                        members[direction][range_pk].add(target_pk)
+                    case "products":
+                        members[direction][range_pk].update(product_units[target_pk])
+                    case "categories":
+                        members[direction][range_pk].update(category_units[target_pk])
+
+        ranges = {}
+        for range_pk, includes_all in Range.objects.values_list("pk", "includes_all"):
+            excluded = frozenset(members["exclude"][range_pk])
+            ranges[range_pk] = CompiledRange(
+                includes_all=includes_all,
+                units=frozenset(members["include"][range_pk] - excluded),
+                excluded=excluded,
+            )
+
+        offer_ranges = {
+            offer_pk: {"condition": condition_range, "benefit": benefit_range}
+            for offer_pk, condition_range, benefit_range in Offer.objects.values_list(
+                "pk", "condition__range_id", "benefit__range_id"
+            )
+        }
+        return cls(ranges, offer_ranges)
+
+    def ranges_for(self, unit_id: int) -> Set[int]:
+        """Ranges that include a given product unit."""
+        result = set(self.unit_ranges.get(unit_id, ()))
+        result.update(
+            range_pk
+            for range_pk in self.universal_ranges
+            if unit_id not in self.ranges[range_pk].excluded
+        )
+        return result
+
+    def offers_for(
+        self,
+        unit_id: int,
+        by: Literal["condition", "benefit"],
+        offer_pks: Optional[Iterable[int]] = None,
+    ) -> Set[int]:
+        """
+        Offers which condition (or benefit) range includes a given product unit,
+        optionally limited to `offer_pks`.
+        """
+        range_offers = self.range_offers[by]
+        result = set()
+        for range_pk in self.ranges_for(unit_id):
+            result.update(range_offers.get(range_pk, ()))
+        if offer_pks is not None:
+            result.intersection_update(offer_pks)
+        return result
+
+
+_lock = threading.Lock()
+_index: Optional[OfferIndex] = None
+_index_version = None
+_index_built_at = 0.0
+
+
+def get_version() -> str:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = invalidate()
+    return version
+
+
+def invalidate() -> str:
+    """Make all processes rebuild their indexes."""
+    version = uuid.uuid4().hex
+    cache.set(VERSION_KEY, version, timeout=None)
+    return version
+
+
+def get_offer_index() -> OfferIndex:
+    global _index, _index_version, _index_built_at
+
+    version = get_version()
+    with _lock:
+        if (
+            _index is None
+            or _index_version != version
+            or time.monotonic() - _index_built_at > INDEX_TTL
+        ):
+            _index = OfferIndex.build()
+            _index_version = version
+            _index_built_at = time.monotonic()
+        return _index
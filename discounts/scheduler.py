@@ -0,0 +1,170 @@
+"""
+Offer activity scheduler.
+
+An offer is active between `started_at` and `ended_at`, and if it has
+a `schedule`, only for `duration` after each cron time, until it is used
+up to its `site_limit` (see `.counters`). The next change of activity of
+every offer is queued as `OfferTransition`, and `process` (run by Celery
+beat) applies due changes with bulk updates, and queues the next ones.
+"""
+import heapq
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from croniter import croniter
+from django.db import transaction
+from django.utils import timezone
+
+from utils import cache as response_cache
+
+from .models import Offer, OfferTransition
+
+BATCH_SIZE = 1000
+# cron times merged into a continuous activity period before it is cut short
+MAX_CRON_STEPS = 1000
+
+
+def iter_periods(
+    offer: Offer,
+    after: datetime,
+) -> Iterator[Tuple[datetime, datetime, bool]]:
+    """
+    Periods of activity ending after a moment, in order: start, end, and
+    whether the period is complete. A period merged of `MAX_CRON_STEPS` cron
+    times is cut short as incomplete. An offer used up to its `site_limit`
+    has none.
+    """
+    if 0 < offer.site_limit <= offer.application_count:
+        return
+    started_at, ended_at = offer.started_at, offer.ended_at
+    if not offer.schedule:
+        if started_at < ended_at and after < ended_at:
+            yield started_at, ended_at, True
+        return
+
+    def clip(start, end, is_complete):
+        start, end = max(start, started_at), min(end, ended_at)
+        if start < end and after < end:
+            return start, end, is_complete or end == ended_at
+        return None
+
+    cron = croniter(
+        offer.schedule,
+        start_time=timezone.localtime(max(after, started_at)),
+        ret_type=datetime,
+    )
+    # the latest period may be in progress
+    cron_time = cron.get_prev()
+    period = None
+    steps = 0
+    while cron_time < ended_at:
+        end = cron_time + offer.duration
+        if period and cron_time <= period[1]:
+            period = period[0], max(period[1], end)
+            steps += 1
+            if steps >= MAX_CRON_STEPS:
+                period = clip(*period, False)
+                if period:
+                    yield period
+                return
+        else:
+            period = period and clip(*period, True)
+            if period:
+                yield period
+            period = cron_time, end
+            steps = 0
+        cron_time = cron.get_next()
+
+    period = period and clip(*period, True)
+    if period:
+        yield period
+
+
+def iter_transitions(offer: Offer, after: datetime) -> Iterator[Tuple[datetime, bool]]:
+    """Changes of activity after a moment, in order: time and activity."""
+    for start, end, is_complete in iter_periods(offer, after):
+        if after < start:
+            yield start, True
+        if not is_complete:
+            # to be checked again by then
+            yield end, True
+            return
+        yield end, False
+
+
+def is_active_at(offer: Offer, moment: datetime) -> bool:
+    for start, _, _ in iter_periods(offer, moment):
+        return start <= moment
+    return False
+
+
+def schedule(offers: Iterable[Offer], now: Optional[datetime] = None):
+    """Apply the current activity of offers, and queue their next changes."""
+    now = now or timezone.now()
+    offers = list(offers)
+    for offer in offers:
+        offer.is_active = is_active_at(offer, now)
+    updated = 0
+    for is_active in (True, False):
+        ids = [offer.id for offer in offers if offer.is_active == is_active]
+        if ids:
+            updated += (
+                Offer.objects.filter(id__in=ids)
+                .exclude(is_active=is_active)
+                .update(is_active=is_active)
+            )
+
+    OfferTransition.objects.filter(offer__in=offers).delete()
+    OfferTransition.objects.bulk_create(
+        [
+            OfferTransition(offer=offer, at=at, is_active=is_active)
+            for offer in offers
+            for at, is_active in islice(iter_transitions(offer, now), 1)
+        ]
+    )
+    # bulk updates skip the signals
+    if updated:
+        response_cache.invalidate("offers")
+
+
+def process(now: Optional[datetime] = None):
+    """Apply due changes of offer activity."""
+    now = now or timezone.now()
+    while True:
+        with transaction.atomic():
+            transitions = list(
+                OfferTransition.objects.select_for_update(
+                    skip_locked=True, of=("self",)
+                )
+                .filter(at__lte=now)
+                .select_related("offer")
+                .order_by("at")[:BATCH_SIZE]
+            )
+            if not transitions:
+                return
+            schedule([transition.offer for transition in transitions], now)
+
+
+def reschedule_all(now: Optional[datetime] = None):
+    """Queue changes of all offers anew."""
+    now = now or timezone.now()
+    ids = list(Offer.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(ids), BATCH_SIZE):
+        with transaction.atomic():
+            schedule(Offer.objects.filter(id__in=ids[start : start + BATCH_SIZE]), now)
+
+
+def preview(count: int, now: Optional[datetime] = None) -> List[tuple]:
+    """The next changes of offer activity: time, activity, and offer."""
+    now = now or timezone.now()
+
+    def iter_offer_transitions(offer):
+        for at, is_active in iter_transitions(offer, now):
+            yield at, is_active, offer
+
+    transitions = heapq.merge(
+        *(iter_offer_transitions(offer) for offer in Offer.objects.order_by("id")),
+        key=lambda transition: transition[0],
+    )
+    return list(islice(transitions, count))
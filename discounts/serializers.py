@@ -14,6 +14,9 @@ from utils.representation import RepresentationModelSerializer
 
 from .models import Benefit, BuyerCount, Condition, LoyaltyCard, Offer, Range, Voucher
 
+MAX_GENERATED_VOUCHERS = 1_000_000
+MAX_REDEEMED_VOUCHERS = 10_000
+
 
 class ConditionSerializer(serializers.ModelSerializer):
     range_on_read = serializers.HyperlinkedRelatedField(
@@ -288,6 +291,27 @@ class VoucherSerializer(serializers.ModelSerializer):
         return data
 
 
+class VoucherGenerateSerializer(serializers.Serializer):
+    offer = serializers.PrimaryKeyRelatedField(
+        label="предложение",
+        queryset=Offer.objects.all(),
+        validators=[OfferTypeValidator(offer_types=(Offer.TYPES.voucher,))],
+    )
+    count = serializers.IntegerField(
+        label="количество", min_value=1, max_value=MAX_GENERATED_VOUCHERS
+    )
+    batch = serializers.UUIDField(label="выпуск", read_only=True)
+
+
+class VoucherRedeemSerializer(serializers.Serializer):
+    vouchers = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=MAX_REDEEMED_VOUCHERS,
+        label="ваучеры",
+    )
+
+
 class LoyaltyCardSerializer(serializers.ModelSerializer):
     buyer_on_read = serializers.HyperlinkedRelatedField(
         label="покупатель",
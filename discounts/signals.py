@@ -0,0 +1,94 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from products.models import Category, Product, ProductUnit
+from utils import cache as response_cache
+
+from . import memberships, offer_index, scheduler
+from .models import Benefit, Condition, Offer, Range
+
+
+@receiver(post_save, sender=Offer)
+def schedule_offer(sender, instance, raw=False, **kwargs):
+    # fixtures are scheduled by `reschedule_offers`
+    if not raw:
+        scheduler.schedule([instance])
+
+
+# offers may be linked to other conditions and benefits
+@receiver(post_save, sender=Offer)
+@receiver(post_save, sender=Range)
+@receiver(post_save, sender=Condition)
+@receiver(post_save, sender=Benefit)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductUnit)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Offer)
+@receiver(post_delete, sender=Range)
+@receiver(post_delete, sender=Condition)
+@receiver(post_delete, sender=Benefit)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductUnit)
+@receiver(post_delete, sender=Category)
+def invalidate_offer_index(sender, **kwargs):
+    offer_index.invalidate()
+
+
+@receiver(m2m_changed, sender=Range.include_product_units.through)
+@receiver(m2m_changed, sender=Range.include_products.through)
+@receiver(m2m_changed, sender=Range.include_categories.through)
+@receiver(m2m_changed, sender=Range.exclude_product_units.through)
+@receiver(m2m_changed, sender=Range.exclude_products.through)
+@receiver(m2m_changed, sender=Range.exclude_categories.through)
+def invalidate_offer_index_on_range_change(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        offer_index.invalidate()
+        response_cache.invalidate("offers")
+
+
+@receiver(post_save, sender=Range)
+def refresh_range_memberships(sender, instance, raw=False, **kwargs):
+    # fixtures are refreshed by `loaddata`
+    if not raw:
+        memberships.refresh(ranges=Range.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductUnit)
+def refresh_unit_memberships(sender, instance, raw=False, **kwargs):
+    if not raw:
+        memberships.refresh(units=memberships.get_units(instance))
+
+
+@receiver(pre_delete, sender=Category)
+def keep_category_units(sender, instance, **kwargs):
+    # products of a deleted category lose it by a bulk update
+    instance.range_unit_pks = list(
+        memberships.get_units(instance).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Category)
+def refresh_category_memberships(sender, instance, **kwargs):
+    memberships.refresh(
+        units=ProductUnit.objects.filter(pk__in=instance.range_unit_pks)
+    )
+
+
+@receiver(m2m_changed, sender=Range.include_product_units.through)
+@receiver(m2m_changed, sender=Range.include_products.through)
+@receiver(m2m_changed, sender=Range.include_categories.through)
+@receiver(m2m_changed, sender=Range.exclude_product_units.through)
+@receiver(m2m_changed, sender=Range.exclude_products.through)
+@receiver(m2m_changed, sender=Range.exclude_categories.through)
+def refresh_memberships_on_range_change(sender, instance, action, reverse, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    # e.g. `product.include_ranges.add(range)`
+    if reverse:
+        memberships.refresh(units=memberships.get_units(instance))
+    else:
+        memberships.refresh(ranges=Range.objects.filter(pk=instance.pk))
+
+
+response_cache.invalidate_on_change("offers", Benefit, Condition, Offer, Range)
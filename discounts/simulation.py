@@ -0,0 +1,234 @@
+"""
+What-if simulation of offers over historical sales.
+
+Sale documents are replayed as baskets through the rules of
+`basket.pricing.price_basket`, evaluated for all the lines at once with
+NumPy instead of basket by basket. Lines are priced as they were sold, and
+costed by the highest incoming costs of their warehouses.
+"""
+from datetime import date
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from basket import pricing
+from internal_api.models import WarehouseRecord
+
+from .models import Offer
+from .offer_index import CompiledRange, get_offer_index
+
+LINE_COLUMNS = ("basket", "unit_id", "quantity", "price", "unit_cost")
+CHUNK_SIZE = 10000
+
+
+def load_lines(
+    date_from: date,
+    date_to: date,
+    shop_id: Optional[int] = None,
+) -> pd.DataFrame:
+    """Lines of the sales (not cancelled) within dates, a basket per document."""
+    records = WarehouseRecord._base_manager.filter(
+        document__sale_document__isnull=False,
+        document__cancelled_by__isnull=True,
+        document__created_at__range=(date_from, date_to),
+    )
+    if shop_id is not None:
+        records = records.filter(warehouse__shop_id=shop_id)
+    rows = records.values_list(
+        "document_id",
+        "warehouse__product_unit_id",
+        "quantity",
+        "cost",
+        "warehouse__balance__cost",
+    )
+    lines = pd.DataFrame.from_records(
+        rows.iterator(chunk_size=CHUNK_SIZE),
+        columns=LINE_COLUMNS,
+    )
+    for column in ("quantity", "price", "unit_cost"):
+        lines[column] = pd.to_numeric(lines[column], errors="coerce")
+    # sales are recorded as negative quantities
+    lines["quantity"] = -lines["quantity"]
+    return lines
+
+
+def covers(compiled: CompiledRange, unit_ids: pd.Series) -> np.ndarray:
+    if compiled.includes_all:
+        return ~unit_ids.isin(compiled.excluded).to_numpy()
+    return unit_ids.isin(compiled.units).to_numpy()
+
+
+def count_applications(
+    rule: pricing.OfferRule,
+    in_range: np.ndarray,
+    lines: pd.DataFrame,
+    codes: np.ndarray,
+    size: int,
+) -> np.ndarray:
+    """`pricing.count_applications` for every basket."""
+    match rule.condition_type:
+        case "value":
+            weights = lines["quantity"] * lines["price"]
+            weights = np.where(in_range, weights.fillna(0).to_numpy(), 0)
+        case "count":
+            weights = np.where(in_range, lines["quantity"].to_numpy(), 0)
+        case "coverage":
+            weights = in_range.astype(float)
+        case unknown:  # noqa: F821
+            raise pricing.PricingError(
+                f"Unknown condition type: {unknown}"  # noqa: F821
+            )
+    in_basket = np.bincount(codes, weights=weights, minlength=size)
+
+    # condition value should not be 0
+    condition_value = float(rule.condition_value)
+    if condition_value <= 0:
+        return np.zeros(size)
+    # decimal division is exact, e.g. 0.3 // 0.1 == 3
+    apply_times = np.floor(np.round(in_basket / condition_value, 9))
+
+    # abide offer limit per purchase
+    if rule.order_limit > 0:
+        apply_times = np.minimum(apply_times, rule.order_limit)
+    return np.maximum(apply_times, 0)
+
+
+def apply_benefit(
+    rule: pricing.OfferRule,
+    apply_times: np.ndarray,
+    in_range: np.ndarray,
+    prices: np.ndarray,
+    quantities: np.ndarray,
+    codes: np.ndarray,
+) -> np.ndarray:
+    """`pricing.apply_benefit` for every basket. Returns discounted prices."""
+    size = len(apply_times)
+    line_times = apply_times[codes]
+    benefit_value = float(rule.benefit_value)
+    match rule.benefit_type:
+        case "percentage":
+            factor = ((100 - benefit_value) / 100) ** line_times
+            return np.where(in_range, prices * factor, prices)
+        case "absolute" | "fixed-price":
+            line_totals = np.where(in_range, prices * quantities, 0)
+            full_totals = np.bincount(codes, weights=line_totals, minlength=size)
+            if rule.benefit_type == "absolute":
+                target_totals = full_totals - benefit_value * apply_times
+            else:
+                target_totals = benefit_value * apply_times
+            # share the discount proportionally to line totals, never going
+            # below zero or above the full price
+            factor = np.divide(
+                np.clip(target_totals, 0, np.maximum(full_totals, 0)),
+                full_totals,
+                out=np.ones(size),
+                where=full_totals > 0,
+            )
+            return np.where(in_range, prices * factor[codes], prices)
+        case "multibuy":
+            line_totals = np.where(in_range, prices * quantities, np.inf)
+            # the first of the cheapest lines of every basket
+            order = np.lexsort((np.arange(len(prices)), line_totals, codes))
+            ordered_codes = codes[order]
+            first = order[np.r_[True, ordered_codes[1:] != ordered_codes[:-1]]]
+            prices = prices.copy()
+            prices[first[in_range[first]]] = 0
+            return prices
+        case unknown:  # noqa: F821
+            raise pricing.PricingError(f"Unknown benefit type: {unknown}")  # noqa: F821
+
+
+def simulate_lines(
+    lines: pd.DataFrame,
+    offers: Mapping[int, pricing.OfferRule],
+    ranges: Mapping[int, Tuple[CompiledRange, CompiledRange]],
+) -> Tuple[np.ndarray, Dict[int, Dict]]:
+    """
+    Apply offers to basket lines, as `pricing.price_basket` does to every
+    basket. `ranges` are condition and benefit ranges by offers.
+
+    Returns discounted prices of the lines (`NaN` for unpriced ones), and
+    baskets and discount by offers.
+    """
+    codes, baskets = pd.factorize(lines["basket"])
+    size = len(baskets)
+    unit_ids = lines["unit_id"]
+    quantities = lines["quantity"].to_numpy(dtype=float)
+    prices = lines["price"].to_numpy(dtype=float)
+    priced = ~np.isnan(prices)
+
+    # offers are evaluated against the full prices
+    applied = {}
+    for offer_pk, rule in offers.items():
+        condition_range, _ = ranges[offer_pk]
+        apply_times = count_applications(
+            rule, covers(condition_range, unit_ids), lines, codes, size
+        )
+        if apply_times.any():
+            applied[offer_pk] = apply_times
+
+    results = {}
+    for offer_pk, apply_times in applied.items():
+        _, benefit_range = ranges[offer_pk]
+        in_range = covers(benefit_range, unit_ids) & priced & (apply_times[codes] > 0)
+        discounted = apply_benefit(
+            offers[offer_pk], apply_times, in_range, prices, quantities, codes
+        )
+        results[offer_pk] = {
+            "baskets": len(np.unique(codes[in_range])),
+            "discount": np.nansum(quantities * (prices - discounted)),
+        }
+        prices = discounted
+
+    # align the decimal point
+    return np.round(prices, 2), results
+
+
+def simulate(
+    offer_pks: Iterable[int],
+    date_from: date,
+    date_to: date,
+    shop_id: Optional[int] = None,
+) -> Dict:
+    """
+    Replay the sales within dates with given offers (whether active or
+    not), as if they were available to every basket.
+    """
+    index = get_offer_index()
+    offer_table = pricing.compile_offers(
+        Offer.objects.filter(pk__in=offer_pks).select_related("condition", "benefit")
+    )
+    ranges = {
+        offer_pk: (
+            index.ranges[index.offer_ranges[offer_pk]["condition"]],
+            index.ranges[index.offer_ranges[offer_pk]["benefit"]],
+        )
+        for offer_pk in offer_table
+    }
+
+    lines = load_lines(date_from, date_to, shop_id)
+    discounted, results = simulate_lines(lines, offer_table, ranges)
+    quantities, prices = lines["quantity"], lines["price"]
+    discounts = quantities * (prices - discounted)
+    margins = quantities * (prices - lines["unit_cost"])
+
+    def total(values) -> float:
+        return round(float(np.nansum(values)), 2)
+
+    return {
+        "baskets": lines["basket"].nunique(),
+        "affected_baskets": lines.loc[discounts > 0, "basket"].nunique(),
+        "revenue": total(quantities * prices),
+        "discount": total(discounts),
+        # lines of unknown costs are left out
+        "margin": total(margins),
+        "simulated_margin": total(margins - discounts),
+        "offers": {
+            offer_pk: {
+                "baskets": result["baskets"],
+                "discount": total(result["discount"]),
+            }
+            for offer_pk, result in results.items()
+        },
+    }
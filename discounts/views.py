@@ -1,7 +1,11 @@
+import uuid
+
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
@@ -11,6 +15,7 @@ from rest_framework_nested.viewsets import NestedViewSetMixin
 
 from utils import permissions as perms
 
+from . import counters, tasks, vouchers
 from .filters import BuyerCountFilter, OfferFilterSet, VoucherFilter
 from .models import BuyerCount, LoyaltyCard, Offer, Range, Voucher
 from .serializers import (
@@ -19,6 +24,8 @@ from .serializers import (
     OfferApplySerializer,
     OfferSerializer,
     RangeSerializer,
+    VoucherGenerateSerializer,
+    VoucherRedeemSerializer,
     VoucherSerializer,
 )
 
@@ -56,11 +63,8 @@ class OfferViewSet(ModelViewSet):
 
         match offer.type:
             case Offer.TYPES.site:
-                offer.application_count += 1
-                # `site_limit == 0` means unlimited offer
-                if 0 < offer.site_limit <= offer.application_count:
-                    offer.is_active = False
-                offer.save()
+                if not counters.count_offer(offer):
+                    raise ValidationError("Offer is not available.")
 
             case Offer.TYPES.buyer:
                 request_serializer = OfferApplySerializer(data=request.data)
@@ -73,13 +77,8 @@ class OfferViewSet(ModelViewSet):
                     get_user_model().objects,
                     phone_number=phone_number,
                 )
-                count, _ = offer.buyer_counts.get_or_create(buyer=buyer)
-                # `buyer_limit == 0` means no limit for a single buyer
-                if 0 < offer.buyer_limit <= count.application_count:
+                if not counters.count_buyer(offer, buyer):
                     raise ValidationError(f"Offer is out of limits for {buyer}.")
-                else:
-                    count.application_count += 1
-                    count.save()
 
             case other_type:
                 raise ValidationError(f"Wrong offer type: {other_type}.")  # noqa: F821
@@ -129,15 +128,61 @@ class VoucherViewSet(ModelViewSet):
             read=perms.allow_staff,
             write=perms.allow_staff,
             apply=perms.allow_staff,
+            generate=perms.allow_staff,
+            export=perms.allow_staff,
+            redeem=perms.allow_staff,
         ),
     )
 
+    @action(methods=("post",), detail=False)
+    def generate(self, request, **kwargs):
+        """
+        Queue generation of vouchers. Generated vouchers are exported by
+        the returned `batch`.
+        """
+        serializer = VoucherGenerateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        batch = uuid.uuid4()
+        tasks.generate_vouchers.delay(
+            serializer.validated_data["offer"].id,
+            serializer.validated_data["count"],
+            str(batch),
+        )
+        return Response(
+            status=status.HTTP_202_ACCEPTED,
+            data={**serializer.data, "batch": batch},
+        )
+
+    @action(methods=("get",), detail=False)
+    def export(self, request, **kwargs):
+        """Filtered vouchers as CSV."""
+        response = StreamingHttpResponse(
+            vouchers.iter_csv(self.filter_queryset(self.get_queryset())),
+            content_type="text/csv",
+        )
+        response["Content-Disposition"] = 'attachment; filename="vouchers.csv"'
+        return response
+
+    @action(methods=("post",), detail=False)
+    @transaction.atomic
+    def redeem(self, request, **kwargs):
+        """Apply many vouchers at once, or none of them if any is invalid."""
+        serializer = VoucherRedeemSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        redeemed = vouchers.redeem(serializer.validated_data["vouchers"])
+        return Response({"redeemed": redeemed})
+
     @action(methods=("post",), detail=True)
     @transaction.atomic
     def apply(self, request, **kwargs):
         voucher = self.get_object()
-        if not voucher.is_active:
+        # redeem the voucher before the offer is counted
+        redeemed = Voucher.objects.filter(pk=voucher.pk, is_active=True).update(
+            is_active=False
+        )
+        if not redeemed:
             raise ValidationError("Voucher can not be applied more than once.")
+        voucher.is_active = False
 
         current_time = timezone.now()
         if not all(
@@ -149,10 +194,8 @@ class VoucherViewSet(ModelViewSet):
         ):
             raise ValidationError("Offer is not available.")
 
-        voucher.offer.application_count += 1
-        voucher.offer.save()
-        voucher.is_active = False
-        voucher.save()
+        if not counters.count_offer(voucher.offer):
+            raise ValidationError("Offer is not available.")
         serializer = self.get_serializer(voucher)
         return Response(serializer.data)
 
@@ -194,8 +237,8 @@ class LoyaltyCardViewSet(ModelViewSet):
         ):
             raise ValidationError("Offer is not available.")
 
-        card.application_count += 1
-        card.save()
+        if not counters.count_card(card):
+            raise ValidationError("Card is inactive.")
 
         serializer = self.get_serializer(card)
         return Response(serializer.data)
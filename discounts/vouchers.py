@@ -0,0 +1,83 @@
+"""
+Vouchers in bulk: generation in large batches, CSV export, and redemption
+of many vouchers at once.
+"""
+import csv
+import uuid
+from collections import Counter
+from typing import Iterable, Iterator
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import counters
+from .models import Offer, Voucher
+
+BATCH_SIZE = 10000
+EXPORT_FIELDS = ("id", "offer_id", "batch", "is_active", "created_at")
+
+
+def generate(offer_id: int, count: int, batch: uuid.UUID):
+    """
+    Create `count` vouchers of a batch. Batches of vouchers are committed one
+    by one, and vouchers already created are counted, so an interrupted
+    generation is completed by a retry.
+    """
+    remaining = count - Voucher.objects.filter(batch=batch).count()
+    while remaining > 0:
+        size = min(remaining, BATCH_SIZE)
+        with transaction.atomic():
+            Voucher.objects.bulk_create(
+                [Voucher(offer_id=offer_id, batch=batch) for _ in range(size)]
+            )
+        remaining -= size
+
+
+class Echo:
+    """A file-like object returning what is written, for streaming."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(vouchers: QuerySet) -> Iterator[str]:
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    rows = vouchers.order_by("created_at", "id").values_list(*EXPORT_FIELDS)
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        yield writer.writerow(row)
+
+
+def redeem(ids: Iterable[uuid.UUID]) -> int:
+    """
+    Deactivate active vouchers of available offers, and count applications
+    of the offers. Raises `ValidationError` unless all vouchers are valid, so
+    it's to be called in a transaction. Returns the number of vouchers.
+    """
+    ids = set(ids)
+    now = timezone.now()
+    available = Voucher.objects.filter(
+        id__in=ids,
+        is_active=True,
+        offer__is_active=True,
+        offer__started_at__lte=now,
+        offer__ended_at__gte=now,
+    )
+    with transaction.atomic():
+        redeemed = available.update(is_active=False)
+        if redeemed < len(ids):
+            transaction.set_rollback(True)
+    if redeemed < len(ids):
+        invalid = ids - set(available.values_list("id", flat=True))
+        invalid = ", ".join(sorted(map(str, invalid)))
+        raise ValidationError(
+            {"vouchers": [f"Vouchers can not be applied: {invalid}."]}
+        )
+
+    offer_ids = Voucher.objects.filter(id__in=ids).values_list("offer_id", flat=True)
+    for offer_id, times in Counter(offer_ids).items():
+        if not counters.count_offer(Offer(pk=offer_id), times):
+            raise ValidationError(f"Offer {offer_id} is out of limits.")
+    return redeemed
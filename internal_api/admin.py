@@ -1,18 +1,7 @@
-from decimal import Decimal
-
 from django import forms
 from django.contrib import admin
-from django.db.models import (
-    CharField,
-    DecimalField,
-    ExpressionWrapper,
-    F,
-    OuterRef,
-    Subquery,
-    Sum,
-    Value,
-)
-from django.db.models.functions import Coalesce, Concat
+from django.db.models import CharField, ExpressionWrapper, F, OuterRef, Subquery, Value
+from django.db.models.functions import Concat
 from django.urls import path
 
 from products.models import ProductUnit
@@ -156,20 +145,6 @@ class WarehouseAdmin(admin.ModelAdmin):
     )
     ordering = ("product_unit__product__name", "product_unit__unit__name")
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        # TODO: implement this as a custom queryset method
-        return qs.annotate(
-            remaining=Coalesce(
-                Sum("warehouse_records__quantity"),
-                Decimal(0),
-                output_field=DecimalField(
-                    max_digits=9,
-                    decimal_places=4,
-                ),
-            )
-        )
-
     def remaining(self, obj):
         return obj.remaining
 
@@ -0,0 +1,65 @@
+"""
+Sales aggregations for analytics dashboards, done in the database.
+"""
+from decimal import Decimal
+from typing import Literal, Optional
+
+from django.db.models import Count, F, QuerySet, Sum
+from django.db.models.functions import Abs, NullIf
+
+from .models import WarehouseRecord
+
+POPULARITY_GROUPS = {
+    "product": "product_unit__product",
+    "category": "product_unit__product__category",
+}
+
+
+def get_popularity(
+    facts: QuerySet,
+    by: Literal["product", "category"] = "product",
+    top: Optional[int] = None,
+) -> QuerySet:
+    """
+    Quantity, revenue (`cost`) and average price (`popularity`) of the
+    products (or categories) in given sales facts (see `.sales`), largest
+    revenue first, optionally limited to `top` rows.
+    """
+    group = POPULARITY_GROUPS[by]
+    qs = (
+        facts.values(item_id=F(group), name=F(f"{group}__name"))
+        .annotate(cost=Sum("amount"), quantity=Sum("quantity"))
+        .annotate(popularity=F("cost") / NullIf(F("quantity"), Decimal(0)))
+        # sold quantities are negative
+        .order_by(Abs("cost").desc(nulls_last=True), "item_id")
+    )
+    if top:
+        qs = qs[:top]
+    return qs
+
+
+def get_cashiers(sale_documents: QuerySet) -> QuerySet:
+    """
+    Proceeds, quantity of goods and number of checks of given sale documents
+    by cashier and shop, with cashier names and shop addresses.
+    """
+    return (
+        WarehouseRecord._base_manager.filter(
+            document_id__in=sale_documents.values("pk"),
+        )
+        .values(
+            cashier_id=F("document__author_id"),
+            cashier_name=F("document__author__name"),
+            cashier_surname=F("document__author__surname"),
+            shop_id=F("warehouse__shop_id"),
+            shop_name=F("warehouse__shop__name"),
+            shop_address=F("warehouse__shop__address"),
+        )
+        # proceeds go first, as the aggregates shadow the fields
+        .annotate(
+            proceeds=Sum(F("cost") * F("quantity")),
+            quantity=Sum("quantity"),
+            checks=Count("document_id", distinct=True),
+        )
+        .order_by("cashier_id", "shop_id")
+    )
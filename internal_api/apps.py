@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SupplyConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "internal_api"
+
+    def ready(self):
+        from . import signals  # noqa
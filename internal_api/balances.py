@@ -0,0 +1,260 @@
+"""
+Maintenance of `WarehouseBalance` rows.
+
+A balance holds the aggregates of a warehouse's records: the sum of
+quantities, the highest cost of incoming records, and the time of the latest
+record. Records saved or deleted one by one are accounted for by signal
+receivers (see `.signals`); code that uses `bulk_create` on records must call
+`apply_records` itself.
+
+Daily snapshots (`WarehouseSnapshot`) hold closing balances, so that a balance
+at any moment in the past is a snapshot plus the records created after it.
+Records changed or deleted after the snapshots of their time were taken are
+accounted for in the snapshots by `adjust_snapshots`.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from django.db import transaction
+from django.db.models import (
+    DecimalField,
+    F,
+    Max,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Warehouse, WarehouseBalance, WarehouseRecord, WarehouseSnapshot
+
+
+class Balance(NamedTuple):
+    remaining: Decimal
+    cost: Optional[Decimal]
+    moved_at: Optional[object]
+
+
+def record_cost(record) -> Optional[Decimal]:
+    # `orders.models.WarehouseRecord` aliases the cost column
+    if hasattr(record, "cost"):
+        return record.cost
+    return getattr(record, "discounted_price", None)
+
+
+def apply_records(records: Iterable):
+    """Account for newly created records."""
+    changes = defaultdict(lambda: [Decimal(0), None, None])
+    for record in records:
+        change = changes[record.warehouse_id]
+        quantity = Decimal(str(record.quantity))
+        change[0] += quantity
+        cost = record_cost(record)
+        if quantity > 0 and cost is not None:
+            change[1] = cost if change[1] is None else max(change[1], cost)
+        moved_at = record.created_at or timezone.now()
+        change[2] = moved_at if change[2] is None else max(change[2], moved_at)
+
+    missing = []
+    for warehouse_id, (quantity, cost, moved_at) in changes.items():
+        fields = {
+            "remaining": F("remaining") + quantity,
+            # `GREATEST` ignores nulls in PostgreSQL
+            "moved_at": Greatest("moved_at", Value(moved_at)),
+        }
+        if cost is not None:
+            fields["cost"] = Greatest("cost", Value(cost))
+        if not WarehouseBalance.objects.filter(warehouse_id=warehouse_id).update(
+            **fields
+        ):
+            missing.append(warehouse_id)
+
+    if missing:
+        recalculate(missing)
+
+
+def remove_record(record):
+    """Account for a deleted record."""
+    WarehouseBalance.objects.filter(warehouse_id=record.warehouse_id).update(
+        remaining=F("remaining") - record.quantity,
+    )
+    # the record might have defined the cost or the time of the last movement
+    cost = record_cost(record)
+    condition = Q(moved_at=record.created_at)
+    if record.quantity > 0 and cost is not None:
+        condition |= Q(cost=cost)
+    aggregates = aggregate_subqueries()
+    WarehouseBalance.objects.filter(warehouse_id=record.warehouse_id).filter(
+        condition
+    ).update(cost=aggregates["cost"], moved_at=aggregates["moved_at"])
+
+
+def adjust_snapshots(records: Iterable, sign: int = 1):
+    """
+    Add (or, with `sign=-1`, subtract) quantities of records to the
+    snapshots taken after the records were created.
+    """
+    for record in records:
+        WarehouseSnapshot.objects.filter(
+            warehouse_id=record.warehouse_id,
+            closed_at__gt=record.created_at,
+        ).update(remaining=F("remaining") + sign * Decimal(str(record.quantity)))
+
+
+def aggregate_subqueries() -> Dict[str, Subquery]:
+    records = WarehouseRecord._base_manager.filter(
+        warehouse_id=OuterRef("warehouse_id")
+    ).values("warehouse_id")
+    return {
+        "remaining": Coalesce(
+            Subquery(records.annotate(x=Sum("quantity")).values("x")),
+            Decimal(0),
+        ),
+        "cost": Subquery(
+            records.annotate(x=Max("cost", filter=Q(quantity__gt=0))).values("x")
+        ),
+        "moved_at": Subquery(records.annotate(x=Max("created_at")).values("x")),
+    }
+
+
+@transaction.atomic
+def recalculate(warehouse_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recalculate balances of given warehouses (or all of them) from records.
+    Returns the number of balances updated.
+    """
+    warehouse_qs = Warehouse._base_manager.all()
+    if warehouse_ids is not None:
+        warehouse_qs = warehouse_qs.filter(pk__in=list(warehouse_ids))
+    WarehouseBalance.objects.bulk_create(
+        [
+            WarehouseBalance(warehouse_id=warehouse_id)
+            for warehouse_id in warehouse_qs.filter(balance__isnull=True).values_list(
+                "pk", flat=True
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    return WarehouseBalance.objects.filter(
+        warehouse_id__in=warehouse_qs.values("pk")
+    ).update(**aggregate_subqueries())
+
+
+def find_discrepancies(
+    warehouse_ids: Optional[Iterable[int]] = None,
+) -> List[tuple]:
+    """
+    Compare balances with the records. Returns a list of
+    `(warehouse Id, stored balance, actual balance)` for the balances that
+    don't match (missing balances are `None`).
+    """
+    record_qs = WarehouseRecord._base_manager.all()
+    warehouse_qs = Warehouse._base_manager.all()
+    if warehouse_ids is not None:
+        warehouse_ids = list(warehouse_ids)
+        record_qs = record_qs.filter(warehouse_id__in=warehouse_ids)
+        warehouse_qs = warehouse_qs.filter(pk__in=warehouse_ids)
+
+    actual = {
+        warehouse_id: Balance(*values)
+        for warehouse_id, *values in record_qs.values("warehouse_id")
+        .annotate(
+            remaining=Sum("quantity"),
+            cost=Max("cost", filter=Q(quantity__gt=0)),
+            moved_at=Max("created_at"),
+        )
+        .values_list("warehouse_id", "remaining", "cost", "moved_at")
+    }
+    stored = {
+        warehouse_id: Balance(*values)
+        for warehouse_id, *values in WarehouseBalance.objects.filter(
+            warehouse_id__in=warehouse_qs.values("pk")
+        ).values_list("warehouse_id", "remaining", "cost", "moved_at")
+    }
+
+    result = []
+    for warehouse_id in warehouse_qs.order_by("pk").values_list("pk", flat=True):
+        expected = actual.get(warehouse_id, Balance(Decimal(0), None, None))
+        balance = stored.get(warehouse_id)
+        if balance != expected:
+            result.append((warehouse_id, balance, expected))
+    return result
+
+
+def end_of_day(date: datetime.date) -> datetime.datetime:
+    return timezone.make_aware(
+        datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time())
+    )
+
+
+def annotate_remaining_as_of(
+    qs: QuerySet,
+    moment: datetime.datetime,
+) -> QuerySet:
+    """
+    Annotate warehouses with `remaining` at a given moment, using the latest
+    snapshot taken before it.
+    """
+    snapshots = WarehouseSnapshot.objects.filter(
+        warehouse_id=OuterRef("pk"),
+        closed_at__lte=moment,
+    ).order_by("-closed_at")
+    records = (
+        WarehouseRecord._base_manager.filter(
+            warehouse_id=OuterRef("pk"),
+            created_at__lt=moment,
+            created_at__gte=Coalesce(
+                OuterRef("snapshot_closed_at"),
+                Value(datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)),
+            ),
+        )
+        .values("warehouse_id")
+        .annotate(x=Sum("quantity"))
+        .values("x")
+    )
+    return qs.annotate(
+        snapshot_closed_at=Subquery(snapshots.values("closed_at")[:1]),
+        remaining=Coalesce(
+            Subquery(snapshots.values("remaining")[:1]),
+            Decimal(0),
+            output_field=DecimalField(max_digits=15, decimal_places=4),
+        )
+        + Coalesce(Subquery(records), Decimal(0)),
+    )
+
+
+@transaction.atomic
+def take_snapshots(date: datetime.date, everything: bool = False) -> int:
+    """
+    Store closing balances for a given day of the warehouses that had
+    movements that day (or all warehouses). Returns the number of snapshots.
+    """
+    closed_at = end_of_day(date)
+    warehouse_qs = Warehouse._base_manager.all()
+    if not everything:
+        warehouse_qs = warehouse_qs.filter(
+            warehouse_records__created_at__gte=end_of_day(
+                date - datetime.timedelta(days=1)
+            ),
+            warehouse_records__created_at__lt=closed_at,
+        ).distinct()
+
+    WarehouseSnapshot.objects.filter(date=date).delete()
+    snapshots = WarehouseSnapshot.objects.bulk_create(
+        WarehouseSnapshot(
+            warehouse_id=warehouse_id,
+            date=date,
+            closed_at=closed_at,
+            remaining=remaining,
+        )
+        for warehouse_id, remaining in annotate_remaining_as_of(
+            warehouse_qs, closed_at
+        ).values_list("pk", "remaining")
+    )
+    return len(snapshots)
@@ -1,91 +1,247 @@
+"""
+Analytics dashboards over websockets.
+
+A client sends its filters, and gets the data once in full, and then only
+what changed since. Consumers with the same filters share one periodic
+computation (a feed) and receive its changes through a channel layer group,
+so the database load depends on the number of distinct filter sets rather
+than on the number of open dashboards. A feed stops when its last consumer
+disconnects.
+
+Feeds are kept per process, as is the in-memory channel layer.
+"""
+import asyncio
+import hashlib
 import json
-import threading
-import time
-from io import StringIO
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional
 
-from channels.generic.websocket import WebsocketConsumer
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.layers import get_channel_layer
 
-from internal_api.filters import AnaliticsFilter, WriteOffDocumentFilter
-from internal_api.models.primary_documents import SaleDocument, WriteOffDocument
+from internal_api.analytics import POPULARITY_GROUPS, get_cashiers
+from internal_api.filters import AnaliticsFilter, SalesFactFilter
+from internal_api.models import SaleDocument, SalesFact, Shop
 from internal_api.serializers.analytics import (
     CashiersSerializer,
+    CashierTotalsSerializer,
     PopularitySerializer,
     SaleDocumentSerializer,
 )
 
-
-def send_analytics_function(socker, sale_documents, query, interval):
-    while True:
-        socker.send(
-            text_data=json.dumps(
-                {
-                    "analytics": {
-                        "sales": SaleDocumentSerializer(
-                            sale_documents, many=True, query=query
-                        ).data,
-                        "popularity": PopularitySerializer(sale_documents).data,
-                    }
+# section name to items by Id
+State = Dict[str, Dict[str, dict]]
+
+MIN_INTERVAL = 1
+
+
+def get_changes(previous: State, current: State) -> Optional[dict]:
+    """
+    Items that were added or changed since the previous state, and Ids of the
+    removed ones. `None` if nothing changed.
+    """
+    changed, removed = {}, {}
+    for section, items in current.items():
+        old_items = previous.get(section, {})
+        changed[section] = {
+            pk: item for pk, item in items.items() if old_items.get(pk) != item
+        }
+        removed[section] = [pk for pk in old_items if pk not in items]
+    if not any(changed.values()) and not any(removed.values()):
+        return None
+    return {"changed": changed, "removed": removed}
+
+
+class Feed:
+    """Periodic computation shared by the consumers of a group."""
+
+    def __init__(
+        self,
+        group: str,
+        compute: Callable[[], State],
+        render: Callable[[State], dict],
+        interval: int,
+    ):
+        self.group = group
+        self.compute = compute
+        self.render = render
+        self.interval = interval
+        self.subscribers = 0
+        self.state: Optional[State] = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        channel_layer = get_channel_layer()
+        while True:
+            state = await database_sync_to_async(self.compute)()
+            if self.state is None:
+                message = self.render(state)
+            else:
+                changes = get_changes(self.state, state)
+                message = changes and {
+                    **self.render(changes["changed"]),
+                    "removed": changes["removed"],
                 }
-            )
-        )
-        time.sleep(interval)
+            # late subscribers get the state in full, so it is updated first
+            self.state = state
+            if message:
+                await channel_layer.group_send(
+                    self.group,
+                    {"type": "feed.message", "text": json.dumps(message)},
+                )
+            await asyncio.sleep(self.interval)
 
 
-def send_cashiers_function(socker, sale_documents, query, interval):
-    while True:
-        socker.send(
-            text_data=json.dumps(
-                {"cashiers": CashiersSerializer(sale_documents, many=True).data}
-            )
-        )
-        time.sleep(interval)
+_feeds: Dict[str, Feed] = {}
 
 
-class AnalyticsConsumer(WebsocketConsumer):
-    def connect(self):
-        self.accept()
+class FeedConsumer(AsyncWebsocketConsumer, ABC):
+    """
+    Subscribes to a feed of the filters received from the client. Subclasses
+    define what is computed and how it is rendered.
+    """
 
-    def disconnect(self, close_code):
-        self.close(close_code)
+    name: str
 
-    def receive(self, text_data):
-        str_io = StringIO(text_data)
-        query_params = json.load(str_io)
-        filter_params = query_params.get("filters")
-        query = query_params.get("query")
-        sale_documents = AnaliticsFilter(
-            data=filter_params, queryset=SaleDocument.objects
-        ).qs
-        interval = int(query_params.get("interval"))
-
-        x = threading.Thread(
-            target=send_analytics_function,
-            name="228",
-            args=(self, sale_documents, query, interval),
-        )
-        x.start()
-
-
-class AnalyticsCashiersConsumer(WebsocketConsumer):
-    def connect(self):
-        self.accept()
-
-    def disconnect(self, close_code):
-        self.close(close_code)
-
-    def receive(self, text_data):
-        str_io = StringIO(text_data)
-        query_params = json.load(str_io)
-        filter_params = query_params.get("filters")
-        query = query_params.get("query")
-        sale_documents = AnaliticsFilter(
-            data=filter_params, queryset=SaleDocument.objects
+    feed: Optional[Feed] = None
+
+    @abstractmethod
+    def get_state(self, sale_documents, params: dict) -> State:
+        """Items of sections to send, by Ids."""
+
+    @abstractmethod
+    def render(self, state: State) -> dict:
+        """A message of (changed) items."""
+
+    async def connect(self):
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        await self.unsubscribe()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        query_params = json.loads(text_data)
+        try:
+            interval = int(query_params.get("interval", MIN_INTERVAL))
+        except (TypeError, ValueError):
+            await self.send(
+                text_data=json.dumps(
+                    {"errors": {"interval": ["Требуется целое число."]}}
+                )
+            )
+            return
+        query_params["interval"] = max(interval, MIN_INTERVAL)
+
+        key = json.dumps([self.name, query_params], sort_keys=True, default=str)
+        group = f"{self.name}.{hashlib.sha1(key.encode()).hexdigest()}"
+        if self.feed is not None and self.feed.group == group:
+            return
+
+        await self.unsubscribe()
+        await self.subscribe(group, query_params)
+
+    async def subscribe(self, group, query_params):
+        feed = _feeds.get(group)
+        if feed is None:
+            get_state = self.get_state
+
+            def compute():
+                sale_documents = AnaliticsFilter(
+                    data=query_params.get("filters"), queryset=SaleDocument.objects
+                ).qs
+                return get_state(sale_documents, query_params)
+
+            feed = _feeds[group] = Feed(
+                group, compute, self.render, query_params["interval"]
+            )
+        feed.subscribers += 1
+        self.feed = feed
+
+        await self.channel_layer.group_add(group, self.channel_name)
+        # the task is restarted if it has failed
+        if feed.task is None or feed.task.done():
+            feed.task = asyncio.create_task(feed.run())
+        elif feed.state is not None:
+            await self.send(text_data=json.dumps(feed.render(feed.state)))
+
+    async def unsubscribe(self):
+        feed, self.feed = self.feed, None
+        if feed is None:
+            return
+
+        await self.channel_layer.group_discard(feed.group, self.channel_name)
+        feed.subscribers -= 1
+        if feed.subscribers <= 0:
+            del _feeds[feed.group]
+            feed.task.cancel()
+
+    async def feed_message(self, event):
+        await self.send(text_data=event["text"])
+
+
+class AnalyticsConsumer(FeedConsumer):
+    name = "analytics"
+
+    def get_state(self, sale_documents, params):
+        sales = SaleDocumentSerializer(
+            sale_documents.prefetch_related("warehouse_records"),
+            many=True,
+            query=params.get("query"),
+        ).data
+        # popularity is rolled up by products or categories,
+        # optionally limited to the top ones
+        by = params.get("by")
+        top = params.get("top")
+        facts = SalesFactFilter(
+            data=params.get("filters"), queryset=SalesFact.objects.all()
         ).qs
-        interval = int(query_params.get("interval"))
-
-        x = threading.Thread(
-            target=send_cashiers_function,
-            name="cashiers",
-            args=(self, sale_documents, query, interval),
-        )
-        x.start()
+        popularity = PopularitySerializer(
+            facts,
+            context={
+                "by": by if by in POPULARITY_GROUPS else "product",
+                "top": int(top) if top else None,
+            },
+        ).data["analytics"]
+        return {
+            "sales": {str(x["id"]): x for x in sales},
+            "popularity": {str(x["id"]): x for x in popularity},
+        }
+
+    def render(self, state):
+        return {
+            "analytics": {
+                "sales": list(state["sales"].values()),
+                "popularity": {"analytics": list(state["popularity"].values())},
+            }
+        }
+
+
+class AnalyticsCashiersConsumer(FeedConsumer):
+    """
+    Sends sale documents with their cashiers, or totals by cashier and shop
+    in "aggregate" mode.
+    """
+
+    name = "cashiers"
+
+    def get_state(self, sale_documents, params):
+        if params.get("mode") == "aggregate":
+            totals = CashierTotalsSerializer(
+                get_cashiers(sale_documents), many=True
+            ).data
+            return {"cashiers": {f"{x['cashier']}-{x['shop']}": x for x in totals}}
+
+        cashiers = CashiersSerializer(
+            sale_documents.select_related("author").prefetch_related(
+                "warehouse_records",
+                "author__orders",
+                "author__delivery_address",
+            ),
+            many=True,
+            context={"shops": dict(Shop.objects.values_list("pk", "address"))},
+        ).data
+        return {"cashiers": {str(x["id"]): x for x in cashiers}}
+
+    def render(self, state):
+        return {"cashiers": list(state["cashiers"].values())}
@@ -11,7 +11,7 @@ from haystack.inputs import Exact
 from products.models import Category, ProductUnit
 from utils.filters import FullTextFilter
 
-from . import models
+from . import balances, models
 
 
 class WarehouseFullTextFilter(FullTextFilter):
@@ -86,6 +86,10 @@ class WarehouseFilter(django_filters.FilterSet):
     remaining = django_filters.RangeFilter(
         label="отобрать по количеству на складе",
     )
+    as_of = django_filters.DateFilter(
+        method="as_of_filter",
+        label="остатки на конец дня",
+    )
     category = django_filters.CharFilter(
         method="in_category_filter",
         label="входит в категорию или её подкатегории (Id категории)",
@@ -141,6 +145,22 @@ class WarehouseFilter(django_filters.FilterSet):
         model = models.Warehouse
         fields = ("s",)
 
+    def filter_queryset(self, queryset):
+        # historical stock figures should replace the current ones before
+        # any other filter uses them
+        as_of = self.form.cleaned_data.get("as_of")
+        if as_of is not None:
+            queryset = balances.annotate_remaining_as_of(
+                queryset,
+                balances.end_of_day(as_of),
+            )
+        return super().filter_queryset(queryset)
+
+    @staticmethod
+    def as_of_filter(qs, name, value):
+        # see `filter_queryset`
+        return qs
+
     @staticmethod
     def in_category_filter(qs, name, value):
         try:
@@ -226,6 +246,8 @@ class WriteOffDocumentFilter(AnaliticsFilter):
 class GraphAnaliticsFilter(AnaliticsFilter):
     period = django_filters.CharFilter(method="period_filter")
 
+    date_field = "created_at"
+
     def period_filter(self, queryset, name, value):
         DAY = "day"
         WEEK = "week"
@@ -243,7 +265,7 @@ class GraphAnaliticsFilter(AnaliticsFilter):
             print("<<<<<<<<<<<<<<<<<<<<")
             print(DAY, value, datetime.datetime.now())
             print("<<<<<<<<<<<<<<<<<<<<")
-            return queryset.filter(created_at=current_date)
+            return queryset.filter(**{self.date_field: current_date})
         elif value == WEEK:
             print(year, month, day)
             weekday = calendar.weekday(year, month, day)
@@ -255,7 +277,12 @@ class GraphAnaliticsFilter(AnaliticsFilter):
             print(WEEK, value, queryset)
             print("<<<<<<<<<<<<<<<<<<<<")
             return queryset.filter(
-                created_at__range=[first_week_day_date, last_week_day_date]
+                **{
+                    f"{self.date_field}__range": [
+                        first_week_day_date,
+                        last_week_day_date,
+                    ]
+                }
             )
         else:
             num_days = monthrange(year, month)[1]  # num_days = 28
@@ -265,10 +292,29 @@ class GraphAnaliticsFilter(AnaliticsFilter):
             print(MONTH, value, datetime.datetime.now())
             print("<<<<<<<<<<<<<<<<<<<<")
             return queryset.filter(
-                created_at__range=[first_month_day_date, last_month_day_date]
+                **{
+                    f"{self.date_field}__range": [
+                        first_month_day_date,
+                        last_month_day_date,
+                    ]
+                }
             )
         return queryset
 
     class Meta:
         model = models.PrimaryDocument
         fields = ("created",)
+
+
+class SalesFactFilter(GraphAnaliticsFilter):
+    created = django_filters.DateFromToRangeFilter(
+        field_name="date",
+        label="период времени",
+    )
+    shop = django_filters.NumberFilter(label="магазин")
+
+    date_field = "date"
+
+    class Meta:
+        model = models.SalesFact
+        fields = ("created", "shop", "cashier")
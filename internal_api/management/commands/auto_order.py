@@ -1,29 +1,128 @@
+from decimal import Decimal
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from internal_api.models import (
+    Warehouse,
+    WarehouseBalance,
+    WarehouseOrder,
+    WarehouseOrderPositions,
+    WarehouseRecord,
+    Watermark,
+)
 
-from internal_api.models import Warehouse, WarehouseOrder, WarehouseOrderPositions
+WATERMARK = "auto_order"
 
 
 class Command(BaseCommand):
     help = "Обработка автоматических заказов"
 
-    def handle(self, *args, **options):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Process even if no stock has moved since the last run",
+        )
+
+    def handle(self, force, *args, **options):
         """
-        Iterate through auto orders. If particular stock is low (less than
-        the threshold), generate an order to resupply.
+        Find auto order stocks that are low (less than the threshold), and
+        generate orders to resupply, grouped by shop and supplier.
         """
-        for wh in Warehouse.objects.filter(auto_order=True).iterator():
-            if wh.remaining <= wh.min_remaining:
-                order, _ = WarehouseOrder.objects.get_or_create(
-                    status="approving",
-                    is_archive=False,
-                    supplier=wh.supplier,
-                    shop=wh.shop,
-                )
-                # TODO: m2m explicit intermediate seems a poor choice
-                WarehouseOrderPositions.objects.get_or_create(
-                    warehouse_order=order,
-                    product=wh.product,
-                    defaults={
-                        "quantity": wh.max_remaining - wh.remaining,
-                    },
-                )
+        # stock movements and order changes (e.g. an order got delivered)
+        # are the reasons to reconsider orders; warehouse settings changes
+        # require `--force`
+        last_change = max(
+            filter(
+                None,
+                (
+                    WarehouseBalance.objects.aggregate(x=Max("moved_at"))["x"],
+                    WarehouseOrder.objects.aggregate(x=Max("updated_at"))["x"],
+                ),
+            ),
+            default=None,
+        )
+        watermark = Watermark.get_value(WATERMARK)
+        if not force and None not in (last_change, watermark):
+            if last_change <= watermark:
+                return
+
+        self.create_orders()
+
+        if last_change is not None:
+            Watermark.set_value(WATERMARK, last_change)
+
+    @transaction.atomic
+    def create_orders(self):
+        # warehouses have no suppliers, so the one of the latest batch is used
+        last_supplier = (
+            WarehouseRecord._base_manager.filter(
+                warehouse_id=OuterRef("pk"),
+                batch__supplier__isnull=False,
+            )
+            .order_by("-created_at")
+            .values("batch__supplier_id")
+        )
+        low_stocks = (
+            Warehouse._base_manager.filter(auto_order=True)
+            .annotate(remaining=Coalesce(F("balance__remaining"), Decimal(0)))
+            .filter(remaining__lte=F("min_remaining"))
+            .annotate(last_supplier=Subquery(last_supplier[:1]))
+            .values_list(
+                "shop_id",
+                "last_supplier",
+                "product_unit_id",
+                "max_remaining",
+                "remaining",
+            )
+        )
+
+        groups = {}
+        for shop_id, supplier_id, unit_id, max_remaining, remaining in low_stocks:
+            groups.setdefault((shop_id, supplier_id), {})[unit_id] = (
+                max_remaining - remaining
+            )
+        if not groups:
+            return
+
+        # reuse pending orders, create the missing ones
+        orders = {}
+        for order in WarehouseOrder.objects.filter(
+            status="approving",
+            is_archive=False,
+            shop_id__in={shop_id for shop_id, _ in groups},
+        ).order_by("pk"):
+            orders.setdefault((order.shop_id, order.supplier_id), order)
+        new_orders = [
+            WarehouseOrder(status="approving", shop_id=shop_id, supplier_id=supplier_id)
+            for shop_id, supplier_id in groups
+            if (shop_id, supplier_id) not in orders
+        ]
+        WarehouseOrder.assign_numbers(new_orders)
+        for order in WarehouseOrder.objects.bulk_create(new_orders):
+            orders[order.shop_id, order.supplier_id] = order
+
+        # don't duplicate the positions already ordered
+        order_pks = {orders[key].pk for key in groups}
+        ordered = set(
+            WarehouseOrderPositions.objects.filter(
+                warehouse_order_id__in=order_pks,
+            ).values_list("warehouse_order_id", "product_unit_id")
+        )
+        positions = [
+            WarehouseOrderPositions(
+                warehouse_order=orders[key],
+                product_unit_id=product_unit_id,
+                quantity=quantity,
+            )
+            for key, units in groups.items()
+            for product_unit_id, quantity in units.items()
+            if (orders[key].pk, product_unit_id) not in ordered
+        ]
+        WarehouseOrderPositions.objects.bulk_create(positions)
+        self.stdout.write(
+            f"{len(new_orders)} orders created, {len(positions)} positions added."
+        )
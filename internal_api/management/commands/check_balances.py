@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...balances import find_discrepancies, recalculate
+
+
+class Command(BaseCommand):
+    help = "Проверка соответствия остатков запасов записям изменения запаса."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "warehouses",
+            nargs="*",
+            type=int,
+            help="Warehouse Ids (all warehouses if omitted)",
+        )
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Rebuild the balances that don't match",
+        )
+
+    def handle(self, warehouses, fix, *args, **options):
+        discrepancies = find_discrepancies(warehouses or None)
+        for warehouse_id, stored, actual in discrepancies:
+            self.stdout.write(f"Warehouse {warehouse_id}: {stored} != {actual}")
+
+        if not discrepancies:
+            self.stdout.write("All balances match.")
+        elif fix:
+            recalculate(x[0] for x in discrepancies)
+            self.stdout.write(f"{len(discrepancies)} balances rebuilt.")
+        else:
+            raise CommandError(f"{len(discrepancies)} balances don't match.")
@@ -1,12 +1,19 @@
 import os
 import warnings
-from itertools import chain, islice
+from itertools import chain, groupby, islice
 
+import ijson
 from django.core import serializers
 from django.core.management.base import CommandError
 from django.core.management.commands.loaddata import Command as BaseCommand
 from django.core.management.commands.loaddata import humanize
-from django.db import transaction
+from django.core.serializers.python import Deserializer as PythonDeserializer
+from django.db import DatabaseError, IntegrityError, router, transaction
+from django.db.models import signals
+
+from discounts import memberships
+
+from ... import search
 
 
 def iter_chunks(iterable, size):
@@ -23,16 +30,35 @@ def iter_chunks(iterable, size):
         next(islice(rest, size - 1, None), None)
 
 
+def can_bulk_create(model) -> bool:
+    """
+    Fixture objects are saved raw, bypassing `save` methods, so only signal
+    receivers and multi-table inheritance need objects saved one by one.
+    """
+    return not (
+        model._meta.parents
+        or signals.pre_save.has_listeners(model)
+        or signals.post_save.has_listeners(model)
+    )
+
+
 class Command(BaseCommand):
     help = "An improved version of Django's 'loaddata' command."
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.show_progress = False
+        self.loaded_models = set()
 
     def handle(self, *fixture_labels, **options):
         self.show_progress = options["verbosity"] >= 3
-        super().handle(*fixture_labels, **options)
+        self.chunk_size = options["chunk_size"]
+        # objects are queued for the search index by `save_objs`
+        with search.disconnected():
+            super().handle(*fixture_labels, **options)
+        # the membership receivers skip fixtures
+        if self.loaded_models.intersection(memberships.TRACKED_MODELS):
+            memberships.refresh()
 
     def add_arguments(self, parser):
         super().add_arguments(parser)
@@ -46,18 +72,81 @@ class Command(BaseCommand):
     def load_chunk(self, chunk, obj_count, loaded_count):
         """Loads a chunk of fixtures."""
         with transaction.atomic(using=self.using):
-            for obj in chunk:
-                obj_count += 1
-                if self.save_obj(obj):
-                    loaded_count += 1
-                    if self.show_progress:
-                        self.stdout.write(
-                            f"\rProcessed {loaded_count} objects.",
-                            ending="",
-                        )
+            for model, objs in groupby(chunk, key=lambda obj: type(obj.object)):
+                objs = list(objs)
+                obj_count += len(objs)
+                loaded_count += self.save_objs(model, objs)
+                if self.show_progress:
+                    self.stdout.write(
+                        f"\rProcessed {loaded_count} objects.",
+                        ending="",
+                    )
             return obj_count, loaded_count
 
-    def load_label(self, fixture_label, chunk_size=2000):
+    def save_objs(self, model, objs) -> int:
+        """
+        Saves objects of a model, new ones with `bulk_create` if possible.
+        Returns the number of saved objects.
+        """
+        bulk = []
+        if (
+            can_bulk_create(model)
+            and model._meta.app_config not in self.excluded_apps
+            and model not in self.excluded_models
+            and router.allow_migrate_model(self.using, model)
+        ):
+            # existing objects are updated
+            existing = set(
+                model._base_manager.using(self.using)
+                .filter(pk__in=[obj.object.pk for obj in objs])
+                .values_list("pk", flat=True)
+            )
+            bulk = [
+                obj
+                for obj in objs
+                if not (obj.m2m_data or obj.deferred_fields)
+                and obj.object.pk not in existing
+            ]
+
+        bulk_ids = {id(obj) for obj in bulk}
+        saved_count = 0
+        for obj in objs:
+            if id(obj) not in bulk_ids and self.save_obj(obj):
+                saved_count += 1
+        if bulk:
+            self.models.add(model)
+            try:
+                model._base_manager.using(self.using).bulk_create(
+                    [obj.object for obj in bulk]
+                )
+            # psycopg2 raises ValueError if data contains NUL chars.
+            except (DatabaseError, IntegrityError, ValueError) as e:
+                e.args = (f"Could not load {model._meta.label}: {e}",)
+                raise
+            saved_count += len(bulk)
+        search.enqueue(model, [obj.object.pk for obj in objs])
+        self.loaded_models.add(model)
+        return saved_count
+
+    def deserialize(self, fixture, ser_fmt, cmp_fmt):
+        if ser_fmt == "json" and cmp_fmt != "zip":
+            # parse objects one by one instead of loading the whole fixture
+            objects = ijson.items(fixture, "item", use_float=True)
+            return PythonDeserializer(
+                objects,
+                using=self.using,
+                ignorenonexistent=self.ignore,
+                handle_forward_references=True,
+            )
+        return serializers.deserialize(
+            ser_fmt,
+            fixture,
+            using=self.using,
+            ignorenonexistent=self.ignore,
+            handle_forward_references=True,
+        )
+
+    def load_label(self, fixture_label):
         """Loads fixtures files for a given label."""
         for fixture_file, fixture_dir, fixture_name in self.find_fixtures(
             fixture_label
@@ -73,16 +162,8 @@ class Command(BaseCommand):
                     f" from {humanize(fixture_dir)}."
                 )
             try:
-                # TODO: it is possible to conserve RAM here using `ijson`
-                #       instead of Django's built-in deserializer
-                objects = serializers.deserialize(
-                    ser_fmt,
-                    fixture,
-                    using=self.using,
-                    ignorenonexistent=self.ignore,
-                    handle_forward_references=True,
-                )
-                for chunk in iter_chunks(objects, chunk_size):
+                objects = self.deserialize(fixture, ser_fmt, cmp_fmt)
+                for chunk in iter_chunks(objects, self.chunk_size):
                     objects_in_fixture, loaded_objects_in_fixture = self.load_chunk(
                         chunk, objects_in_fixture, loaded_objects_in_fixture
                     )
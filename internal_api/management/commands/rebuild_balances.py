@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from ...balances import recalculate
+
+
+class Command(BaseCommand):
+    help = "Пересчёт остатков запасов по записям изменения запаса."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "warehouses",
+            nargs="*",
+            type=int,
+            help="Warehouse Ids (all warehouses if omitted)",
+        )
+
+    def handle(self, warehouses, *args, **options):
+        count = recalculate(warehouses or None)
+        self.stdout.write(f"{count} balances rebuilt.")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ...sales import rebuild
+
+
+class Command(BaseCommand):
+    help = "Пересчёт сводных данных о продажах по записям изменения запаса."
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(f"{count} sales facts rebuilt.")
@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ...balances import take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Сохранение остатков запасов на конец дня."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            type=datetime.date.fromisoformat,
+            help="Day to close, YYYY-MM-DD (yesterday by default)",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            dest="everything",
+            help="Take snapshots of all warehouses, not only of the moved ones",
+        )
+
+    def handle(self, date, everything, *args, **options):
+        if date is None:
+            date = timezone.localdate() - datetime.timedelta(days=1)
+        count = take_snapshots(date, everything=everything)
+        self.stdout.write(f"{count} snapshots taken for {date}.")
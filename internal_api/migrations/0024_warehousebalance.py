@@ -0,0 +1,61 @@
+# Generated by Django 4.0.6 on 2026-10-18 01:42
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("internal_api", "0023_saledocument_amount_time"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WarehouseBalance",
+            fields=[
+                (
+                    "warehouse",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="balance",
+                        serialize=False,
+                        to="internal_api.warehouse",
+                        verbose_name="запас",
+                    ),
+                ),
+                (
+                    "remaining",
+                    models.DecimalField(
+                        decimal_places=4,
+                        default=Decimal("0"),
+                        max_digits=15,
+                        verbose_name="остаток",
+                    ),
+                ),
+                (
+                    "cost",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=7,
+                        null=True,
+                        verbose_name="наибольшая стоимость поступления",
+                    ),
+                ),
+                (
+                    "moved_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="последнее движение"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "остаток запаса",
+                "verbose_name_plural": "остатки запасов",
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_balances(apps, schema_editor):
+    Warehouse = apps.get_model("internal_api", "Warehouse")
+    WarehouseBalance = apps.get_model("internal_api", "WarehouseBalance")
+    WarehouseRecord = apps.get_model("internal_api", "WarehouseRecord")
+
+    WarehouseBalance.objects.bulk_create(
+        [
+            WarehouseBalance(warehouse_id=warehouse_id)
+            for warehouse_id in Warehouse.objects.values_list("pk", flat=True)
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    records = WarehouseRecord.objects.filter(
+        warehouse_id=OuterRef("warehouse_id")
+    ).values("warehouse_id")
+    WarehouseBalance.objects.update(
+        remaining=Coalesce(
+            Subquery(records.annotate(x=Sum("quantity")).values("x")),
+            Decimal(0),
+        ),
+        cost=Subquery(
+            records.annotate(x=Max("cost", filter=Q(quantity__gt=0))).values("x")
+        ),
+        moved_at=Subquery(records.annotate(x=Max("created_at")).values("x")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("internal_api", "0024_warehousebalance"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_balances, reverse_code=lambda x, y: None),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.0.6 on 2026-10-18 01:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("internal_api", "0025_fill_warehouse_balances"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WarehouseSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="дата")),
+                ("closed_at", models.DateTimeField(verbose_name="конец периода")),
+                (
+                    "remaining",
+                    models.DecimalField(
+                        decimal_places=4, max_digits=15, verbose_name="остаток"
+                    ),
+                ),
+                (
+                    "warehouse",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshots",
+                        to="internal_api.warehouse",
+                        verbose_name="запас",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "остаток запаса на конец дня",
+                "verbose_name_plural": "остатки запасов на конец дня",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="warehousesnapshot",
+            index=models.Index(
+                fields=["warehouse", "-closed_at"],
+                name="internal_ap_warehou_c03735_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="warehousesnapshot",
+            constraint=models.UniqueConstraint(
+                fields=("warehouse", "date"), name="unique_warehouse_and_date"
+            ),
+        ),
+    ]
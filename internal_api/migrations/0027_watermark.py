@@ -0,0 +1,36 @@
+# Generated by Django 4.0.6 on 2026-10-18 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("internal_api", "0026_warehousesnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Watermark",
+            fields=[
+                (
+                    "name",
+                    models.CharField(
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="задача",
+                    ),
+                ),
+                ("value", models.DateTimeField(verbose_name="отметка")),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="обновлено"),
+                ),
+            ],
+            options={
+                "verbose_name": "отметка выполнения задачи",
+                "verbose_name_plural": "отметки выполнения задач",
+            },
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 4.0.6 on 2026-10-18 01:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0046_category_image_svg_alter_category_is_excisable"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("internal_api", "0027_watermark"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SalesFact",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="дата")),
+                ("hour", models.PositiveSmallIntegerField(verbose_name="час")),
+                (
+                    "quantity",
+                    models.DecimalField(
+                        decimal_places=4,
+                        default=0,
+                        max_digits=15,
+                        verbose_name="количество",
+                    ),
+                ),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=15, verbose_name="сумма"
+                    ),
+                ),
+                (
+                    "lines",
+                    models.IntegerField(default=0, verbose_name="количество позиций"),
+                ),
+                (
+                    "cashier",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="кассир",
+                    ),
+                ),
+                (
+                    "product_unit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="products.productunit",
+                        verbose_name="единица хранения",
+                    ),
+                ),
+                (
+                    "shop",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="internal_api.shop",
+                        verbose_name="магазин",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Продажи за час",
+                "verbose_name_plural": "Продажи по часам",
+                "default_related_name": "sales_facts",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="salesfact",
+            constraint=models.UniqueConstraint(
+                fields=("date", "hour", "shop", "product_unit", "cashier"),
+                name="unique_sales_fact",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="salesfact",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("cashier__isnull", True)),
+                fields=("date", "hour", "shop", "product_unit"),
+                name="unique_sales_fact_without_cashier",
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractHour
+
+FACT_FIELDS = ("date", "hour", "shop_id", "product_unit_id", "cashier_id")
+
+
+def fill_sales_facts(apps, schema_editor):
+    SalesFact = apps.get_model("internal_api", "SalesFact")
+    WarehouseRecord = apps.get_model("internal_api", "WarehouseRecord")
+
+    records = WarehouseRecord.objects.annotate(
+        hour=ExtractHour("created_at"),
+        shop_id=F("warehouse__shop_id"),
+        product_unit_id=F("warehouse__product_unit_id"),
+        date=F("document__created_at"),
+    )
+    sales = records.filter(
+        document__sale_document__isnull=False,
+    ).annotate(cashier_id=F("document__author_id"))
+    cancels = records.filter(
+        document__cancel_document__cancels__sale_document__isnull=False,
+    ).annotate(cashier_id=F("document__cancel_document__cancels__author_id"))
+
+    facts = defaultdict(lambda: [Decimal(0), Decimal(0), 0])
+    for qs, sign in ((sales, 1), (cancels, -1)):
+        for *key, quantity, amount, count in (
+            qs.values(*FACT_FIELDS)
+            .annotate(
+                total=Sum(F("cost") * F("quantity")),
+                count=Count("pk"),
+                total_quantity=Sum("quantity"),
+            )
+            .values_list(*FACT_FIELDS, "total_quantity", "total", "count")
+        ):
+            fact = facts[tuple(key)]
+            fact[0] += quantity
+            fact[1] += amount or 0
+            fact[2] += sign * count
+
+    SalesFact.objects.bulk_create(
+        [
+            SalesFact(
+                **dict(zip(FACT_FIELDS, key)),
+                quantity=quantity,
+                amount=amount,
+                lines=lines,
+            )
+            for key, (quantity, amount, lines) in facts.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("internal_api", "0028_salesfact"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_sales_facts, reverse_code=lambda x, y: None),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("internal_api", "0029_fill_sales_facts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NumberCounter",
+            fields=[
+                (
+                    "name",
+                    models.CharField(
+                        max_length=128,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="нумерация",
+                    ),
+                ),
+                (
+                    "value",
+                    models.BigIntegerField(default=0, verbose_name="последний номер"),
+                ),
+            ],
+            options={
+                "verbose_name": "счётчик номеров",
+                "verbose_name_plural": "счётчики номеров",
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("internal_api", "0030_numbercounter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="saledocument",
+            name="client_id",
+            field=models.UUIDField(
+                blank=True,
+                null=True,
+                unique=True,
+                verbose_name="идентификатор на кассе",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0046_category_image_svg_alter_category_is_excisable"),
+        ("internal_api", "0031_saledocument_client_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batch",
+            name="product_unit",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Задаётся первым изменением запаса по партии",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                to="products.productunit",
+                verbose_name="единица хранения",
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def fill_batch_product_units(apps, schema_editor):
+    Batch = apps.get_model("internal_api", "Batch")
+
+    # batches of mixed product units are left to be claimed by new records
+    units = (
+        Batch.objects.annotate(
+            unit_count=Count(
+                "warehouse_records__warehouse__product_unit", distinct=True
+            ),
+            unit_id=Max("warehouse_records__warehouse__product_unit"),
+        )
+        .filter(unit_count=1)
+        .values_list("pk", "unit_id")
+    )
+    batches = [Batch(pk=pk, product_unit_id=unit_id) for pk, unit_id in units]
+    Batch.objects.bulk_update(batches, ["product_unit"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("internal_api", "0032_batch_product_unit"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_batch_product_units, reverse_code=lambda x, y: None),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("internal_api", "0033_fill_batch_product_units"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UploadJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file", models.FileField(upload_to="uploads/", verbose_name="файл")),
+                (
+                    "columns",
+                    models.JSONField(
+                        help_text="Номера столбцов по полям и номер первой строки",
+                        verbose_name="столбцы",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "В очереди"),
+                            ("running", "Выполняется"),
+                            ("done", "Выполнено"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="pending",
+                        max_length=16,
+                        verbose_name="статус",
+                    ),
+                ),
+                (
+                    "rows_total",
+                    models.PositiveIntegerField(
+                        blank=True, null=True, verbose_name="всего строк"
+                    ),
+                ),
+                (
+                    "rows_done",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="обработано строк"
+                    ),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="ошибка")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="создано"),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="запущено"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="завершено"
+                    ),
+                ),
+                ("run_rows", models.PositiveIntegerField(default=0, editable=False)),
+                (
+                    "author",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="автор",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "загрузка каталога",
+                "verbose_name_plural": "загрузки каталога",
+                "ordering": ("-created_at",),
+                "default_related_name": "upload_jobs",
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("internal_api", "0034_uploadjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchIndexChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=100, verbose_name="модель")),
+                ("object_id", models.CharField(max_length=64, verbose_name="объект")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="добавлено"),
+                ),
+            ],
+            options={
+                "verbose_name": "изменение для поискового индекса",
+                "verbose_name_plural": "изменения для поискового индекса",
+            },
+        ),
+    ]
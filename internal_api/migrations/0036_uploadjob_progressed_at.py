@@ -0,0 +1,20 @@
+# Generated by Django 4.0.6 on 2026-10-18 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("internal_api", "0035_searchindexchange"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadjob",
+            name="progressed_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="последний прогресс"
+            ),
+        ),
+    ]
@@ -1,3 +1,6 @@
+from .analytics import SalesFact  # noqa
+from .counters import NumberCounter  # noqa
+from .jobs import SearchIndexChange, UploadJob, Watermark  # noqa
 from .primary_documents import (  # noqa
     CancelDocument,
     ConversionDocument,
@@ -10,7 +13,14 @@ from .primary_documents import (  # noqa
     SaleDocument,
     WriteOffDocument,
 )
-from .shops import Batch, Shop, Warehouse, WarehouseRecord  # noqa
+from .shops import (  # noqa
+    Batch,
+    Shop,
+    Warehouse,
+    WarehouseBalance,
+    WarehouseRecord,
+    WarehouseSnapshot,
+)
 from .suppliers import (  # noqa
     LegalEntities,
     Supplier,
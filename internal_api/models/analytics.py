@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.db import models
+
+from .shops import Shop
+
+
+class SalesFact(models.Model):
+    """
+    Sales aggregated by hour, shop, product unit and cashier, maintained
+    by `internal_api.sales`. Sums are signed as warehouse records are, so sales
+    are negative and cancels of sales are positive.
+    """
+
+    date = models.DateField("дата")
+    hour = models.PositiveSmallIntegerField("час")
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        verbose_name="магазин",
+    )
+    product_unit = models.ForeignKey(
+        "products.ProductUnit",
+        on_delete=models.CASCADE,
+        verbose_name="единица хранения",
+    )
+    cashier = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        verbose_name="кассир",
+    )
+    quantity = models.DecimalField(
+        "количество",
+        max_digits=15,
+        decimal_places=4,
+        default=0,
+    )
+    amount = models.DecimalField(
+        "сумма",
+        max_digits=15,
+        decimal_places=2,
+        default=0,
+    )
+    lines = models.IntegerField("количество позиций", default=0)
+
+    class Meta:
+        verbose_name = "Продажи за час"
+        verbose_name_plural = "Продажи по часам"
+        default_related_name = "sales_facts"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("date", "hour", "shop", "product_unit", "cashier"),
+                name="unique_sales_fact",
+            ),
+            models.UniqueConstraint(
+                fields=("date", "hour", "shop", "product_unit"),
+                condition=models.Q(cashier__isnull=True),
+                name="unique_sales_fact_without_cashier",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Продажи {self.product_unit} {self.date} {self.hour}:00"
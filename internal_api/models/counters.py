@@ -0,0 +1,53 @@
+from typing import Callable
+
+from django.db import models, transaction
+
+
+class NumberCounter(models.Model):
+    """
+    The last number given out in a numbering series (see
+    `utils.models_utils.Enumerable`).
+    """
+
+    name = models.CharField("нумерация", max_length=128, primary_key=True)
+    value = models.BigIntegerField("последний номер", default=0)
+
+    class Meta:
+        verbose_name = "счётчик номеров"
+        verbose_name_plural = "счётчики номеров"
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    @classmethod
+    def reserve(
+        cls,
+        name: str,
+        count: int = 1,
+        get_initial_value: Callable[[], int] = lambda: 0,
+    ) -> int:
+        """
+        Reserve `count` consecutive numbers, return the first of them. A new
+        counter starts after `get_initial_value()`.
+
+        The counter stays locked until the outer transaction ends, so that
+        numbers are not lost if the transaction is rolled back. Reserve
+        numbers in the transaction that saves them, or a failed save leaves
+        a gap.
+        """
+        with transaction.atomic():
+            counter = cls.objects.select_for_update().filter(name=name).first()
+            if counter is None:
+                cls.objects.bulk_create(
+                    [cls(name=name, value=get_initial_value())],
+                    ignore_conflicts=True,
+                )
+                counter = cls.objects.select_for_update().get(name=name)
+            cls.objects.filter(name=name).update(value=counter.value + count)
+        return counter.value + 1
+
+    @classmethod
+    def advance(cls, name: str, value: int):
+        """Move a counter past a number given out by hand."""
+        # the counter is locked only if it is behind
+        cls.objects.filter(name=name, value__lt=value).update(value=value)
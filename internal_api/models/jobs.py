@@ -0,0 +1,133 @@
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from utils.choices import Choices
+
+
+class Watermark(models.Model):
+    """
+    Progress mark of a periodic job, e.g. the time of the latest change
+    it has processed.
+    """
+
+    name = models.CharField("задача", max_length=64, primary_key=True)
+    value = models.DateTimeField("отметка")
+    updated_at = models.DateTimeField("обновлено", auto_now=True)
+
+    class Meta:
+        verbose_name = "отметка выполнения задачи"
+        verbose_name_plural = "отметки выполнения задач"
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    @classmethod
+    def get_value(cls, name: str):
+        return cls.objects.filter(name=name).values_list("value", flat=True).first()
+
+    @classmethod
+    def set_value(cls, name: str, value):
+        cls.objects.update_or_create(name=name, defaults={"value": value})
+
+
+class SearchIndexChange(models.Model):
+    """
+    Changed object to reindex, queued by `internal_api.search`. Objects
+    of models search documents depend on are queued as well.
+    """
+
+    model = models.CharField("модель", max_length=100)
+    object_id = models.CharField("объект", max_length=64)
+    created_at = models.DateTimeField("добавлено", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "изменение для поискового индекса"
+        verbose_name_plural = "изменения для поискового индекса"
+
+    def __str__(self):
+        return f"{self.model}: {self.object_id}"
+
+
+class UploadJob(models.Model):
+    """
+    Catalog upload processed in the background (see `internal_api.uploads`).
+    Rows are written in chunks, and `rows_done` is saved along with each chunk,
+    so that a failed job resumes where it stopped. A running job making no
+    progress for `STALE_AFTER` was interrupted (e.g. its worker was killed),
+    and is resumed as a failed one.
+    """
+
+    STALE_AFTER = timedelta(minutes=30)
+
+    STATUSES = Choices(
+        ("pending", "В очереди"),
+        ("running", "Выполняется"),
+        ("done", "Выполнено"),
+        ("failed", "Ошибка"),
+    )
+
+    file = models.FileField("файл", upload_to="uploads/")
+    columns = models.JSONField(
+        "столбцы",
+        help_text="Номера столбцов по полям и номер первой строки",
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="автор",
+    )
+    status = models.CharField(
+        "статус",
+        max_length=16,
+        choices=STATUSES,
+        default=STATUSES.pending,
+    )
+    rows_total = models.PositiveIntegerField("всего строк", null=True, blank=True)
+    rows_done = models.PositiveIntegerField("обработано строк", default=0)
+    error = models.TextField("ошибка", blank=True)
+    created_at = models.DateTimeField("создано", auto_now_add=True)
+    started_at = models.DateTimeField("запущено", null=True, blank=True)
+    finished_at = models.DateTimeField("завершено", null=True, blank=True)
+    progressed_at = models.DateTimeField("последний прогресс", null=True, blank=True)
+    # rows processed by the latest run
+    run_rows = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        verbose_name = "загрузка каталога"
+        verbose_name_plural = "загрузки каталога"
+        default_related_name = "upload_jobs"
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"Загрузка {self.id}: {self.get_status_display()}"
+
+    @classmethod
+    def resumable(cls) -> models.Q:
+        """Failed jobs, or running ones making no progress."""
+        return models.Q(status=cls.STATUSES.failed) | models.Q(
+            status=cls.STATUSES.running,
+            progressed_at__lt=timezone.now() - cls.STALE_AFTER,
+        )
+
+    @property
+    def is_resumable(self) -> bool:
+        return self.status == self.STATUSES.failed or (
+            self.status == self.STATUSES.running
+            and self.progressed_at is not None
+            and self.progressed_at < timezone.now() - self.STALE_AFTER
+        )
+
+    @property
+    def rows_per_second(self) -> Optional[float]:
+        """Throughput of the latest run."""
+        if self.started_at is None:
+            return None
+        finished_at = self.finished_at or timezone.now()
+        elapsed = (finished_at - self.started_at).total_seconds()
+        return round(self.run_rows / max(elapsed, 0.001), 1)
@@ -230,6 +230,13 @@ class SaleDocument(PrimaryDocument):
         related_name="sale_document",
     )
     amount_time = models.IntegerField("Количество времени", default=0)
+    # makes repeated uploads from a till idempotent
+    client_id = models.UUIDField(
+        "идентификатор на кассе",
+        unique=True,
+        null=True,
+        blank=True,
+    )
 
     objects = SingleShopDocumentManager()
 
@@ -1,4 +1,6 @@
+from collections import defaultdict
 from decimal import Decimal
+from typing import Iterable
 
 from django.contrib.postgres.expressions import ArrayField
 from django.core.validators import MaxValueValidator, MinValueValidator
@@ -39,15 +41,13 @@ class WarehouseManager(models.Manager):
     def get_queryset(self):
         qs = super().get_queryset()
         offer_qs = Offer.objects.filter(is_active=True, type=Offer.TYPES.site)
+        # stock figures are maintained in `WarehouseBalance`
         return qs.annotate(
-            cost=models.Max(
-                "warehouse_records__cost",
-                filter=models.Q(warehouse_records__quantity__gt=Decimal(0)),
-            ),
+            cost=models.F("balance__cost"),
             margin_value=models.F("margin") * models.F("cost") / Decimal(100),
             recommended_price=models.F("cost") + models.F("margin_value"),
             remaining=Coalesce(
-                models.Sum("warehouse_records__quantity"),
+                models.F("balance__remaining"),
                 Decimal(0),
                 output_field=models.DecimalField(max_digits=7, decimal_places=2),
             ),
@@ -129,6 +129,74 @@ class Warehouse(models.Model):
         return f"{self.product_unit.unit} of {self.product_unit.product} in {self.shop}"
 
 
+class WarehouseBalance(models.Model):
+    """
+    Stock figures of a warehouse, aggregated from its records. Kept up to date
+    by `internal_api.balances`.
+    """
+
+    warehouse = models.OneToOneField(
+        Warehouse,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="balance",
+        verbose_name="запас",
+    )
+    remaining = models.DecimalField(
+        "остаток",
+        default=Decimal(0),
+        max_digits=15,
+        decimal_places=4,
+    )
+    cost = models.DecimalField(
+        "наибольшая стоимость поступления",
+        null=True,
+        blank=True,
+        max_digits=7,
+        decimal_places=2,
+    )
+    moved_at = models.DateTimeField("последнее движение", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "остаток запаса"
+        verbose_name_plural = "остатки запасов"
+
+    def __str__(self):
+        return f"Остаток {self.warehouse}"
+
+
+class WarehouseSnapshot(models.Model):
+    """
+    Closing balance of a warehouse for a day. Taken only for the warehouses
+    that had movements during the day (see `internal_api.balances`).
+    """
+
+    warehouse = models.ForeignKey(
+        Warehouse,
+        on_delete=models.CASCADE,
+        related_name="snapshots",
+        verbose_name="запас",
+    )
+    date = models.DateField("дата")
+    # records created before this moment are accounted for
+    closed_at = models.DateTimeField("конец периода")
+    remaining = models.DecimalField("остаток", max_digits=15, decimal_places=4)
+
+    class Meta:
+        verbose_name = "остаток запаса на конец дня"
+        verbose_name_plural = "остатки запасов на конец дня"
+        constraints = (
+            models.UniqueConstraint(
+                fields=("warehouse", "date"),
+                name="unique_warehouse_and_date",
+            ),
+        )
+        indexes = (models.Index(fields=("warehouse", "-closed_at")),)
+
+    def __str__(self):
+        return f"Остаток {self.warehouse} на {self.date}"
+
+
 class BatchManager(models.Manager):
     def get_queryset(self):
         qs = super().get_queryset()
@@ -147,6 +215,14 @@ class Batch(models.Model):
     )
     expiration_date = models.DateField("годен до", blank=True, null=True)
     production_date = models.DateField("дата производства", blank=True, null=True)
+    product_unit = models.ForeignKey(
+        ProductUnit,
+        on_delete=models.PROTECT,
+        verbose_name="единица хранения",
+        blank=True,
+        null=True,
+        help_text="Задаётся первым изменением запаса по партии",
+    )
 
     objects = BatchManager()
 
@@ -182,21 +258,68 @@ class WarehouseRecordManager(models.Manager):
         )
 
 
-def validate_batch(rec: "WarehouseRecord"):
-    if rec.batch:
-        product_units = rec.batch.warehouse_records.values_list(
-            "warehouse__product_unit",
-            flat=True,
+def validate_batches(records: Iterable["WarehouseRecord"]):
+    """
+    Check that each batch of given records represents one product unit.
+
+    A batch without a product unit takes the one of its first record. Takes
+    two queries for any number of records (and an update per product unit
+    for new batches), so it fits bulk writes.
+    """
+    records = [rec for rec in records if rec.batch_id is not None]
+    if not records:
+        return
+
+    warehouse_field = WarehouseRecord._meta.get_field("warehouse")
+    warehouse_units = {
+        rec.warehouse_id: rec.warehouse.product_unit_id
+        for rec in records
+        if warehouse_field.is_cached(rec)
+    }
+    warehouse_ids = {rec.warehouse_id for rec in records} - warehouse_units.keys()
+    if warehouse_ids:
+        warehouse_units.update(
+            Warehouse._base_manager.filter(pk__in=warehouse_ids).values_list(
+                "pk", "product_unit_id"
+            )
         )
-        if product_units.count() > 1:
-            raise ValidationError(f"{rec.batch} is invalid")
+    batch_units = dict(
+        Batch._base_manager.filter(
+            pk__in={rec.batch_id for rec in records},
+        ).values_list("pk", "product_unit_id")
+    )
 
-        if product_units and rec.warehouse.product_unit.id != product_units[0]:
+    claims = defaultdict(set)
+    for rec in records:
+        product_unit_id = warehouse_units[rec.warehouse_id]
+        batch_unit_id = batch_units.get(rec.batch_id)
+        if batch_unit_id is None:
+            batch_units[rec.batch_id] = product_unit_id
+            claims[product_unit_id].add(rec.batch_id)
+        elif batch_unit_id != product_unit_id:
             raise ValidationError(
-                f"{rec.batch} represent only"
-                f" {rec.batch.warehouse_records.first().warehouse.product_unit}"
+                f"Партия {rec.batch_id} представляет другую единицу хранения"
+                f" ({batch_unit_id})"
             )
 
+    for product_unit_id, batch_ids in claims.items():
+        # a batch may be claimed concurrently, so the update is conditional
+        claimed = Batch._base_manager.filter(
+            pk__in=batch_ids,
+            product_unit__isnull=True,
+        ).update(product_unit_id=product_unit_id)
+        if claimed < len(batch_ids) and (
+            Batch._base_manager.filter(pk__in=batch_ids)
+            .exclude(product_unit_id=product_unit_id)
+            .exists()
+        ):
+            raise ValidationError("Партия уже представляет другую единицу хранения")
+
+    batch_field = WarehouseRecord._meta.get_field("batch")
+    for rec in records:
+        if batch_field.is_cached(rec) and rec.batch is not None:
+            rec.batch.product_unit_id = batch_units[rec.batch_id]
+
 
 class WarehouseRecord(Timestampable, models.Model):
     batch = models.ForeignKey(
@@ -240,5 +363,5 @@ class WarehouseRecord(Timestampable, models.Model):
         return f"Изменение {self.warehouse}"
 
     def save(self, *args, **kwargs):
-        validate_batch(self)
+        validate_batches([self])
         super().save(*args, **kwargs)
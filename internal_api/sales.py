@@ -0,0 +1,140 @@
+"""
+Maintenance of `SalesFact` rows.
+
+Records of sale documents and of documents cancelling sales are summed up by
+hour, shop, product unit and cashier. A cancel is accounted for on its own
+date, but under the cashier of the cancelled sale. Records saved or deleted
+one by one are accounted for by signal receivers (see `.signals`); code that
+uses `bulk_create` on records must call `apply_records` itself.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractHour
+from django.utils import timezone
+
+from .balances import record_cost
+from .models import CancelDocument, SaleDocument, SalesFact, Warehouse, WarehouseRecord
+
+FACT_FIELDS = ("date", "hour", "shop_id", "product_unit_id", "cashier_id")
+
+
+def get_documents(document_ids: Iterable[int]) -> Dict[int, Tuple]:
+    """
+    Dates, cashiers, and line signs of the sale documents and cancels of
+    sales among given documents.
+    """
+    document_ids = set(document_ids)
+    documents = {
+        pk: (created_at, author_id, 1)
+        for pk, created_at, author_id in SaleDocument._base_manager.filter(
+            pk__in=document_ids
+        ).values_list("pk", "created_at", "author_id")
+    }
+    documents.update(
+        (pk, (created_at, author_id, -1))
+        for pk, created_at, author_id in CancelDocument._base_manager.filter(
+            pk__in=document_ids - documents.keys(),
+            cancels__sale_document__isnull=False,
+        ).values_list("pk", "created_at", "cancels__author_id")
+    )
+    return documents
+
+
+def apply_records(records: Iterable, sign: int = 1):
+    """Account for created (or, with `sign=-1`, deleted) records."""
+    records = list(records)
+    documents = get_documents(record.document_id for record in records)
+    records = [record for record in records if record.document_id in documents]
+    if not records:
+        return
+    warehouses = {
+        pk: (shop_id, product_unit_id)
+        for pk, shop_id, product_unit_id in Warehouse._base_manager.filter(
+            pk__in={record.warehouse_id for record in records}
+        ).values_list("pk", "shop_id", "product_unit_id")
+    }
+
+    changes = defaultdict(lambda: [Decimal(0), Decimal(0), 0])
+    for record in records:
+        date, cashier_id, lines = documents[record.document_id]
+        moved_at = timezone.localtime(record.created_at or timezone.now())
+        change = changes[
+            (date, moved_at.hour, *warehouses[record.warehouse_id], cashier_id)
+        ]
+        quantity = Decimal(str(record.quantity))
+        change[0] += sign * quantity
+        change[1] += sign * quantity * (record_cost(record) or 0)
+        change[2] += sign * lines
+
+    for key, (quantity, amount, lines) in changes.items():
+        add_to_fact(dict(zip(FACT_FIELDS, key)), quantity, amount, lines)
+
+
+def add_to_fact(fields: dict, quantity: Decimal, amount: Decimal, lines: int):
+    changes = {
+        "quantity": F("quantity") + quantity,
+        "amount": F("amount") + amount,
+        "lines": F("lines") + lines,
+    }
+    if SalesFact.objects.filter(**fields).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SalesFact.objects.create(
+                **fields, quantity=quantity, amount=amount, lines=lines
+            )
+    except IntegrityError:
+        # created concurrently
+        SalesFact.objects.filter(**fields).update(**changes)
+
+
+def aggregate_records() -> Iterable[dict]:
+    """Facts calculated from records."""
+    records = WarehouseRecord._base_manager.annotate(
+        hour=ExtractHour("created_at"),
+        shop_id=F("warehouse__shop_id"),
+        product_unit_id=F("warehouse__product_unit_id"),
+        date=F("document__created_at"),
+    )
+    sales = records.filter(
+        document__sale_document__isnull=False,
+    ).annotate(cashier_id=F("document__author_id"))
+    cancels = records.filter(
+        document__cancel_document__cancels__sale_document__isnull=False,
+    ).annotate(cashier_id=F("document__cancel_document__cancels__author_id"))
+
+    facts = defaultdict(lambda: [Decimal(0), Decimal(0), 0])
+    for qs, sign in ((sales, 1), (cancels, -1)):
+        for *key, quantity, amount, count in (
+            qs.values(*FACT_FIELDS)
+            .annotate(
+                total=Sum(F("cost") * F("quantity")),
+                count=Count("pk"),
+                total_quantity=Sum("quantity"),
+            )
+            .values_list(*FACT_FIELDS, "total_quantity", "total", "count")
+        ):
+            fact = facts[tuple(key)]
+            fact[0] += quantity
+            fact[1] += amount or 0
+            fact[2] += sign * count
+
+    return (
+        dict(zip(FACT_FIELDS, key), quantity=quantity, amount=amount, lines=lines)
+        for key, (quantity, amount, lines) in facts.items()
+    )
+
+
+@transaction.atomic
+def rebuild() -> int:
+    """Recalculate all facts from records. Returns the number of facts."""
+    SalesFact.objects.all().delete()
+    facts = SalesFact.objects.bulk_create(
+        (SalesFact(**fields) for fields in aggregate_records()),
+        batch_size=1000,
+    )
+    return len(facts)
@@ -0,0 +1,144 @@
+"""
+Incremental search index updates. Saves and deletes of indexed objects, and
+of objects their documents are rendered from (see `related_lookups` of
+the search indexes), are queued as `SearchIndexChange` rows in the same
+transaction. `update_changed` reindexes queued objects in batches and
+removes deleted ones from the index.
+
+Bulk writes skip the signals, so bulk imports queue their objects with
+`enqueue`.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterable, List, Set, Type
+
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+from haystack import connections
+from haystack.constants import DEFAULT_ALIAS
+from haystack.signals import BaseSignalProcessor
+from haystack.utils.loading import UnifiedIndex
+
+from .models import SearchIndexChange
+
+BATCH_SIZE = 1000
+DISPATCH_UID = "internal_api.search.handle_change"
+SIGNALS = (post_save, post_delete)
+
+
+@lru_cache(maxsize=None)
+def get_unified_index() -> UnifiedIndex:
+    # unlike the connection's one, this does not load the search backend
+    unified_index = UnifiedIndex()
+    unified_index.build()
+    return unified_index
+
+
+@lru_cache(maxsize=None)
+def get_tracked_labels() -> Set[str]:
+    """Labels of models whose changes are queued."""
+    labels = set()
+    for model, index in get_unified_index().get_indexes().items():
+        labels.add(model._meta.label)
+        labels.update(getattr(index, "related_lookups", {}))
+    return labels
+
+
+def get_label(model: Type[models.Model]) -> str:
+    return model._meta.concrete_model._meta.label
+
+
+def enqueue(model: Type[models.Model], pks: Iterable):
+    """Queue objects for reindexing (if the model is tracked)."""
+    label = get_label(model)
+    if label not in get_tracked_labels():
+        return
+    SearchIndexChange.objects.bulk_create(
+        [SearchIndexChange(model=label, object_id=str(pk)) for pk in pks]
+    )
+
+
+def handle_change(sender, instance, raw=False, **kwargs):
+    # fixtures are queued by `loaddata`
+    if not raw:
+        enqueue(sender, [instance.pk])
+
+
+@contextmanager
+def disconnected():
+    """
+    Stop queueing changes by signals, for writers queueing their objects
+    themselves.
+    """
+    connected = [signal.disconnect(dispatch_uid=DISPATCH_UID) for signal in SIGNALS]
+    try:
+        yield
+    finally:
+        for signal, was_connected in zip(SIGNALS, connected):
+            if was_connected:
+                signal.connect(handle_change, dispatch_uid=DISPATCH_UID)
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    def setup(self):
+        for signal in SIGNALS:
+            signal.connect(handle_change, dispatch_uid=DISPATCH_UID)
+
+    def teardown(self):
+        for signal in SIGNALS:
+            signal.disconnect(dispatch_uid=DISPATCH_UID)
+
+
+def get_changed_objects(
+    changes: List[SearchIndexChange],
+) -> Dict[Type[models.Model], Set]:
+    """Primary keys of indexed objects affected by changes, by models."""
+    pks_by_label = defaultdict(set)
+    for change in changes:
+        pks_by_label[change.model].add(change.object_id)
+
+    changed = {}
+    for model, index in get_unified_index().get_indexes().items():
+        pks = {
+            model._meta.pk.to_python(pk)
+            for pk in pks_by_label.get(get_label(model), ())
+        }
+        for label, lookup in getattr(index, "related_lookups", {}).items():
+            if label in pks_by_label:
+                pks.update(
+                    model._base_manager.filter(
+                        **{f"{lookup}__in": pks_by_label[label]}
+                    ).values_list("pk", flat=True)
+                )
+        if pks:
+            changed[model] = pks
+    return changed
+
+
+def update_objects(model: Type[models.Model], pks: Iterable):
+    """Reindex objects, and remove missing ones from the index."""
+    backend = connections[DEFAULT_ALIAS].get_backend()
+    index = get_unified_index().get_index(model)
+    objs = list(index.index_queryset(using=DEFAULT_ALIAS).filter(pk__in=pks))
+    if objs:
+        backend.update(index, objs)
+    # deleted, or excluded by `index_queryset`
+    for pk in set(pks) - {obj.pk for obj in objs}:
+        backend.remove(f"{model._meta.label_lower}.{pk}")
+
+
+def update_changed(batch_size: int = BATCH_SIZE):
+    """Process queued changes."""
+    while True:
+        changes = list(SearchIndexChange.objects.order_by("id")[:batch_size])
+        if not changes:
+            return
+        for model, pks in get_changed_objects(changes).items():
+            pks = list(pks)
+            for start in range(0, len(pks), batch_size):
+                update_objects(model, pks[start : start + batch_size])
+        # changes queued meanwhile are processed by the next iteration
+        SearchIndexChange.objects.filter(
+            id__in=[change.id for change in changes]
+        ).delete()
@@ -31,14 +31,30 @@ class WarehouseIndex(indexes.SearchIndex, indexes.Indexable):
 
     text = indexes.NgramField(document=True, use_template=True)
     shop = indexes.IntegerField(model_attr="shop_id")
+    # lookups of objects the document is rendered from, by models
+    related_lookups = {
+        "products.ProductUnit": "product_unit",
+        "products.Product": "product_unit__product",
+        "products.Category": "product_unit__product__category",
+    }
 
     def get_model(self):
         return Warehouse
 
+    def index_queryset(self, using=None):
+        # without stock and offer annotations of the default manager
+        return self.get_model()._base_manager.select_related(
+            "product_unit__product__category"
+        )
+
 
 class WarehouseOrderIndex(indexes.SearchIndex, indexes.Indexable):
 
     text = indexes.NgramField(document=True, use_template=True)
+    related_lookups = {"internal_api.Supplier": "supplier"}
 
     def get_model(self):
         return WarehouseOrder
+
+    def index_queryset(self, using=None):
+        return self.get_model().objects.select_related("supplier")
@@ -1,4 +1,6 @@
+from .analytics import CashierTotalsSerializer  # noqa
 from .primary_documents import (  # noqa
+    BulkSaleDocumentSerializer,
     CancelDocumentSerializer,
     CheckSerializer,
     ConversionDocumentSerializer,
@@ -25,4 +27,4 @@ from .suppliers import (  # noqa
     WarehouseOrderPositionsSerializer,
     WarehouseOrderSerializer,
 )
-from .upload_csv import UploadCSVSerializer  # noqa
+from .upload_csv import UploadCSVSerializer, UploadJobSerializer  # noqa
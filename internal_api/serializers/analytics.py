@@ -1,6 +1,7 @@
 from django_restql.mixins import DynamicFieldsMixin
 from rest_framework import serializers
 
+from internal_api.analytics import get_popularity
 from internal_api.models.primary_documents import SaleDocument
 from internal_api.models.shops import Batch, Shop, Warehouse, WarehouseRecord
 
@@ -51,7 +52,7 @@ class WarehouseRecordSerializer(DynamicFieldsMixin, serializers.ModelSerializer)
 
 
 class AnalyticsSerializer(serializers.Serializer):
-    id = serializers.IntegerField()
+    id = serializers.IntegerField(source="item_id")
     name = serializers.CharField()
     quantity = serializers.DecimalField(decimal_places=2, max_digits=6)
     cost = serializers.DecimalField(decimal_places=2, max_digits=6)
@@ -59,58 +60,20 @@ class AnalyticsSerializer(serializers.Serializer):
 
 
 class PopularitySerializer(serializers.Serializer):
+    """
+    Popularity of products in sales facts. Accepts `by` ("product" or
+    "category") and `top` in context.
+    """
+
     analytics = serializers.SerializerMethodField()
 
     def get_analytics(self, obj):
-        products = {}
-
-        for sale_document in self._args[0]:
-            warehouse_record = sale_document.warehouse_records.all().prefetch_related(
-                "warehouse"
-            )
-            for warehouse_record in warehouse_record:
-                product = products.get(
-                    warehouse_record.warehouse.product_unit.product.pk
-                )
-                if product:
-                    quantity = product.get("quantity") + warehouse_record.quantity
-                    cost = product.get("cost") + (
-                        warehouse_record.cost * warehouse_record.quantity
-                    )
-                    product.update(
-                        {
-                            "id": warehouse_record.warehouse.product_unit.product.pk,
-                            "name": warehouse_record.warehouse.product_unit.product.name,
-                            "quantity": quantity,
-                            "cost": cost,
-                        }
-                    )
-                else:
-                    products.update(
-                        {
-                            warehouse_record.warehouse.product_unit.product.pk: {
-                                "quantity": warehouse_record.quantity,
-                                "cost": warehouse_record.cost
-                                * warehouse_record.quantity,
-                                "id": warehouse_record.warehouse.product_unit.product.pk,
-                                "name": warehouse_record.warehouse.product_unit.product.name,
-                            }
-                        }
-                    )
-
-        total = sum(
-            [
-                (p_data.get("cost") / p_data.get("quantity"))
-                for p_id, p_data in products.items()
-            ]
+        popularity = get_popularity(
+            obj,
+            by=self.context.get("by", "product"),
+            top=self.context.get("top"),
         )
-
-        for p_id, p_data in products.items():
-
-            p_data.update({"popularity": (p_data.get("cost") / p_data.get("quantity"))})
-            products.update({p_id: p_data})
-
-        return AnalyticsSerializer(list(products.values()), many=True).data
+        return AnalyticsSerializer(popularity, many=True).data
 
 
 class SaleDocumentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
@@ -140,6 +103,10 @@ class CashiersSerializer(serializers.ModelSerializer):
 
     def get_shop_address(self, obj):
         if obj.shop:
+            # addresses by shop Id may be provided in context
+            shops = self.context.get("shops")
+            if shops is not None:
+                return shops.get(obj.shop)
             shop = Shop.objects.get(pk=obj.shop)
             return shop.address
         else:
@@ -151,3 +118,15 @@ class CashiersSerializer(serializers.ModelSerializer):
     class Meta:
         model = SaleDocument
         fields = "__all__"
+
+
+class CashierTotalsSerializer(serializers.Serializer):
+    cashier = serializers.IntegerField(source="cashier_id", allow_null=True)
+    cashier_name = serializers.CharField(allow_null=True)
+    cashier_surname = serializers.CharField(allow_null=True)
+    shop = serializers.IntegerField(source="shop_id")
+    shop_name = serializers.CharField()
+    shop_address = serializers.CharField()
+    checks = serializers.IntegerField()
+    quantity = serializers.DecimalField(max_digits=15, decimal_places=4)
+    proceeds = serializers.DecimalField(max_digits=15, decimal_places=2)
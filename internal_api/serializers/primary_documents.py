@@ -1,10 +1,13 @@
 import calendar
 import datetime
-import statistics
 from collections import OrderedDict
 from decimal import Decimal
-from itertools import chain
+from typing import Dict, List
 
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
 from drf_writable_nested import NestedCreateMixin
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
@@ -12,7 +15,9 @@ from rest_framework.exceptions import ValidationError
 from products.models import ProductUnit
 from utils.serializers_utils import AuthorMixin
 
-from .. import models
+from .. import balances, models
+from .. import sales as sales_facts
+from ..models.shops import validate_batches
 from .shops import WarehouseRecordSerializer
 
 
@@ -462,6 +467,174 @@ class SaleDocumentSerializer(
         return result
 
 
+class BulkSaleRecordSerializer(serializers.Serializer):
+    warehouse = serializers.IntegerField(label="запас")
+    quantity = serializers.DecimalField(
+        label="количество",
+        max_digits=9,
+        decimal_places=4,
+    )
+    cost = serializers.DecimalField(
+        label="стоимость",
+        max_digits=7,
+        decimal_places=2,
+        required=False,
+        allow_null=True,
+    )
+    batch = serializers.IntegerField(label="партия", required=False, allow_null=True)
+
+
+class BulkSaleSerializer(serializers.Serializer):
+    client_id = serializers.UUIDField(label="идентификатор на кассе")
+    amount_time = serializers.IntegerField(
+        label="количество времени",
+        required=False,
+        default=0,
+    )
+    warehouse_records = BulkSaleRecordSerializer(many=True)
+
+
+class BulkSaleDocumentSerializer(serializers.Serializer):
+    """
+    Creates many sales at once, e.g. queued by a till while offline. Sales
+    already uploaded (by `client_id`) are skipped, and sales referring to
+    missing warehouses or mismatching batches are rejected one by one; the
+    rest are written with bulk inserts.
+    """
+
+    MAX_SALES = 1000
+
+    sales = BulkSaleSerializer(many=True, allow_empty=False)
+
+    def validate_sales(self, value):
+        if len(value) > self.MAX_SALES:
+            raise ValidationError(f"Не больше {self.MAX_SALES} продаж в одном запросе.")
+        return value
+
+    def get_errors(self, sales: List[dict]) -> Dict[int, dict]:
+        """Errors of sales by their positions."""
+        records = [record for sale in sales for record in sale["warehouse_records"]]
+        warehouses = dict(
+            models.Warehouse._base_manager.filter(
+                pk__in={record["warehouse"] for record in records},
+            ).values_list("pk", "product_unit_id")
+        )
+        batches = dict(
+            models.Batch._base_manager.filter(
+                pk__in={record.get("batch") for record in records} - {None},
+            ).values_list("pk", "product_unit_id")
+        )
+
+        errors = {}
+        for position, sale in enumerate(sales):
+            record_errors = []
+            # new batches take product units of the first valid sales
+            claims = {}
+            for record in sale["warehouse_records"]:
+                record_error = {}
+                product_unit_id = warehouses.get(record["warehouse"])
+                if product_unit_id is None:
+                    record_error["warehouse"] = ["Запас не найден."]
+                batch_id = record.get("batch")
+                if batch_id is not None:
+                    batch_unit_id = claims.get(batch_id) or batches.get(batch_id, 0)
+                    if batch_unit_id == 0:
+                        record_error["batch"] = ["Партия не найдена."]
+                    elif batch_unit_id is None:
+                        claims[batch_id] = product_unit_id
+                    elif product_unit_id not in (None, batch_unit_id):
+                        record_error["batch"] = [
+                            "Партия не соответствует единице хранения."
+                        ]
+                record_errors.append(record_error)
+            if any(record_errors):
+                errors[position] = {"warehouse_records": record_errors}
+            else:
+                batches.update(claims)
+        return errors
+
+    @transaction.atomic
+    def create(self, validated_data) -> List[dict]:
+        """Returns results by sale."""
+        sales = validated_data["sales"]
+        # a retried (or concurrent) upload of the same sales waits for this
+        # one, and finds them existing
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(hashtext(%s))",
+                [models.SaleDocument._meta.db_table],
+            )
+        existing = {
+            client_id: {"status": "exists", "id": pk, "number": number}
+            for client_id, pk, number in models.SaleDocument._base_manager.filter(
+                client_id__in={sale["client_id"] for sale in sales},
+            ).values_list("client_id", "pk", "number")
+        }
+        errors = self.get_errors(sales)
+
+        new_sales = {}
+        for position, sale in enumerate(sales):
+            if (
+                position not in errors
+                and sale["client_id"] not in existing
+                and sale["client_id"] not in new_sales
+            ):
+                new_sales[sale["client_id"]] = sale
+
+        # multi-table children can't be bulk created, so the tables are
+        # filled one by one
+        author = self.context["request"].user
+        documents = [models.PrimaryDocument(author=author) for _ in new_sales]
+        models.SaleDocument.assign_numbers(documents)
+        models.PrimaryDocument.objects.bulk_create(documents)
+        if documents:
+            # the parent rows are inserted already
+            models.SaleDocument._base_manager._insert(
+                [
+                    models.SaleDocument(
+                        primary_document=document,
+                        amount_time=sale["amount_time"],
+                        client_id=sale["client_id"],
+                    )
+                    for document, sale in zip(documents, new_sales.values())
+                ],
+                fields=models.SaleDocument._meta.local_concrete_fields,
+            )
+        records = [
+            models.WarehouseRecord(
+                document=document,
+                warehouse_id=record["warehouse"],
+                # negate quantity
+                quantity=-record["quantity"],
+                cost=record.get("cost"),
+                batch_id=record.get("batch"),
+            )
+            for document, sale in zip(documents, new_sales.values())
+            for record in sale["warehouse_records"]
+        ]
+        validate_batches(records)
+        models.WarehouseRecord.objects.bulk_create(records)
+        balances.apply_records(records)
+        sales_facts.apply_records(records)
+
+        created = {
+            sale["client_id"]: {
+                "status": "created",
+                "id": document.pk,
+                "number": document.number,
+            }
+            for document, sale in zip(documents, new_sales.values())
+        }
+        results = []
+        for position, sale in enumerate(sales):
+            if position in errors:
+                result = {"status": "invalid", "errors": errors[position]}
+            else:
+                result = existing.get(sale["client_id"]) or created[sale["client_id"]]
+            results.append({"client_id": sale["client_id"], **result})
+        return results
+
+
 class ConversionRecordSerializer(serializers.ModelSerializer):
     """
     Gathers data to convert `Warehouse` to target warehouse, which in turn
@@ -642,85 +815,56 @@ class CancelDocumentSerializer(AuthorMixin, serializers.ModelSerializer):
 
 
 class GraphAnaliticsSerializer(serializers.Serializer):
+    """
+    Proceeds by day from sales facts, compared to the same day a month (or a
+    week) before.
+    """
+
     sales = serializers.SerializerMethodField()
 
-    def get_previous_data(self, current_date, period):
+    @staticmethod
+    def get_previous_date(current_date, period):
         if period in (None, "month", "day"):
             year, month = calendar._prevmonth(current_date.year, current_date.month)
-            return sum(
-                [
-                    sum(
-                        (record.cost * record.quantity)
-                        for record in doc.warehouse_records.all()
-                    )
-                    for doc in models.SaleDocument.objects.filter(
-                        created_at=datetime.date(year, month, current_date.day)
-                    )
-                ]
-            )
+            day = min(current_date.day, calendar.monthrange(year, month)[1])
+            return datetime.date(year, month, day)
         else:
-            previous_data = datetime.date(
-                current_date.year, current_date.month, current_date.day
-            ) - datetime.timedelta(days=7)
-            return sum(
-                [
-                    sum(
-                        (record.cost * record.quantity)
-                        for record in doc.warehouse_records.all()
-                    )
-                    for doc in models.SaleDocument.objects.filter(
-                        created_at=previous_data
-                    )
-                ]
-            )
+            return current_date - datetime.timedelta(days=7)
 
     def get_sales(self, obj):
-        period = self._kwargs.get("context").get("request").query_params.get("period")
-        result = {}
-
-        for document in self._args[0]:
-            if result.get(document.created_at):
-                item = result.get(document.created_at)
-                current = item.get("current")
-                item.update(
-                    {
-                        "current": (
-                            current
-                            + sum(
-                                (record.cost * record.quantity)
-                                for record in document.warehouse_records.all()
-                            )
-                        )
-                    }
-                )
-                result.update({document.created_at: item})
-            else:
-                result.update(
-                    {
-                        str(document.created_at): {
-                            "date": document.created_at,
-                            "weekday": calendar.weekday(
-                                document.created_at.year,
-                                document.created_at.month,
-                                document.created_at.day,
-                            ),
-                            "current": sum(
-                                (record.cost * record.quantity)
-                                for record in document.warehouse_records.all()
-                            ),
-                            "previous": self.get_previous_data(
-                                document.created_at, period
-                            ),
-                        }
-                    }
-                )
-        return result.values()
+        period = self.context["request"].query_params.get("period")
+        current = dict(
+            obj.order_by("date").values_list("date").annotate(x=Sum("amount"))
+        )
+        previous_dates = {
+            date: self.get_previous_date(date, period) for date in current
+        }
+        previous = dict(
+            models.SalesFact.objects.filter(date__in=previous_dates.values())
+            .order_by()
+            .values_list("date")
+            .annotate(x=Sum("amount"))
+        )
+        return [
+            {
+                "date": date,
+                "weekday": date.weekday(),
+                "current": amount,
+                "previous": previous.get(previous_dates[date], Decimal(0)),
+            }
+            for date, amount in current.items()
+        ]
 
     class Meta:
         fields = "__all__"
 
 
 class CheckSerializer(serializers.Serializer):
+    """
+    Lists sale documents. Totals are taken from sales facts, which are
+    passed in context as `facts`.
+    """
+
     # warehouse_records = SaleRecordSerializer(many=True, write_only=True)
     # warehouse_records_on_read = serializers.HyperlinkedIdentityField(
     #    read_only=True,
@@ -733,41 +877,27 @@ class CheckSerializer(serializers.Serializer):
     number_of_goods = serializers.SerializerMethodField()
     proceeds = serializers.SerializerMethodField()
 
-    def get_proceeds(self, obj):
-        l = [
-            [
-                (record.cost * record.quantity)
-                for record in document.warehouse_records.all()
-            ]
-            for document in self._args[0]
-        ]
+    @cached_property
+    def totals(self):
+        return self.context["facts"].aggregate(
+            proceeds=Coalesce(Sum("amount"), Decimal(0)),
+            number_of_goods=Coalesce(Sum("quantity"), Decimal(0)),
+            lines=Sum("lines"),
+        )
 
-        return sum(list(chain.from_iterable(l)))
+    def get_proceeds(self, obj):
+        return self.totals["proceeds"]
 
     def get_number_of_goods(self, obj):
-        l = [
-            [record.quantity for record in document.warehouse_records.all()]
-            for document in self._args[0]
-        ]
-
-        return sum(list(chain.from_iterable(l)))
+        return self.totals["number_of_goods"]
 
     def get_checks(self, obj):
-        return SaleDocumentSerializer(
-            self._args[0], many=True, context=self.context
-        ).data
+        return SaleDocumentSerializer(obj, many=True, context=self.context).data
 
     def get_average_check(self, obj):
-
-        l = [
-            [
-                (record.cost * record.quantity)
-                for record in document.warehouse_records.all()
-            ]
-            for document in self._args[0]
-        ]
-
-        return statistics.mean(list(chain.from_iterable(l)))
+        if not self.totals["lines"]:
+            return None
+        return self.totals["proceeds"] / self.totals["lines"]
 
     class Meta:
         model = models.SaleDocument
@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from ..models import UploadJob
+
 
 class UploadCSVSerializer(serializers.Serializer):
     csv_file = serializers.FileField()
@@ -11,3 +13,31 @@ class UploadCSVSerializer(serializers.Serializer):
     measure_unit_col = serializers.IntegerField(required=False)
     origin_col = serializers.IntegerField(required=False)
     first_row = serializers.IntegerField()
+
+    def create(self, validated_data):
+        file = validated_data.pop("csv_file")
+        return UploadJob.objects.create(
+            file=file,
+            columns=validated_data,
+            author=self.context["request"].user,
+        )
+
+
+class UploadJobSerializer(serializers.ModelSerializer):
+    rows_per_second = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = UploadJob
+        fields = (
+            "id",
+            "status",
+            "rows_total",
+            "rows_done",
+            "rows_per_second",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "progressed_at",
+        )
+        read_only_fields = fields
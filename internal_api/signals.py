@@ -0,0 +1,81 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from utils.cache import invalidate_on_change
+
+from . import balances, sales
+from .models import Shop, Warehouse, WarehouseBalance, WarehouseRecord
+
+invalidate_on_change("warehouses", Shop, Warehouse)
+
+
+@receiver(post_save, sender=Warehouse)
+def create_balance(sender, instance, created, **kwargs):
+    if created:
+        WarehouseBalance.objects.bulk_create(
+            [WarehouseBalance(warehouse=instance)],
+            ignore_conflicts=True,
+        )
+
+
+def remember_record(sender, instance, raw=False, **kwargs):
+    # a record may be moved to another warehouse, or change its figures
+    if not instance._state.adding:
+        instance._saved_record = sender._base_manager.filter(pk=instance.pk).first()
+        instance._saved_warehouse_id = getattr(
+            instance._saved_record, "warehouse_id", None
+        )
+
+
+def update_balance(sender, instance, created, raw=False, **kwargs):
+    if raw and instance._meta.parents:
+        # parent rows are loaded from the fixture on their own
+        return
+    if created:
+        balances.apply_records([instance])
+    else:
+        balances.recalculate(
+            {instance.warehouse_id, getattr(instance, "_saved_warehouse_id", None)}
+            - {None}
+        )
+        saved_record = getattr(instance, "_saved_record", None)
+        if saved_record is not None:
+            balances.adjust_snapshots([saved_record], sign=-1)
+        balances.adjust_snapshots([instance])
+
+
+def revert_balance(sender, instance, **kwargs):
+    balances.remove_record(instance)
+    balances.adjust_snapshots([instance], sign=-1)
+
+
+def update_sales(sender, instance, created, raw=False, **kwargs):
+    if raw and instance._meta.parents:
+        return
+    saved_record = getattr(instance, "_saved_record", None)
+    if saved_record is not None:
+        sales.apply_records([saved_record], sign=-1)
+    sales.apply_records([instance])
+
+
+def revert_sales(sender, instance, **kwargs):
+    # the document must still exist
+    sales.apply_records([instance], sign=-1)
+
+
+def connect_records(*models):
+    """
+    Connect balance and sales receivers to `WarehouseRecord` and its aliases.
+    Only concrete tables' records should receive delete signals, as
+    multi-table children are deleted with their parents.
+    """
+    for model in models:
+        pre_save.connect(remember_record, sender=model)
+        post_save.connect(update_balance, sender=model)
+        post_save.connect(update_sales, sender=model)
+        if not model._meta.parents:
+            post_delete.connect(revert_balance, sender=model)
+            pre_delete.connect(revert_sales, sender=model)
+
+
+connect_records(WarehouseRecord)
@@ -2,12 +2,29 @@ from django.core import management
 
 from lime import app
 
+from . import search, uploads
+
 
 @app.task
 def auto_order():
     management.call_command("auto_order")
 
 
-@app.task
+@app.task(ignore_result=True)
 def update_search_index():
+    search.update_changed()
+
+
+@app.task
+def full_update_search_index():
     management.call_command("update_index")
+
+
+@app.task
+def snapshot_balances():
+    management.call_command("snapshot_balances")
+
+
+@app.task(ignore_result=True)
+def process_upload(job_id: int):
+    uploads.run(job_id)
@@ -0,0 +1,159 @@
+"""
+Catalog uploads processed by `UploadJob`. Spreadsheets are parsed column by
+column with pandas, and products are written in chunks; each chunk is saved
+along with the job progress, so a failed job resumes after its last chunk.
+"""
+from decimal import Decimal
+from typing import List
+
+import pandas as pd
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from loguru import logger
+
+from discounts import memberships, offer_index
+from products.importing import CHUNK_SIZE, get_or_create_many
+from products.models import MeasurementUnit, Product, ProductUnit
+from utils import cache as response_cache
+
+from .models import UploadJob
+
+# upload fields by `UploadCSVSerializer` fields
+COLUMNS = {
+    "name": "name_col",
+    "price": "price_col",
+    "barcode": "barcode_col",
+    "vat_rate": "vat_col",
+    "unit": "measure_unit_col",
+    "origin": "origin_col",
+    "manufacturer": "supplier_col",
+}
+DEFAULT_UNIT = "шт"
+
+
+def read_rows(file, columns: dict) -> pd.DataFrame:
+    """Rows having names and prices, a column per upload field."""
+    sheet = pd.read_excel(file, engine="openpyxl")
+    sheet = sheet.iloc[columns.get("first_row") or 0 :]
+
+    def get_column(field: str) -> pd.Series:
+        position = columns.get(COLUMNS[field])
+        if position is None:
+            return pd.Series(None, index=sheet.index, dtype=object)
+        return sheet.iloc[:, position]
+
+    def get_text(field: str, max_length: int) -> pd.Series:
+        values = get_column(field).astype("string").str.strip().str.slice(0, max_length)
+        return values.mask(values == "")
+
+    def get_number(field: str) -> pd.Series:
+        values = get_column(field)
+        if values.dtype == object:
+            # e.g. "20%"
+            values = values.astype("string").str.strip().str.rstrip("%")
+        return pd.to_numeric(values, errors="coerce")
+
+    def max_length(field: str) -> int:
+        return Product._meta.get_field(field).max_length
+
+    rows = pd.DataFrame(
+        {
+            "name": get_text("name", max_length("name")),
+            "price": get_number("price"),
+            "barcode": get_number("barcode"),
+            "vat_rate": get_number("vat_rate").round(2),
+            "unit": get_text("unit", 255).fillna(DEFAULT_UNIT),
+            "origin": get_text("origin", max_length("origin")),
+            "manufacturer": get_text("manufacturer", max_length("manufacturer")),
+        }
+    )
+    rows = rows[rows["name"].notna() & rows["price"].fillna(0).ne(0)]
+    return rows.reset_index(drop=True)
+
+
+def to_records(rows: pd.DataFrame) -> List[dict]:
+    return rows.astype(object).where(rows.notna(), None).to_dict("records")
+
+
+def save_rows(rows: List[dict]):
+    """Create missing products and product units."""
+    units = get_or_create_many(
+        MeasurementUnit,
+        ("name",),
+        {(row["unit"],): {} for row in rows},
+    )
+    products = get_or_create_many(
+        Product,
+        ("name",),
+        {
+            (row["name"],): {
+                "vat_rate": (
+                    None if row["vat_rate"] is None else Decimal(str(row["vat_rate"]))
+                ),
+                "origin": row["origin"],
+                "manufacturer": row["manufacturer"],
+            }
+            for row in reversed(rows)
+        },
+    )
+    product_units = get_or_create_many(
+        ProductUnit,
+        ("product_id", "unit_id"),
+        {
+            (products[(row["name"],)].pk, units[(row["unit"],)].pk): {
+                "barcode": None if row["barcode"] is None else int(row["barcode"]),
+            }
+            for row in reversed(rows)
+        },
+    )
+    # bulk writes skip the signals
+    memberships.refresh(
+        units=ProductUnit.objects.filter(pk__in=[x.pk for x in product_units.values()])
+    )
+
+
+def run(job_id: int, chunk_size: int = CHUNK_SIZE):
+    """Process a pending job, or resume a failed or interrupted one."""
+    started = UploadJob.objects.filter(
+        Q(status=UploadJob.STATUSES.pending) | UploadJob.resumable(),
+        pk=job_id,
+    ).update(
+        status=UploadJob.STATUSES.running,
+        started_at=timezone.now(),
+        progressed_at=timezone.now(),
+        finished_at=None,
+        run_rows=0,
+        error="",
+    )
+    if not started:
+        return
+    job = UploadJob.objects.get(pk=job_id)
+    jobs = UploadJob.objects.filter(pk=job_id)
+
+    try:
+        with job.file.open("rb") as file:
+            rows = read_rows(file, job.columns)
+        jobs.update(rows_total=len(rows), progressed_at=timezone.now())
+        for start in range(job.rows_done, len(rows), chunk_size):
+            chunk = rows.iloc[start : start + chunk_size]
+            with transaction.atomic():
+                save_rows(to_records(chunk))
+                jobs.update(
+                    rows_done=start + len(chunk),
+                    run_rows=F("run_rows") + len(chunk),
+                    progressed_at=timezone.now(),
+                )
+    except Exception as e:  # noqa
+        logger.exception(f"Upload {job_id} failed.")
+        jobs.update(
+            status=UploadJob.STATUSES.failed,
+            error=repr(e),
+            finished_at=timezone.now(),
+        )
+    else:
+        jobs.update(status=UploadJob.STATUSES.done, finished_at=timezone.now())
+    finally:
+        # bulk writes skip the signals
+        offer_index.invalidate()
+        response_cache.invalidate("catalog")
@@ -15,6 +15,7 @@ router.register("supplier", views.SupplierViewSet)
 router.register("supply-contracts", views.SupplyContractViewSet)
 router.register("legal-entities", views.LegalEntityViewSet)
 router.register("batches", views.BatchViewSet)
+router.register("upload-jobs", views.UploadJobViewSet)
 
 warehouse_router = NestedSimpleRouter(router, "outlets", lookup="shop")
 warehouse_router.register("warehouses", views.WarehouseViewSet)
@@ -98,8 +99,17 @@ return_records_router = NestedSimpleRouter(docs_router, "return", lookup="docume
 return_records_router.register(
     "records", views.PrimaryDocumentRecordViewSet, basename="returnrecord"
 )
-docs_router.register("graph-analytics", views.GraphAnalyticsViewSet)
-docs_router.register("graph-check-analytics", views.GraphCheckAnalyticsViewSet)
+docs_router.register(
+    "graph-analytics", views.GraphAnalyticsViewSet, basename="graphanalytics"
+)
+docs_router.register(
+    "graph-check-analytics",
+    views.GraphCheckAnalyticsViewSet,
+    basename="graphcheckanalytics",
+)
+docs_router.register(
+    "cashiers-analytics", views.CashierAnalyticsViewSet, basename="cashieranalytics"
+)
 
 
 urlpatterns = [
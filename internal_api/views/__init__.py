@@ -1,6 +1,7 @@
 from .autocomplete import Autocomplete
 from .primary_documents import (  # noqa
     CancelDocumentViewSet,
+    CashierAnalyticsViewSet,
     ConversionDocumentViewSet,
     GraphAnalyticsViewSet,
     GraphCheckAnalyticsViewSet,
@@ -26,4 +27,4 @@ from .suppliers import (  # noqa
     SupplyContractViewSet,
     WarehouseOrderViewSet,
 )
-from .upload_csv import UploadCSVGenericView  # noqa
+from .upload_csv import UploadCSVGenericView, UploadJobViewSet  # noqa
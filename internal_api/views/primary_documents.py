@@ -1,17 +1,19 @@
 from django.db import transaction
 from django.utils.decorators import method_decorator
 from django_filters import rest_framework as df_filters
+from rest_framework.decorators import action
 from rest_framework.exceptions import APIException
 from rest_framework.mixins import CreateModelMixin, DestroyModelMixin
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from rest_framework.status import HTTP_409_CONFLICT
-from rest_framework.viewsets import ReadOnlyModelViewSet
+from rest_framework.viewsets import GenericViewSet, ReadOnlyModelViewSet
 from rest_framework_nested.viewsets import NestedViewSetMixin
 
 from utils import permissions as perms
 
-from .. import filters, models, serializers
+from .. import analytics, balances, filters, models, sales, serializers
+from ..models.shops import validate_batches
 
 
 class CreateProductionDocumentException(APIException):
@@ -93,6 +95,7 @@ class ProductionDocumentViewSet(
                 )
             )
         models.WarehouseRecord.objects.bulk_create(write_offs)
+        balances.apply_records(write_offs)
 
         # register the produce
         produce = []
@@ -108,6 +111,7 @@ class ProductionDocumentViewSet(
                 )
             )
         models.WarehouseRecord.objects.bulk_create(produce)
+        balances.apply_records(produce)
 
 
 @method_decorator(transaction.atomic, "perform_create")
@@ -241,6 +245,7 @@ class SaleDocumentViewSet(
             read=perms.allow_authenticated,
             create=perms.allow_authenticated,
             destroy=perms.allow_staff,
+            bulk=perms.allow_authenticated,
         ),
     )
     queryset = models.SaleDocument.objects.order_by("created_at", "number")
@@ -257,6 +262,18 @@ class SaleDocumentViewSet(
 
         return qs.filter(author=user)
 
+    def get_serializer_class(self):
+        if self.action == "bulk":
+            return serializers.BulkSaleDocumentSerializer
+        return super().get_serializer_class()
+
+    @action(detail=False, methods=("post",))
+    def bulk(self, request, *args, **kwargs):
+        """Create many sales at once, returning the results by sale."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({"results": serializer.save()})
+
 
 class CancelDocumentViewSet(
     CreateModelMixin,
@@ -292,24 +309,53 @@ class CancelDocumentViewSet(
                     document=document,
                 )
             )
+        validate_batches(records)
         models.WarehouseRecord.objects.bulk_create(records)
+        balances.apply_records(records)
+        sales.apply_records(records)
 
 
-class GraphAnalyticsViewSet(
-    ReadOnlyModelViewSet,
-):
-    queryset = models.SaleDocument.objects.order_by("created_at", "number")
+class GraphAnalyticsViewSet(GenericViewSet):
+    queryset = models.SalesFact.objects.all()
     serializer_class = serializers.GraphAnaliticsSerializer
-    lookup_field = "id"
     filter_backends = (df_filters.DjangoFilterBackend,)
-    filterset_class = filters.GraphAnaliticsFilter
+    filterset_class = filters.SalesFactFilter
 
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.filter_queryset(self.get_queryset()))
+        return Response(serializer.data)
 
-class GraphCheckAnalyticsViewSet(
-    ReadOnlyModelViewSet,
-):
+
+class GraphCheckAnalyticsViewSet(GenericViewSet):
     queryset = models.SaleDocument.objects.order_by("created_at", "number")
     serializer_class = serializers.CheckSerializer
-    lookup_field = "id"
     filter_backends = (df_filters.DjangoFilterBackend,)
     filterset_class = filters.GraphAnaliticsFilter
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["facts"] = filters.SalesFactFilter(
+            self.request.query_params,
+            queryset=models.SalesFact.objects.all(),
+            request=self.request,
+        ).qs
+        return context
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.filter_queryset(self.get_queryset()))
+        return Response(serializer.data)
+
+
+class CashierAnalyticsViewSet(GenericViewSet):
+    """Sales totals by cashier and shop."""
+
+    permission_classes = (perms.ReadWritePermission(read=perms.allow_staff),)
+    queryset = models.SaleDocument.objects.all()
+    serializer_class = serializers.CashierTotalsSerializer
+    filter_backends = (df_filters.DjangoFilterBackend,)
+    filterset_class = filters.GraphAnaliticsFilter
+
+    def list(self, request, *args, **kwargs):
+        totals = analytics.get_cashiers(self.filter_queryset(self.get_queryset()))
+        serializer = self.get_serializer(totals, many=True)
+        return Response(serializer.data)
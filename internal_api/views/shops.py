@@ -1,5 +1,5 @@
 from django.db import DatabaseError
-from django.db.models import F
+from django.db.models import F, OuterRef, Subquery
 from django_filters import rest_framework as df_filters
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
@@ -9,6 +9,7 @@ from rest_framework_nested.viewsets import NestedViewSetMixin
 
 from products.models import Category
 from utils import permissions as perms
+from utils.cache import CachedResponseMixin
 from utils.serializers_utils import exclude_field
 from utils.views_utils import (
     BulkChangeArchiveStatusViewSetMixin,
@@ -63,10 +64,13 @@ def allow_all_for_e_shop(perm, request, view):
     return shop.e_shop_base or perms.allow_staff(perm, request, view)
 
 
-class WarehouseViewSet(NestedViewSetMixin, ModelViewSet):
+class WarehouseViewSet(CachedResponseMixin, NestedViewSetMixin, ModelViewSet):
     permission_classes = (
         perms.ReadWritePermission(read=allow_all_for_e_shop, write=perms.allow_staff),
     )
+    cache_tags = ("catalog", "offers", "warehouses")
+    # remainders change with every record
+    cache_timeout = 60
     serializer_class = serializers.WarehouseSerializer
     filter_backends = (df_filters.DjangoFilterBackend,)
     filterset_class = filters.WarehouseFilter
@@ -130,39 +134,30 @@ class WarehouseForScalesListView(NestedViewSetMixin, ReadOnlyModelViewSet):
 
     def get_queryset(self):
         qs = super().get_queryset()
-        qs = qs.prefetch_related(
+        qs = qs.select_related(
             "product_unit", "product_unit__unit", "product_unit__product"
         )
         qs = qs.annotate(
             category_id=F("product_unit__product__category__id"),
             category_name=F("product_unit__product__category__name"),
+            # a category tree is rooted in a single top level category
+            root_category_id=Subquery(
+                Category.objects.filter(
+                    tree_id=OuterRef("product_unit__product__category__tree_id"),
+                    level=0,
+                ).values("id")[:1]
+            ),
         )
         return qs
 
-    # TODO: Использовать сериалайзер, оптимизировать запрос;
     def list(self, request, *args, **kwargs):
-        response = super(WarehouseForScalesListView, self).list(
-            self, request, *args, **kwargs
-        )
-        new_response = dict()
-        categories_dict = {}
-        categories = Category.objects.filter(level=0)
-        for category in categories:
-            category_children = category.get_descendants(include_self=True).values_list(
-                "id", flat=True
-            )
-            categories_dict.update({category.id: list(category_children)})
-        for i in response.data:
-            parent_category = None
-            for category in categories_dict:
-                if i["category_id"] in categories_dict[category]:
-                    parent_category = category
-                    break
-            if parent_category not in new_response:
-                new_response.update({parent_category: [i]})
-            else:
-                new_response[parent_category].append(i)
-        return Response(data=new_response)
+        """Warehouses grouped by root categories of their products."""
+        warehouses = list(self.filter_queryset(self.get_queryset()))
+        data = self.get_serializer(warehouses, many=True).data
+        grouped = {}
+        for warehouse, item in zip(warehouses, data):
+            grouped.setdefault(warehouse.root_category_id, []).append(item)
+        return Response(data=grouped)
 
 
 class BatchViewSet(ModelViewSet):
@@ -4,6 +4,7 @@ from pathlib import Path
 
 import environ
 import sentry_sdk
+from celery.schedules import crontab
 from loguru import logger
 from sentry_sdk.integrations.django import DjangoIntegration
 from sentry_sdk.integrations.logging import (
@@ -152,13 +153,29 @@ SWAGGER_SETTINGS = {
 CELERY_BROKER_URL = env("CELERY_BROKER_URL")
 CELERY_TASK_ALWAYS_EAGER = env.bool("CELERY_TASK_ALWAYS_EAGER", default=False)
 CELERY_BEAT_SCHEDULE = {
+    "process_offer_transitions": {
+        "task": "discounts.tasks.process_offer_transitions",
+        "schedule": 30.0,
+        "options": {"expires": 30.0},
+    },
     "auto_order": {
         "task": "internal_api.tasks.auto_order",
         "schedule": 60.0,
     },
     "update_search_index": {
         "task": "internal_api.tasks.update_search_index",
-        "schedule": 300.0,
+        "schedule": 10.0,
+        "options": {"expires": 10.0},
+    },
+    "full_update_search_index": {
+        "task": "internal_api.tasks.full_update_search_index",
+        # catches up on unqueued changes, e.g. queryset updates
+        "schedule": crontab(hour=1, minute=0),
+    },
+    "snapshot_balances": {
+        "task": "internal_api.tasks.snapshot_balances",
+        # the previous local day is over by then (the schedule is in UTC)
+        "schedule": crontab(hour=0, minute=5),
     },
 }
 
@@ -201,6 +218,18 @@ THUMBNAIL_BACKEND = "utils.thumbnail.ThumbnailBackend"
 THUMBNAIL_PRESERVE_FORMAT = True
 THUMBNAIL_REDIS_URL = env("THUMBNAIL_REDIS_URL")
 
+# cached responses and versions are invalidated across processes, so the cache
+# must be shared; an empty value selects a per-process memory cache
+CACHE_REDIS_URL = env("CACHE_REDIS_URL", default=THUMBNAIL_REDIS_URL)
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+            "KEY_PREFIX": "lime",
+        },
+    }
+
 PRODUCT_IMAGE_PRESERVE_ORIGINAL = env.bool("PRODUCT_IMAGE_PRESERVE_ORIGINAL", False)
 
 HAYSTACK_CONNECTIONS = {
@@ -213,6 +242,7 @@ HAYSTACK_CONNECTIONS = {
         ),
     },
 }
+HAYSTACK_SIGNAL_PROCESSOR = "internal_api.search.QueuedSignalProcessor"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -251,3 +281,9 @@ if SENTRY_KEY and SENTRY_PROJECT:
     )
 
 ASGI_APPLICATION = "lime.asgi.application"
+
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+    },
+}
@@ -7,7 +7,7 @@ from internal_api.models.shops import Batch, Warehouse
 from internal_api.models.shops import (
     WarehouseRecordManager as BaseWarehouseRecordManager,
 )
-from internal_api.models.shops import validate_batch
+from internal_api.models.shops import validate_batches
 from utils.choices import Choices
 from utils.models_utils import Enumerable, SuperclassMixin, Timestampable
 
@@ -160,7 +160,7 @@ class WarehouseRecord(Timestampable, models.Model):
         return f"Изменение {self.warehouse}"
 
     def save(self, *args, **kwargs):
-        validate_batch(self)
+        validate_batches([self])
         super().save(*args, **kwargs)
 
 
@@ -0,0 +1,6 @@
+from internal_api.signals import connect_records
+
+from .models import OrderLine, WarehouseRecord
+
+# order lines are warehouse records as well
+connect_records(WarehouseRecord, OrderLine)
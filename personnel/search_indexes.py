@@ -6,6 +6,10 @@ from .models import Personnel
 class PersonnelIndex(indexes.SearchIndex, indexes.Indexable):
     text = indexes.EdgeNgramField(document=True, use_template=True)
     phone_number = indexes.CharField(model_attr="phone_number")
+    related_lookups = {
+        "users.User": "user",
+        "users.CustomerDeliveryAddress": "user__delivery_address",
+    }
 
     def get_model(self):
         return Personnel
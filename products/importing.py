@@ -0,0 +1,77 @@
+"""
+Helpers for spreadsheet imports: rows are streamed from a read-only workbook
+in chunks, and the objects rows refer to are looked up (or created) for
+a whole chunk at once.
+"""
+import time
+from typing import Dict, Iterator, List, Sequence, Tuple, Type
+
+from django.db import models
+
+CHUNK_SIZE = 1000
+
+
+def iter_chunks(
+    ws,
+    size: int = CHUNK_SIZE,
+    min_row: int = 2,
+) -> Iterator[List[Tuple[int, tuple]]]:
+    """Lists of row numbers and row values."""
+    chunk = []
+    rows = ws.iter_rows(min_row=min_row, values_only=True)
+    for i, row in enumerate(rows, start=min_row):
+        chunk.append((i, row))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_or_create_many(
+    model: Type[models.Model],
+    key_fields: Sequence[str],
+    defaults: Dict[tuple, dict],
+) -> Dict[tuple, models.Model]:
+    """
+    Objects by values of `key_fields` (which are keys of `defaults`). Missing
+    objects are created with `bulk_create`, so `save` and signals are skipped.
+    Of many objects with the same key, the oldest one is taken.
+    """
+    if not defaults:
+        return {}
+    lookups = {
+        f"{field}__in": {key[n] for key in defaults}
+        for n, field in enumerate(key_fields)
+    }
+    found = {}
+    for obj in model._base_manager.filter(**lookups).order_by("pk"):
+        key = tuple(getattr(obj, field) for field in key_fields)
+        if key in defaults:
+            found.setdefault(key, obj)
+
+    missing = [
+        model(**dict(zip(key_fields, key)), **values)
+        for key, values in defaults.items()
+        if key not in found
+    ]
+    for obj in model._base_manager.bulk_create(missing):
+        found[tuple(getattr(obj, field) for field in key_fields)] = obj
+    return found
+
+
+class Progress:
+    """Reports the number of processed rows and the throughput."""
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.started = time.monotonic()
+        self.rows = 0
+
+    def add(self, rows: int):
+        self.rows += rows
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f"Обработано строк: {self.rows} за {elapsed:.1f} с"
+            f" ({self.rows / max(elapsed, 0.001):.0f} строк/с)"
+        )
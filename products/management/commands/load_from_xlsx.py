@@ -2,10 +2,15 @@ import traceback
 from decimal import Decimal
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from openpyxl import load_workbook
 
-from internal_api.models import Shop, Supplier, Warehouse
+from discounts import memberships, offer_index
+from internal_api import search
+from internal_api.models import Shop, Supplier, Warehouse, WarehouseBalance
+from products.importing import CHUNK_SIZE, Progress, get_or_create_many, iter_chunks
 from products.models import MeasurementUnit, Product, ProductUnit
+from utils import cache as response_cache
 
 
 class Command(BaseCommand):
@@ -22,48 +27,113 @@ class Command(BaseCommand):
             type=int,
             help="Outlet Id to prepare for accepting goods",
         )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help=f"Rows to write at once (default: {CHUNK_SIZE})",
+        )
 
-    def handle(self, input_file, *args, **options):
+    def handle(self, input_file, *args, chunk_size=CHUNK_SIZE, **options):
         wb = load_workbook(input_file, read_only=True)
         ws = wb["TDSheet"]
 
         shop_id = options.get("shop")
         shop = Shop.objects.get(id=shop_id) if shop_id else None
 
-        for i, row in enumerate(ws.iter_rows(min_row=2), start=2):
-            try:
-                product_name = row[2].value
-                if not product_name:
-                    continue
-
-                supplier_name = row[1].value
-                barcode = int(row[3].value or 0)
-                unit_name = row[4].value or "шт"
-                cost = Decimal(row[5].value or 0)
-                price = Decimal(row[6].value or 0)
-
-                unit, _ = MeasurementUnit.objects.get_or_create(name=unit_name)
-                product, _ = Product.objects.get_or_create(name=product_name)
-                product_unit, _ = ProductUnit.objects.get_or_create(
-                    product=product,
-                    unit=unit,
-                    defaults={"barcode": barcode},
-                )
-                if shop and price and cost:
-                    supplier, _ = Supplier.objects.get_or_create(
-                        name=supplier_name,
-                    )
-                    warehouse, _ = Warehouse.objects.get_or_create(
-                        shop=shop,
-                        product_unit=product_unit,
-                        supplier=supplier,
-                        defaults={
-                            "price": price,
-                            "margin": round(price / cost * 100 - Decimal(100), 2),
-                        },
+        progress = Progress(self.stdout)
+        for chunk in iter_chunks(ws, chunk_size):
+            rows = []
+            for i, row in chunk:
+                try:
+                    product_name = row[2]
+                    if not product_name:
+                        continue
+                    rows.append(
+                        {
+                            "supplier_name": row[1],
+                            "product_name": product_name,
+                            "barcode": int(row[3] or 0),
+                            "unit_name": row[4] or "шт",
+                            "cost": Decimal(row[5] or 0),
+                            "price": Decimal(row[6] or 0),
+                        }
                     )
+                except:  # noqa
+                    print(f"При обработке строки {i} возникло исключение:")
+                    traceback.print_exc()
+
+            try:
+                with transaction.atomic():
+                    self.save_rows(rows, shop)
             except:  # noqa
-                print(f"При обработке строки {i} возникло исключение:")
+                print(
+                    f"При записи строк {chunk[0][0]}–{chunk[-1][0]}"
+                    " возникло исключение:"
+                )
                 traceback.print_exc()
+            progress.add(len(chunk))
 
         wb.close()
+        # bulk writes skip the signals
+        offer_index.invalidate()
+        response_cache.invalidate("catalog", "warehouses")
+
+    def save_rows(self, rows, shop):
+        units = get_or_create_many(
+            MeasurementUnit,
+            ("name",),
+            {(row["unit_name"],): {} for row in rows},
+        )
+        products = get_or_create_many(
+            Product,
+            ("name",),
+            {(row["product_name"],): {} for row in rows},
+        )
+        for row in rows:
+            row["product_id"] = products[(row["product_name"],)].pk
+            row["unit_id"] = units[(row["unit_name"],)].pk
+        product_units = get_or_create_many(
+            ProductUnit,
+            ("product_id", "unit_id"),
+            {
+                (row["product_id"], row["unit_id"]): {"barcode": row["barcode"]}
+                for row in reversed(rows)
+            },
+        )
+        memberships.refresh(
+            units=ProductUnit.objects.filter(
+                pk__in=[x.pk for x in product_units.values()]
+            )
+        )
+        rows = [row for row in rows if shop and row["price"] and row["cost"]]
+        if not rows:
+            return
+
+        # warehouses are not bound to suppliers
+        suppliers = get_or_create_many(
+            Supplier,
+            ("name",),
+            {(row["supplier_name"],): {} for row in rows},
+        )
+        warehouse_defaults = {}
+        for row in reversed(rows):
+            product_unit = product_units[(row["product_id"], row["unit_id"])]
+            warehouse_defaults[(shop.pk, product_unit.pk)] = {
+                "price": row["price"],
+                "margin": round(row["price"] / row["cost"] * 100 - Decimal(100), 2),
+            }
+        warehouses = get_or_create_many(
+            Warehouse,
+            ("shop_id", "product_unit_id"),
+            warehouse_defaults,
+        )
+        WarehouseBalance.objects.bulk_create(
+            [
+                WarehouseBalance(warehouse=warehouse)
+                for warehouse in warehouses.values()
+            ],
+            ignore_conflicts=True,
+        )
+        search.enqueue(Supplier, [supplier.pk for supplier in suppliers.values()])
+        search.enqueue(Warehouse, [warehouse.pk for warehouse in warehouses.values()])
@@ -1,7 +1,7 @@
 import traceback
-from collections import defaultdict
 from decimal import Decimal
 from functools import cache
+from typing import List
 
 from dateutil import parser
 from django.core.management.base import BaseCommand
@@ -9,6 +9,8 @@ from django.db import transaction
 from django.utils.timezone import get_current_timezone
 from openpyxl import load_workbook
 
+from discounts import memberships, offer_index
+from internal_api import balances, search
 from internal_api.models import (
     Batch,
     ReceiptDocument,
@@ -16,10 +18,14 @@ from internal_api.models import (
     Supplier,
     SupplyContract,
     Warehouse,
+    WarehouseBalance,
     WarehouseOrder,
     WarehouseRecord,
 )
+from internal_api.models.shops import validate_batches
+from products.importing import CHUNK_SIZE, Progress, get_or_create_many, iter_chunks
 from products.models import MeasurementUnit, Product, ProductUnit
+from utils import cache as response_cache
 
 
 @cache
@@ -61,6 +67,46 @@ def _get_or_create_supplier(supplier_name, contract_number, contract_date):
     return supplier
 
 
+def _get_receipt(receipt_text, first_row):
+    receipt_number, receipt_datetime = receipt_text.removeprefix(
+        "Поступление товаров и услуг "
+    ).split(" от ")
+    receipt_datetime = parser.parse(receipt_datetime).replace(
+        tzinfo=get_current_timezone(),
+    )
+
+    shop_address = first_row[0]
+    shop = _get_or_create_shop(shop_address)
+
+    supplier_name = first_row[4]
+    contract = first_row[5]
+    contract_number, contract_date = contract.removeprefix("Договор № ").split(" от ")
+    contract_date = parser.parse(contract_date.removesuffix("г.")).date()
+    supplier = _get_or_create_supplier(
+        supplier_name,
+        contract_number,
+        contract_date,
+    )
+    faux_order, _ = WarehouseOrder.objects.get_or_create(
+        supplier=supplier,
+        shop=shop,
+        created_at=receipt_datetime,
+        defaults={"status": "delivered"},
+    )
+    waybill = first_row[2]
+    receipt, _ = ReceiptDocument.objects.get_or_create(
+        number=receipt_number,
+        defaults={
+            "waybill": waybill,
+            "waybill_date": receipt_datetime.date(),
+            "created_at": receipt_datetime,
+            "order": faux_order,
+        },
+    )
+    receipt.warehouse_records.all().delete()
+    return receipt, shop, supplier
+
+
 class Command(BaseCommand):
     help = "Creates an inventory document from an Excel file."
 
@@ -78,114 +124,171 @@ class Command(BaseCommand):
                 " (default: use the latest existing batch)"
             ),
         )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help=f"Rows to write at once (default: {CHUNK_SIZE})",
+        )
 
-    def handle(self, input_file, new_batch, *args, **options):
+    def handle(self, input_file, new_batch, *args, chunk_size=CHUNK_SIZE, **options):
         wb = load_workbook(input_file, read_only=True)
         ws = wb["TDSheet"]
 
-        receipts = defaultdict(list)
-        for i, row in enumerate(ws.iter_rows(min_row=2), start=2):
-            receipts[row[1].value].append(i)
+        # objects cached by a previous run may have been rolled back
+        for getter in (
+            _get_or_create_shop,
+            _get_or_create_supply_contract,
+            _get_or_create_supplier,
+        ):
+            getter.cache_clear()
+        self.new_batch = new_batch
+        self.unit, _ = MeasurementUnit.objects.get_or_create(name="шт")
+        # receipt documents, shops and suppliers by receipt text, or `None`
+        # if the receipt header is broken
+        self.receipts = {}
+        # latest batches by supplier and product unit, of the saved chunks
+        self.batches = {}
 
-        unit, _ = MeasurementUnit.objects.get_or_create(name="шт")
+        progress = Progress(self.stdout)
+        for chunk in iter_chunks(ws, chunk_size):
+            rows = []
+            for i, row in chunk:
+                receipt_text = row[1]
+                if receipt_text not in self.receipts:
+                    try:
+                        self.receipts[receipt_text] = _get_receipt(receipt_text, row)
+                    except Exception:  # noqa
+                        print(f"При обработке {receipt_text} возникло исключение:")
+                        traceback.print_exc(limit=1, chain=False)
+                        self.receipts[receipt_text] = None
+                if self.receipts[receipt_text] is None:
+                    continue
 
-        for receipt_text, row_indices in receipts.items():
-            try:
-                receipt_number, receipt_datetime = receipt_text.removeprefix(
-                    "Поступление товаров и услуг "
-                ).split(" от ")
-                receipt_datetime = parser.parse(receipt_datetime).replace(
-                    tzinfo=get_current_timezone(),
-                )
-                first_row = ws[row_indices[0]]
-
-                shop_address = first_row[0].value
-                shop = _get_or_create_shop(shop_address)
-
-                supplier_name = first_row[4].value
-                contract = first_row[5].value
-                contract_number, contract_date = contract.removeprefix(
-                    "Договор № "
-                ).split(" от ")
-                contract_date = parser.parse(contract_date.removesuffix("г.")).date()
-                supplier = _get_or_create_supplier(
-                    supplier_name,
-                    contract_number,
-                    contract_date,
-                )
-                faux_order, _ = WarehouseOrder.objects.get_or_create(
-                    supplier=supplier,
-                    shop=shop,
-                    created_at=receipt_datetime,
-                    defaults={"status": "delivered"},
-                )
-                waybill = first_row[2].value
-                receipt, _ = ReceiptDocument.objects.get_or_create(
-                    number=receipt_number,
-                    defaults={
-                        "waybill": waybill,
-                        "waybill_date": receipt_datetime.date(),
-                        "created_at": receipt_datetime,
-                        "order": faux_order,
-                    },
-                )
-                receipt.warehouse_records.all().delete()
-            except Exception:  # noqa
-                print(f"При обработке {receipt_text} возникло исключение:")
-                traceback.print_exc(limit=1, chain=False)
-                continue
-
-            for i in row_indices:
                 try:
-                    row = ws[i]
-                    product_name = row[6].value  # a room for improvement
-                    barcode = row[7].value
-                    barcode = int(barcode) if barcode else None
-                    quantity = Decimal(row[8].value)
-                    cost = Decimal(row[9].value)
-                    price = Decimal(row[10].value)
-                    vat_rate = Decimal(row[11].value.rstrip("%"))
-
-                    product, _ = Product.objects.get_or_create(
-                        name=product_name,
-                        defaults={"vat_rate": vat_rate},
-                    )
-                    product_unit, _ = ProductUnit.objects.get_or_create(
-                        product=product,
-                        unit=unit,
-                        defaults={"barcode": barcode},
-                    )
-                    warehouse, _ = Warehouse.objects.get_or_create(
-                        shop=shop,
-                        product_unit=product_unit,
-                        defaults={
-                            "price": price,
-                            "margin": round(price / cost * 100 - Decimal(100), 2),
-                        },
-                    )
-                    if not new_batch:
-                        batch = (
-                            Batch.objects.filter(
-                                supplier=supplier,
-                                warehouse_records__warehouse__product_unit=product_unit,
-                            )
-                            .order_by("created_at")
-                            .last()
-                        )
-                        if not batch:
-                            batch = Batch.objects.create(supplier=supplier)
-                    else:
-                        batch = Batch.objects.create(supplier=supplier)
-                    record = WarehouseRecord(
-                        batch=batch,
-                        document=receipt,
-                        warehouse=warehouse,
-                        quantity=quantity,
-                        cost=cost,
+                    barcode = row[7]
+                    rows.append(
+                        {
+                            "receipt": self.receipts[receipt_text],
+                            "product_name": row[6],  # a room for improvement
+                            "barcode": int(barcode) if barcode else None,
+                            "quantity": Decimal(row[8]),
+                            "cost": Decimal(row[9]),
+                            "price": Decimal(row[10]),
+                            "vat_rate": Decimal(row[11].rstrip("%")),
+                        }
                     )
-                    record.save()
                 except Exception:  # noqa
                     print(f"При обработке строки {i} возникло исключение:")
                     traceback.print_exc(limit=1, chain=False)
 
+            # batches looked up or created by the chunk
+            self.chunk_batches = {}
+            try:
+                with transaction.atomic():
+                    self.save_rows(rows)
+            except Exception:  # noqa
+                print(
+                    f"При записи строк {chunk[0][0]}–{chunk[-1][0]}"
+                    " возникло исключение:"
+                )
+                traceback.print_exc(limit=1, chain=False)
+            else:
+                # batches of a rolled back chunk may not exist
+                self.batches.update(self.chunk_batches)
+            progress.add(len(chunk))
+
         wb.close()
+        # bulk writes skip the signals
+        offer_index.invalidate()
+        response_cache.invalidate("catalog", "warehouses")
+
+    def save_rows(self, rows):
+        products = get_or_create_many(
+            Product,
+            ("name",),
+            {
+                (row["product_name"],): {"vat_rate": row["vat_rate"]}
+                for row in reversed(rows)
+            },
+        )
+        product_units = get_or_create_many(
+            ProductUnit,
+            ("product_id", "unit_id"),
+            {
+                (products[(row["product_name"],)].pk, self.unit.pk): {
+                    "barcode": row["barcode"],
+                }
+                for row in reversed(rows)
+            },
+        )
+        memberships.refresh(
+            units=ProductUnit.objects.filter(
+                pk__in=[x.pk for x in product_units.values()]
+            )
+        )
+        for row in rows:
+            product = products[(row["product_name"],)]
+            row["product_unit"] = product_units[(product.pk, self.unit.pk)]
+
+        warehouses = get_or_create_many(
+            Warehouse,
+            ("shop_id", "product_unit_id"),
+            {
+                (row["receipt"][1].pk, row["product_unit"].pk): {
+                    "price": row["price"],
+                    "margin": round(row["price"] / row["cost"] * 100 - Decimal(100), 2),
+                }
+                for row in reversed(rows)
+            },
+        )
+        WarehouseBalance.objects.bulk_create(
+            [
+                WarehouseBalance(warehouse=warehouse)
+                for warehouse in warehouses.values()
+            ],
+            ignore_conflicts=True,
+        )
+        search.enqueue(Warehouse, [warehouse.pk for warehouse in warehouses.values()])
+
+        batches = self.get_batches(rows)
+        records = [
+            WarehouseRecord(
+                batch=batch,
+                document=receipt,
+                warehouse=warehouses[(shop.pk, row["product_unit"].pk)],
+                quantity=row["quantity"],
+                cost=row["cost"],
+            )
+            for row, batch in zip(rows, batches)
+            for receipt, shop, _ in (row["receipt"],)
+        ]
+        validate_batches(records)
+        WarehouseRecord.objects.bulk_create(records)
+        balances.apply_records(records)
+
+    def get_batches(self, rows) -> List[Batch]:
+        """Batches for rows, new or the latest existing ones."""
+        keys = [(row["receipt"][2].pk, row["product_unit"].pk) for row in rows]
+        if self.new_batch:
+            return Batch.objects.bulk_create(
+                Batch(supplier_id=supplier_id, product_unit_id=product_unit_id)
+                for supplier_id, product_unit_id in keys
+            )
+
+        missing = set(keys) - self.batches.keys()
+        for batch in Batch.objects.filter(
+            supplier_id__in={supplier_id for supplier_id, _ in missing},
+            product_unit_id__in={product_unit_id for _, product_unit_id in missing},
+        ).order_by("created_at"):
+            key = (batch.supplier_id, batch.product_unit_id)
+            if key in missing:
+                self.chunk_batches[key] = batch
+        new_batches = Batch.objects.bulk_create(
+            Batch(supplier_id=supplier_id, product_unit_id=product_unit_id)
+            for supplier_id, product_unit_id in missing - self.chunk_batches.keys()
+        )
+        self.chunk_batches.update(
+            ((batch.supplier_id, batch.product_unit_id), batch) for batch in new_batches
+        )
+        return [self.batches.get(key) or self.chunk_batches[key] for key in keys]
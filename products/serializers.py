@@ -20,6 +20,11 @@ from .models import (
 
 
 class CategoryListSerializer(serializers.ModelSerializer):
+    """
+    A category with its subtree. Load categories with
+    `utils.models_utils.get_cached_subtrees` to avoid a query per category.
+    """
+
     children = serializers.SerializerMethodField()
 
     class Meta:
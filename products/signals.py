@@ -0,0 +1,14 @@
+from reviews.models import Favourite, Star
+from utils.cache import invalidate_on_change
+
+from .models import Category, MeasurementUnit, Product, ProductImage, ProductUnit
+
+invalidate_on_change(
+    "catalog",
+    Category,
+    MeasurementUnit,
+    Product,
+    ProductImage,
+    ProductUnit,
+)
+invalidate_on_change("reviews", Favourite, Star)
@@ -1,11 +1,16 @@
+from django.core.cache import cache
 from django.db.models import Q
+from django.http import Http404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework_nested.viewsets import NestedViewSetMixin
 
+from discounts import memberships, offer_index
 from utils import permissions as perms
+from utils.cache import CachedResponseMixin, CacheInvalidatingMixin, get_tag_versions
+from utils.models_utils import get_cached_subtrees
 from utils.views_utils import (
     BulkChangeArchiveStatusViewSetMixin,
     BulkUpdateViewSetMixin,
@@ -34,6 +39,7 @@ class MeasurementUnitViewset(viewsets.ModelViewSet):
 
 
 class ProductAdminViewset(
+    CacheInvalidatingMixin,
     BulkChangeArchiveStatusViewSetMixin,
     ChangeDestroyToArchiveMixin,
     BulkUpdateViewSetMixin,
@@ -46,10 +52,12 @@ class ProductAdminViewset(
             write=perms.allow_staff,
             bulk_update=perms.allow_staff,
             change_archive_status=perms.allow_staff,
+            change_category=perms.allow_staff,
         ),
     )
     filter_backends = (DjangoFilterBackend,)
     filterset_class = ProductFilter
+    cache_tags = ("catalog",)
     serializer_class = serializers.ProductAdminSerializer
     serializer_action_classes = {
         "list": serializers.ProductListAdminSerializer,
@@ -87,8 +95,14 @@ class ProductAdminViewset(
         product_ids = serialized_data.data["product_ids"]
         new_category = serialized_data.data["new_category"]
         Product.objects.filter(id__in=product_ids).update(category=new_category)
+        self.perform_bulk_update(product_ids)
         return Response(status=status.HTTP_200_OK)
 
+    def perform_bulk_update(self, ids):
+        # queryset updates skip the signals
+        offer_index.invalidate()
+        memberships.refresh(units=ProductUnit.objects.filter(product_id__in=ids))
+
 
 class ProductUnitViewset(NestedViewSetMixin, viewsets.ModelViewSet):
     permission_classes = (
@@ -138,12 +152,14 @@ class ConversionTargetViewset(NestedViewSetMixin, viewsets.ModelViewSet):
 
 
 class ProductViewset(
+    CachedResponseMixin,
     OrderingModelViewsetMixin,
     viewsets.ReadOnlyModelViewSet,
 ):
     permission_classes = (perms.ReadWritePermission(read=perms.allow_all),)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = ProductFilter
+    cache_tags = ("catalog", "reviews")
     serializer_class = serializers.ProductSerializer
     serializer_action_classes = {
         "list": serializers.ProductListSerializer,
@@ -169,7 +185,11 @@ class ProductViewset(
         return qs.order_by("name")
 
 
-class CategoryViewset(BulkChangeArchiveStatusViewSetMixin, viewsets.ModelViewSet):
+class CategoryViewset(
+    CachedResponseMixin,
+    BulkChangeArchiveStatusViewSetMixin,
+    viewsets.ModelViewSet,
+):
     permission_classes = (
         perms.ReadWritePermission(
             read=perms.allow_all,
@@ -178,6 +198,7 @@ class CategoryViewset(BulkChangeArchiveStatusViewSetMixin, viewsets.ModelViewSet
         ),
     )
     pagination_class = None
+    cache_tags = ("catalog",)
     serializer_class = serializers.CategorySerializer
     lookup_field = "id"
     serializer_action_classes = {
@@ -194,13 +215,16 @@ class CategoryViewset(BulkChangeArchiveStatusViewSetMixin, viewsets.ModelViewSet
         )
 
     def get_object(self):
-        return self.queryset.get(id=self.kwargs["id"])
+        if self.action != "retrieve":
+            return self.queryset.get(id=self.kwargs["id"])
+        # the category with its subtree
+        categories = get_cached_subtrees(self.queryset.filter(id=self.kwargs["id"]))
+        if not categories:
+            raise Http404
+        return categories[0]
 
     def get_queryset(self):
-        main_categories = self.queryset.filter(level=0)
-        qs = Category.objects.get_queryset_descendants(
-            main_categories, include_self=True
-        ).filter(level=0)
+        qs = self.queryset.filter(level=0)
 
         if "s" in self.request.query_params:
             search_value = self.request.query_params["s"]
@@ -208,6 +232,29 @@ class CategoryViewset(BulkChangeArchiveStatusViewSetMixin, viewsets.ModelViewSet
 
         return qs
 
+    def get_tree(self) -> list:
+        """Categories with their subtrees."""
+        categories = get_cached_subtrees(self.filter_queryset(self.get_queryset()))
+        return list(self.get_serializer(categories, many=True).data)
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(request, self.list_tree)
+
+    def list_tree(self, request):
+        if request.query_params:
+            return Response(self.get_tree())
+
+        # the whole tree is the same for everyone until the catalog changes,
+        # but for absolute URLs
+        version = get_tag_versions(self.cache_tags)[0]
+        origin = f"{request.scheme}://{request.get_host()}"
+        key = f"products:category-tree:{version}:{origin}"
+        tree = cache.get(key)
+        if tree is None:
+            tree = self.get_tree()
+            cache.set(key, tree, self.cache_timeout)
+        return Response(tree)
+
 
 class EditProductImagesViewset(mixins.ListModelMixin, viewsets.GenericViewSet):
     permission_classes = (
@@ -9,6 +9,11 @@ from .models import Recipe, RecipeCategory, RecipeCookingSteps
 
 
 class RecipeCategoryListSerializer(serializers.ModelSerializer):
+    """
+    A category with its subtree. Load categories with
+    `utils.models_utils.get_cached_subtrees` to avoid a query per category.
+    """
+
     children = serializers.SerializerMethodField()
 
     class Meta:
@@ -1,7 +1,10 @@
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
 from utils import permissions as perms
+from utils.models_utils import get_cached_subtrees
 from utils.views_utils import (
     BulkChangeArchiveStatusViewSetMixin,
     BulkUpdateViewSetMixin,
@@ -12,6 +15,7 @@ from .filters import RecipeFilter
 from .models import Recipe, RecipeCategory
 from .serializers import (
     RecipeAdminSerializer,
+    RecipeCategoryListSerializer,
     RecipeCategorySerializer,
     RecipeListAdminSerializer,
     RecipeListSerializer,
@@ -107,9 +111,21 @@ class RecipeCategoryViewset(BulkChangeArchiveStatusViewSetMixin, viewsets.ModelV
             read=perms.allow_all,
             write=perms.allow_staff,
             change_archive_status=perms.allow_staff,
+            tree=perms.allow_all,
         ),
     )
     pagination_class = None
     serializer_class = RecipeCategorySerializer
     lookup_field = "id"
     queryset = RecipeCategory.objects.all()
+
+    @action(detail=False, methods=("get",))
+    def tree(self, request, **kwargs):
+        """Root categories with their subtrees."""
+        categories = get_cached_subtrees(self.queryset.filter(level=0))
+        serializer = RecipeCategoryListSerializer(
+            categories,
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return Response(serializer.data)
@@ -2,6 +2,7 @@ from pathlib import Path
 
 import pytest
 from django.apps import apps
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.management import call_command
 from django.db import connection
@@ -40,6 +41,12 @@ def django_db_setup(request, django_db_setup, django_db_blocker):
         call_command("flush", "--no-input")
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # database changes are rolled back after each test, cached responses aren't
+    cache.clear()
+
+
 @pytest.fixture
 def admin_client(client, django_user_model):
     admin = django_user_model.objects.get(email="admin@localhost")
@@ -0,0 +1,273 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.core.management import call_command
+from pytest_drf.util import url_for
+from rest_framework import status
+
+from internal_api import consumers
+
+
+@pytest.fixture(scope="module")
+def django_db_setup(request, django_db_setup):
+    # load a fixture from current directory
+    call_command(
+        "loaddata",
+        Path(request.fspath).parent / "fixtures" / "shops.json",
+        Path(request.fspath).parent / "fixtures" / "units.json",
+        Path(request.fspath).parent / "fixtures" / "warehouses.json",
+        Path(request.fspath).parent / "fixtures" / "suppliers.json",
+        Path(request.fspath).parent / "fixtures" / "batches.json",
+    )
+
+
+def test_changes():
+    previous = {"sales": {"1": {"id": 1, "x": 1}, "2": {"id": 2, "x": 2}}}
+    current = {"sales": {"1": {"id": 1, "x": 1}, "3": {"id": 3, "x": 3}}}
+    assert consumers.get_changes(previous, current) == {
+        "changed": {"sales": {"3": {"id": 3, "x": 3}}},
+        "removed": {"sales": ["2"]},
+    }
+    assert consumers.get_changes(current, current) is None
+
+
+class TestFeeds:
+    @pytest.fixture
+    def consumer(self):
+        class Consumer(consumers.FeedConsumer):
+            name = "test"
+            items = {"1": {"id": 1, "value": 1}}
+            computed = 0
+
+            def get_state(self, sale_documents, params):
+                Consumer.computed += 1
+                return {"items": dict(Consumer.items)}
+
+            def render(self, state):
+                return {"items": list(state["items"].values())}
+
+        return Consumer
+
+    def test_shared_feed(self, consumer):
+        subscription = json.dumps({"filters": {}, "query": "", "interval": 1})
+
+        async def run():
+            first = WebsocketCommunicator(consumer.as_asgi(), "/ws/test/")
+            second = WebsocketCommunicator(consumer.as_asgi(), "/ws/test/")
+            for communicator in (first, second):
+                await communicator.connect()
+                await communicator.send_to(text_data=subscription)
+
+            # both get the full state
+            for communicator in (first, second):
+                assert await communicator.receive_json_from(timeout=2) == {
+                    "items": [{"id": 1, "value": 1}]
+                }
+            assert len(consumers._feeds) == 1
+
+            # then only changes
+            consumer.items = {"2": {"id": 2, "value": 2}}
+            for communicator in (first, second):
+                assert await communicator.receive_json_from(timeout=3) == {
+                    "items": [{"id": 2, "value": 2}],
+                    "removed": {"items": ["1"]},
+                }
+            assert consumer.computed < 4
+
+            (feed,) = consumers._feeds.values()
+            await first.disconnect()
+            assert not feed.task.cancelled()
+            await second.disconnect()
+            await asyncio.sleep(0)
+            assert feed.task.cancelled()
+            assert consumers._feeds == {}
+
+        async_to_sync(run)()
+
+    def test_interval(self, consumer):
+        async def run():
+            communicator = WebsocketCommunicator(consumer.as_asgi(), "/ws/test/")
+            await communicator.connect()
+            await communicator.send_json_to({"filters": {}, "interval": "often"})
+            assert await communicator.receive_json_from(timeout=2) == {
+                "errors": {"interval": ["Требуется целое число."]}
+            }
+            # the minimal interval by default
+            await communicator.send_json_to({"filters": {}})
+            assert await communicator.receive_json_from(timeout=2) == {
+                "items": [{"id": 1, "value": 1}]
+            }
+            (feed,) = consumers._feeds.values()
+            assert feed.interval == consumers.MIN_INTERVAL
+            await communicator.disconnect()
+
+        async_to_sync(run)()
+
+    def test_abstract(self):
+        with pytest.raises(TypeError):
+            consumers.FeedConsumer()
+
+
+@pytest.fixture
+def sale(db, django_user_model):
+    from internal_api.models import SaleDocument, WarehouseRecord
+
+    document = SaleDocument.objects.create(
+        author=django_user_model.objects.get(email="user@localhost"),
+    )
+    for warehouse_id, quantity, cost in (
+        (1, -3, 2),
+        (1, -2, 2),
+        (2, -1, 3),
+        (3, -4, 1),
+    ):
+        WarehouseRecord.objects.create(
+            document=document,
+            warehouse_id=warehouse_id,
+            quantity=quantity,
+            cost=cost,
+        )
+    return document
+
+
+class TestSalesFacts:
+    @pytest.fixture
+    def facts(self):
+        from internal_api.models import SalesFact
+
+        return lambda: set(
+            SalesFact.objects.values_list(
+                "date", "hour", "shop", "product_unit", "quantity", "amount", "lines"
+            )
+        )
+
+    def test_sale(self, sale, facts):
+        from internal_api.models import SalesFact
+
+        assert SalesFact.objects.filter(cashier=sale.author).count() == 3
+        saved = facts()
+        call_command("rebuild_sales_facts")
+        assert facts() == saved
+
+    def test_cancel(self, sale, staff_client):
+        from internal_api.models import SalesFact
+
+        result = staff_client.post(
+            url_for("internal_api:canceldocument-list"),
+            {"cancels": sale.pk},
+            content_type="application/json",
+        )
+        assert result.status_code == status.HTTP_201_CREATED
+        assert set(SalesFact.objects.values_list("quantity", "amount", "lines")) == {
+            (0, 0, 0)
+        }
+
+    def test_delete(self, sale):
+        from internal_api.models import SalesFact
+
+        sale.delete()
+        assert not SalesFact.objects.exclude(lines=0).exists()
+
+    def test_graph(self, sale, staff_client):
+        result = staff_client.get(url_for("internal_api:graphanalytics-list"))
+        assert result.status_code == status.HTTP_200_OK
+        (day,) = result.json()["sales"]
+        assert day["current"] == -17
+        assert day["previous"] == 0
+
+    def test_checks(self, sale, staff_client):
+        result = staff_client.get(
+            url_for("internal_api:graphcheckanalytics-list"), {"shop": 1}
+        )
+        assert result.status_code == status.HTTP_200_OK
+        data = result.json()
+        assert len(data["checks"]) == 1
+        assert data["proceeds"] == data["number_of_goods"] * 17 / 10 == -17
+        assert data["average_check"] == -17 / 4
+
+
+class TestPopularity:
+    @pytest.fixture
+    def facts(self, sale):
+        from internal_api.models import SalesFact
+
+        return SalesFact.objects.all()
+
+    def test_products(self, facts, django_assert_num_queries):
+        from internal_api.analytics import get_popularity
+
+        with django_assert_num_queries(1):
+            rows = [
+                (x["item_id"], x["quantity"], x["cost"], x["popularity"])
+                for x in get_popularity(facts)
+            ]
+        assert rows == [(1, -5, -10, 2), (3, -4, -4, 1), (2, -1, -3, 3)]
+
+    def test_top_category(self, facts):
+        from internal_api.analytics import get_popularity
+
+        rows = get_popularity(facts, by="category", top=1)
+        assert [(x["item_id"], x["quantity"], x["cost"]) for x in rows] == [
+            (2, -9, -14)
+        ]
+
+    def test_serializer(self, facts):
+        from internal_api.serializers.analytics import PopularitySerializer
+
+        data = PopularitySerializer(facts, context={"top": 1}).data
+        assert data["analytics"] == [
+            {
+                "id": 1,
+                "name": "Тестовый штучный товар",
+                "quantity": "-5.00",
+                "cost": "-10.00",
+                "popularity": 2,
+            }
+        ]
+
+
+class TestCashiers:
+    def test_totals(self, sale, django_assert_num_queries):
+        from internal_api.analytics import get_cashiers
+        from internal_api.models import SaleDocument
+
+        with django_assert_num_queries(1):
+            (row,) = get_cashiers(SaleDocument.objects.all())
+        assert row["cashier_id"] == sale.author_id
+        assert (row["checks"], row["quantity"], row["proceeds"]) == (1, -10, -17)
+        assert row["shop_id"] == 1
+
+    def test_list(self, sale, staff_client):
+        result = staff_client.get(
+            url_for("internal_api:cashieranalytics-list"), {"shop": 1}
+        )
+        assert result.status_code == status.HTTP_200_OK
+        (row,) = result.json()
+        assert row["cashier"] == sale.author_id
+        assert row["checks"] == 1
+        assert row["proceeds"] == "-17.00"
+
+    def test_aggregate_mode(self, sale, django_assert_num_queries):
+        from internal_api.models import SaleDocument
+
+        consumer = consumers.AnalyticsCashiersConsumer()
+        with django_assert_num_queries(1):
+            state = consumer.get_state(
+                SaleDocument.objects.all(), {"mode": "aggregate"}
+            )
+        assert list(state["cashiers"]) == [f"{sale.author_id}-1"]
+
+    def test_documents_mode(self, sale, django_assert_max_num_queries):
+        from internal_api.models import SaleDocument
+
+        consumer = consumers.AnalyticsCashiersConsumer()
+        # documents, records, shops, and orders and addresses of cashiers
+        with django_assert_max_num_queries(5):
+            state = consumer.get_state(SaleDocument.objects.all(), {})
+        (document,) = state["cashiers"].values()
+        assert document["quantity"] == "-10.0000"
+        assert document["shop_address"]
@@ -76,3 +76,48 @@ class TestBatchesViewset(ViewSetTest):
                 data={"batch": batch_id},
             )
             assert result.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestBatchProductUnits:
+    def test_claim(self, db):
+        from internal_api.models import Batch, WarehouseRecord
+        from internal_api.models.shops import validate_batches
+
+        records = [
+            WarehouseRecord(warehouse_id=1, batch_id=1, quantity=1),
+            WarehouseRecord(warehouse_id=1, batch_id=1, quantity=2),
+            WarehouseRecord(warehouse_id=2, batch_id=2, quantity=1),
+        ]
+        validate_batches(records)
+        assert dict(Batch.objects.values_list("pk", "product_unit_id")) == {
+            1: 1,
+            2: 2,
+        }
+
+    def test_mismatch(self, db, django_assert_num_queries):
+        from rest_framework.exceptions import ValidationError
+
+        from internal_api.models import WarehouseRecord
+        from internal_api.models.shops import validate_batches
+
+        validate_batches([WarehouseRecord(warehouse_id=1, batch_id=1, quantity=1)])
+        records = [
+            WarehouseRecord(warehouse_id=1, batch_id=1, quantity=1),
+            WarehouseRecord(warehouse_id=3, batch_id=1, quantity=1),
+        ]
+        with django_assert_num_queries(2), pytest.raises(ValidationError):
+            validate_batches(records)
+
+    def test_new_batch_mismatch(self, db):
+        from rest_framework.exceptions import ValidationError
+
+        from internal_api.models import Batch, WarehouseRecord
+        from internal_api.models.shops import validate_batches
+
+        records = [
+            WarehouseRecord(warehouse_id=1, batch_id=2, quantity=1),
+            WarehouseRecord(warehouse_id=2, batch_id=2, quantity=1),
+        ]
+        with pytest.raises(ValidationError):
+            validate_batches(records)
+        assert Batch.objects.get(pk=2).product_unit_id is None
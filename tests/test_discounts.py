@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
 import pytest
@@ -299,3 +299,516 @@ class TestApplyDiscountToBasket(APIViewTest, UsesPostMethod, Returns200):
             ],
         }
     )
+
+
+class TestApplyDiscountToBaskets(APIViewTest, UsesPostMethod, Returns200):
+
+    url = lambda_fixture(
+        lambda shop_id: url_for("basket:offers-batch", shop_id=shop_id)
+    )
+
+    shop_id = static_fixture(1)
+
+    baskets = static_fixture(
+        [
+            {
+                "lines": [
+                    {"product_unit": 1, "quantity": 2},
+                    {"product_unit": 2, "quantity": 4},
+                ],
+                "card": "69e0a2a6-cacc-4b39-a7b3-02a2759160ac",
+            },
+            {
+                "lines": [
+                    {"product_unit": 3, "quantity": 5},
+                ],
+                "vouchers": ["4cd6fbd4-2597-4751-b555-d653b4640410"],
+            },
+            {"lines": []},
+        ]
+    )
+
+    data = lambda_fixture(lambda baskets: {"baskets": baskets})
+
+    def test_order(self, json):
+        assert [
+            [line["product_unit"].rstrip("/").rsplit("/", 1)[-1] for line in x["lines"]]
+            for x in json["baskets"]
+        ] == [["1", "2"], ["3"], []]
+
+    def test_same_as_single(self, json, client, shop_id, baskets):
+        for basket, result in zip(baskets, json["baskets"]):
+            single = client.post(
+                url_for("basket:offers", shop_id=shop_id), basket, format="json"
+            )
+            assert single.json() == result
+
+    class TestUnknownProductUnit(UsesPostMethod, Returns400):
+        data = static_fixture(
+            {
+                "baskets": [
+                    {"lines": [{"product_unit": 1, "quantity": 1}]},
+                    {"lines": [{"product_unit": 999, "quantity": 1}]},
+                ]
+            }
+        )
+
+        def test_error(self, json):
+            assert json["baskets"][0] == {}
+            assert "product_unit" in json["baskets"][1]["lines"][0]
+
+
+class TestOfferIndex:
+    @pytest.fixture
+    def index(self, db):
+        from discounts.offer_index import get_offer_index, invalidate
+
+        yield get_offer_index()
+        # changes are rolled back, but the index is not
+        invalidate()
+
+    def test_includes_all(self, index):
+        # all benefits use the "all products" range
+        assert {1, 2, 3, 4, 5} <= index.offers_for(1, "benefit")
+
+    def test_exclude_products(self, index):
+        from discounts.models import Range
+        from discounts.offer_index import get_offer_index
+
+        # range 3 excludes product 2 with its units 2 and 5
+        assert 3 not in index.ranges_for(1)
+        product_range = Range.objects.get(pk=3)
+        product_range.includes_all = True
+        product_range.save()
+
+        index = get_offer_index()
+        assert 3 in index.ranges_for(1)
+        assert 3 not in index.ranges_for(2)
+        assert 3 not in index.ranges_for(5)
+
+    def test_limit_offers(self, index):
+        assert index.offers_for(1, "benefit", offer_pks=[2, 99]) == {2}
+
+    def test_invalidate_on_range_change(self, index):
+        from discounts.models import Range
+        from discounts.offer_index import get_offer_index
+
+        Range.objects.get(pk=4).include_product_units.add(3)
+        assert 4 in get_offer_index().ranges_for(3)
+
+    def test_invalidate_on_offer_change(self, index):
+        from discounts.models import Condition, Offer
+        from discounts.offer_index import get_offer_index
+
+        offer = Offer.objects.get(pk=1)
+        offer.condition = Condition.objects.create(range_id=4, value=1)
+        offer.save()
+        assert get_offer_index().offer_ranges[1]["condition"] == 4
+
+
+class TestRangeMembership:
+    @staticmethod
+    def members(range_pk):
+        from discounts.models import RangeMembership
+
+        return set(
+            RangeMembership.objects.filter(range_id=range_pk).values_list(
+                "product_unit_id", flat=True
+            )
+        )
+
+    def test_matches_index(self, db):
+        from discounts.models import RangeMembership
+        from discounts.offer_index import OfferIndex
+        from products.models import ProductUnit
+
+        unit_pks = set(ProductUnit.objects.values_list("pk", flat=True))
+        expected = {
+            (range_pk, unit_pk)
+            for range_pk, compiled in OfferIndex.build().ranges.items()
+            for unit_pk in unit_pks
+            if compiled.covers(unit_pk)
+        }
+        assert expected
+        assert (
+            set(RangeMembership.objects.values_list("range_id", "product_unit_id"))
+            == expected
+        )
+
+    def test_range_change(self, db):
+        from discounts.models import Range
+        from products.models import ProductUnit
+
+        Range.objects.get(pk=4).include_product_units.add(3)
+        assert self.members(4) == {1, 3}
+        ProductUnit.objects.get(pk=3).exclude_ranges.add(1)
+        assert 3 not in self.members(1)
+
+        Range.objects.filter(pk=4).update(includes_all=True)
+        Range.objects.get(pk=4).save()
+        assert len(self.members(4)) == ProductUnit.objects.count()
+
+    def test_catalog_change(self, db):
+        from products.models import Category, Product, ProductUnit
+
+        # range 2 includes categories 5 and 7
+        assert self.members(2) == set()
+        product = Product.objects.get(pk=2)
+        product.category_id = 7
+        product.save()
+        assert self.members(2) == {2, 5}
+
+        unit = ProductUnit.objects.create(product_id=3, unit_id=1)
+        assert unit.pk in self.members(1)
+
+        # with its subcategory 7
+        Category.objects.get(pk=5).delete()
+        assert self.members(2) == set()
+
+    def test_bulk_change_category(self, db, staff_client):
+        result = staff_client.post(
+            url_for("internal_api:product-change-category"),
+            {"product_ids": [2], "new_category": 7},
+            content_type="application/json",
+        )
+        assert result.status_code == status.HTTP_200_OK
+        # range 2 includes categories 5 and 7
+        assert self.members(2) == {2, 5}
+
+    def test_warehouse_offers(self, db):
+        from internal_api.models import Warehouse
+        from products.models import Product
+
+        product = Product.objects.get(pk=1)
+        product.category_id = 7
+        product.save()
+        Warehouse.objects.create(product_unit_id=1, shop_id=1, price=10)
+        Warehouse.objects.create(product_unit_id=2, shop_id=1, price=10)
+        offers = dict(Warehouse.objects.values_list("product_unit_id", "offers"))
+        # the only site offer is conditioned on categories 5 and 7
+        assert [offer["id"] for offer in offers[1]] == [1]
+        assert offers[2] == []
+
+
+class TestCounters:
+    def test_site_limit(self, db):
+        from discounts.counters import count_offer
+        from discounts.models import Offer, OfferTransition
+
+        Offer.objects.filter(pk=1).update(site_limit=2)
+        offer = Offer.objects.get(pk=1)
+        assert count_offer(offer)
+        assert offer.is_active
+        assert count_offer(offer)
+        assert not offer.is_active
+        assert not count_offer(offer)
+
+        # the limit holds even if the offer is enabled again
+        Offer.objects.filter(pk=1).update(is_active=True)
+        assert not count_offer(offer)
+        assert offer.application_count == 2
+        # counting does not reschedule the offer
+        assert not OfferTransition.objects.filter(offer=offer).exists()
+
+        # nor does saving a used up offer enable it
+        offer.save()
+        assert not Offer.objects.get(pk=1).is_active
+        assert not OfferTransition.objects.filter(offer=offer).exists()
+
+    def test_buyer_limit(self, db):
+        from django.contrib.auth import get_user_model
+
+        from discounts.counters import count_buyer
+        from discounts.models import Offer
+
+        offer = Offer.objects.get(pk=5)
+        buyer = get_user_model().objects.get(phone_number="79010060000")
+        assert count_buyer(offer, buyer)
+        assert not count_buyer(offer, buyer)
+        assert offer.buyer_counts.get(buyer=buyer).application_count == 1
+
+    def test_card(self, db):
+        from discounts.counters import count_card
+        from discounts.models import LoyaltyCard
+
+        card = LoyaltyCard.objects.get(pk="69e0a2a6-cacc-4b39-a7b3-02a2759160ac")
+        assert count_card(card)
+        assert card.application_count == 1
+
+        LoyaltyCard.objects.filter(pk=card.pk).update(is_active=False)
+        assert not count_card(card)
+        assert card.application_count == 1
+
+
+class TestScheduler:
+    @staticmethod
+    def at(*args):
+        return datetime(2030, 1, *args, tzinfo=get_current_timezone())
+
+    def test_transitions(self):
+        from discounts.models import Offer
+        from discounts.scheduler import is_active_at, iter_transitions
+
+        offer = Offer(
+            schedule="0 9 * * *",
+            duration=timedelta(hours=2),
+            started_at=self.at(1),
+            ended_at=self.at(3),
+        )
+        assert is_active_at(offer, self.at(1, 10))
+        assert list(iter_transitions(offer, self.at(1, 10))) == [
+            (self.at(1, 11), False),
+            (self.at(2, 9), True),
+            (self.at(2, 11), False),
+        ]
+
+    def test_overlapping_periods(self):
+        from discounts.models import Offer
+        from discounts.scheduler import iter_transitions
+
+        offer = Offer(
+            schedule="0 * * * *",
+            duration=timedelta(minutes=90),
+            started_at=self.at(1),
+            ended_at=self.at(1, 5),
+        )
+        assert list(iter_transitions(offer, self.at(1) - timedelta(days=1))) == [
+            (self.at(1), True),
+            (self.at(1, 5), False),
+        ]
+
+    def test_process(self, db):
+        from discounts.models import Offer, OfferTransition
+        from discounts.scheduler import process
+
+        offer = Offer.objects.get(pk=1)
+        offer.schedule = "0 9 * * *"
+        offer.duration = timedelta(hours=2)
+        offer.started_at = self.at(1)
+        offer.ended_at = self.at(3)
+        offer.save()
+        offer.refresh_from_db()
+        assert not offer.is_active
+        assert (offer.transition.at, offer.transition.is_active) == (
+            self.at(1, 9),
+            True,
+        )
+
+        process(self.at(1, 9))
+        offer.refresh_from_db()
+        assert offer.is_active
+        assert offer.transition.at == self.at(1, 11)
+
+        # missed changes are caught up with, the last period is over
+        process(self.at(2, 12))
+        offer.refresh_from_db()
+        assert not offer.is_active
+        assert not OfferTransition.objects.filter(offer=offer).exists()
+
+    def test_dry_run(self, db):
+        from io import StringIO
+
+        from discounts.models import OfferTransition
+
+        out = StringIO()
+        call_command("reschedule_offers", dry_run=True, count=2, stdout=out)
+        assert len(out.getvalue().splitlines()) == 2
+        assert not OfferTransition.objects.exists()
+
+        call_command("reschedule_offers", stdout=StringIO())
+        assert OfferTransition.objects.exists()
+
+
+class TestVoucherBatches:
+    @pytest.fixture
+    def batch(self, db, staff_client, monkeypatch):
+        from lime.celery import app
+
+        # run the generation task in place
+        monkeypatch.setattr(app.conf, "CELERY_TASK_ALWAYS_EAGER", True)
+        result = staff_client.post(
+            url_for("discounts:voucher-generate"),
+            {"offer": 2, "count": 3},
+            content_type="application/json",
+        )
+        assert result.status_code == status.HTTP_202_ACCEPTED
+        return result.json()["batch"]
+
+    def test_generate(self, batch, staff_client):
+        from discounts.models import Voucher
+
+        assert Voucher.objects.filter(batch=batch, offer_id=2).count() == 3
+
+        result = staff_client.get(url_for("discounts:voucher-export"), {"batch": batch})
+        assert result.status_code == status.HTTP_200_OK
+        rows = b"".join(result.streaming_content).decode().splitlines()
+        assert rows[0] == "id,offer_id,batch,is_active,created_at"
+        assert len(rows) == 4
+
+    def test_redeem(self, batch, staff_client):
+        from discounts.models import Offer, Voucher
+
+        ids = [
+            str(pk)
+            for pk in Voucher.objects.filter(batch=batch).values_list("pk", flat=True)
+        ]
+        url = url_for("discounts:voucher-redeem")
+        result = staff_client.post(
+            url, {"vouchers": ids}, content_type="application/json"
+        )
+        assert result.status_code == status.HTTP_200_OK
+        assert result.json() == {"redeemed": 3}
+        assert not Voucher.objects.filter(batch=batch, is_active=True).exists()
+        assert Offer.objects.get(pk=2).application_count == 3
+
+        # a voucher can not be applied twice
+        result = staff_client.post(
+            url, {"vouchers": ids[:1]}, content_type="application/json"
+        )
+        assert result.status_code == status.HTTP_400_BAD_REQUEST
+        assert ids[0] in result.json()["vouchers"][0]
+
+    def test_redeem_invalid(self, batch, staff_client):
+        from discounts.models import Voucher
+
+        ids = [
+            str(pk)
+            for pk in Voucher.objects.filter(batch=batch).values_list("pk", flat=True)
+        ]
+        # the offer of this voucher is inactive
+        invalid = "6bb5544d-9248-47ad-a4a0-7f34bdbdd4fc"
+        result = staff_client.post(
+            url_for("discounts:voucher-redeem"),
+            {"vouchers": ids + [invalid]},
+            content_type="application/json",
+        )
+        assert result.status_code == status.HTTP_400_BAD_REQUEST
+        assert result.json()["vouchers"] == [f"Vouchers can not be applied: {invalid}."]
+        # none is applied
+        assert Voucher.objects.filter(batch=batch, is_active=True).count() == 3
+
+
+class TestSimulation:
+    def test_matches_pricing(self):
+        import random
+        from decimal import Decimal
+
+        import pandas as pd
+
+        from basket.pricing import Line, OfferRule, price_basket
+        from discounts.offer_index import CompiledRange
+        from discounts.simulation import simulate_lines
+
+        some = CompiledRange(False, frozenset({1, 2, 3}), frozenset())
+        most = CompiledRange(True, frozenset(), frozenset({4}))
+        offers = {
+            pk: OfferRule(pk, *rule)
+            for pk, rule in enumerate(
+                (
+                    ("value", Decimal("30.00"), "percentage", Decimal("10.00"), 2),
+                    ("count", Decimal("3.000"), "absolute", Decimal("5.00"), 0),
+                    ("coverage", Decimal(2), "fixed-price", Decimal("40.00"), 1),
+                    ("count", Decimal("0.300"), "multibuy", Decimal(0), 0),
+                ),
+                start=1,
+            )
+        }
+        ranges = {1: (some, most), 2: (most, some), 3: (most, most), 4: (some, some)}
+
+        rng = random.Random(0)
+        rows, expected = [], []
+        for basket in range(200):
+            lines = [
+                Line(
+                    unit_id=rng.randint(1, 5),
+                    quantity=Decimal(rng.randint(1, 30)) / 10,
+                    price=rng.choice((None, Decimal(rng.randint(1, 5000)) / 100)),
+                )
+                for _ in range(rng.randint(1, 6))
+            ]
+            lines = [
+                line._replace(
+                    condition_offers=frozenset(
+                        pk for pk, (x, _) in ranges.items() if x.covers(line.unit_id)
+                    ),
+                    benefit_offers=frozenset(
+                        pk for pk, (_, x) in ranges.items() if x.covers(line.unit_id)
+                    ),
+                )
+                for line in lines
+            ]
+            rows.extend(
+                (basket, x.unit_id, float(x.quantity), x.price, None) for x in lines
+            )
+            expected.extend(x.discounted_price for x in price_basket(lines, offers))
+
+        lines = pd.DataFrame.from_records(
+            rows, columns=("basket", "unit_id", "quantity", "price", "unit_cost")
+        )
+        lines["price"] = pd.to_numeric(lines["price"])
+        prices, results = simulate_lines(lines, offers, ranges)
+        for price, expected_price in zip(prices, expected):
+            if expected_price is None:
+                assert pd.isna(price)
+            else:
+                assert price == pytest.approx(float(expected_price), abs=0.011)
+        assert set(results) == {1, 2, 3, 4}
+
+    def test_simulate(self, db, django_user_model):
+        from decimal import Decimal
+
+        from discounts.models import Benefit, Condition, Offer, Range
+        from internal_api.models import (
+            CancelDocument,
+            SaleDocument,
+            Warehouse,
+            WarehouseBalance,
+            WarehouseRecord,
+        )
+
+        author = django_user_model.objects.get(email="user@localhost")
+        warehouses = [
+            Warehouse.objects.create(product_unit_id=pk, shop_id=1, price=10)
+            for pk in (1, 2)
+        ]
+        for document, lines in enumerate(((1, 2), (2,), (1, 2))):
+            document = SaleDocument.objects.create(author=author)
+            for position in lines:
+                WarehouseRecord.objects.create(
+                    document=document,
+                    warehouse=warehouses[position - 1],
+                    quantity=-position,
+                    cost=10,
+                )
+        CancelDocument.objects.create(author=author, cancels=document)
+        WarehouseBalance.objects.filter(warehouse__in=warehouses).update(
+            cost=Decimal(6)
+        )
+
+        everything = Range.objects.create(name="Всё", includes_all=True)
+        offer = Offer.objects.create(
+            name="Три по цене двух",
+            is_active=False,
+            condition=Condition.objects.create(range=everything, type="count", value=3),
+            benefit=Benefit.objects.create(
+                range=everything, type="percentage", value=10
+            ),
+            started_at=datetime(2030, 1, 1, tzinfo=get_current_timezone()),
+            ended_at=datetime(2030, 2, 1, tzinfo=get_current_timezone()),
+        )
+
+        from discounts.simulation import simulate
+
+        today = date.today()
+        report = simulate([offer.pk], today, today)
+        assert report == {
+            "baskets": 2,
+            "affected_baskets": 1,
+            "revenue": 50.0,
+            "discount": 3.0,
+            "margin": 20.0,
+            "simulated_margin": 17.0,
+            "offers": {offer.pk: {"baskets": 1, "discount": 3.0}},
+        }
+
+        call_command("simulate_offers", offer.pk, "--to", today.isoformat())
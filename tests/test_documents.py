@@ -471,3 +471,190 @@ class TestSaleDocumentViewset(ViewSetTest):
         def test_author(self, json):
             #  directly provided user ID
             assert json["author"] == 3
+
+
+class TestWarehouseBalances:
+    @pytest.fixture
+    def remaining(self):
+        from internal_api.models import Warehouse
+
+        return lambda: Warehouse.objects.get(pk=1).remaining
+
+    def test_fixture(self, db):
+        call_command("check_balances")
+
+    def test_write_off_and_cancel(self, db, staff_client, remaining):
+        from internal_api.balances import find_discrepancies
+
+        assert remaining() == 100
+        result = staff_client.post(
+            url_for("internal_api:writeoffdocument-list"),
+            {"warehouse_records": [{"warehouse": 1, "quantity": 13, "batch": 1}]},
+            content_type="application/json",
+        )
+        assert result.status_code == status.HTTP_201_CREATED
+        assert remaining() == 87
+
+        # cancel records are bulk created
+        result = staff_client.post(
+            url_for("internal_api:canceldocument-list"),
+            {"cancels": result.json()["id"]},
+            content_type="application/json",
+        )
+        assert result.status_code == status.HTTP_201_CREATED
+        assert remaining() == 100
+        assert find_discrepancies() == []
+
+    def test_delete_document(self, db, staff_client, remaining):
+        result = staff_client.post(
+            url_for("internal_api:writeoffdocument-list"),
+            {"warehouse_records": [{"warehouse": 1, "quantity": 13, "batch": 1}]},
+            content_type="application/json",
+        )
+        staff_client.delete(
+            url_for("internal_api:writeoffdocument-detail", result.json()["id"])
+        )
+        assert remaining() == 100
+
+
+class TestAutoOrder:
+    @pytest.fixture
+    def low_stock(self, db):
+        from internal_api.models import Warehouse
+
+        # 100 in stock
+        Warehouse.objects.filter(pk=1).update(
+            auto_order=True,
+            min_remaining=200,
+            max_remaining=300,
+        )
+
+    def test_create_order(self, low_stock):
+        from internal_api.models import WarehouseOrderPositions
+
+        call_command("auto_order")
+        positions = WarehouseOrderPositions.objects.filter(
+            warehouse_order__status="approving",
+        )
+        assert list(positions.values_list("product_unit_id", "quantity")) == [(1, 200)]
+        assert positions.get().warehouse_order.number.startswith("AO")
+
+    def test_no_duplicates(self, low_stock):
+        from internal_api.models import WarehouseOrderPositions
+
+        call_command("auto_order")
+        call_command("auto_order", "--force")
+        assert WarehouseOrderPositions.objects.count() == 1
+
+
+class TestNumbering:
+    def test_continues_latest_number(self, db):
+        from internal_api.models import NumberCounter, WriteOffDocument
+
+        WriteOffDocument.objects.create(number="WR00000041")
+        document = WriteOffDocument.objects.create()
+        assert document.number == "WR00000042"
+        assert (
+            NumberCounter.objects.get(name="internal_api_primarydocument:WR").value
+            == 42
+        )
+
+    def test_manual_number(self, db):
+        from internal_api.models import WriteOffDocument
+
+        WriteOffDocument.objects.create()
+        WriteOffDocument.objects.create(number="WR00000010")
+        WriteOffDocument.objects.create(number="WR-manual")
+        assert WriteOffDocument.objects.create().number == "WR00000011"
+
+    def test_failed_save_leaves_no_gap(self, db):
+        from django.db import IntegrityError
+
+        from internal_api.models import SaleDocument
+
+        client_id = "7a0a3f3e-0e0c-4fd8-9f5b-2ad6b1b0c001"
+        SaleDocument.objects.create(client_id=client_id)
+        with pytest.raises(IntegrityError):
+            SaleDocument.objects.create(client_id=client_id)
+        assert SaleDocument.objects.create().number == "SL00000002"
+
+    def test_reserve_block(self, db, django_assert_num_queries):
+        from internal_api.models import WriteOffDocument
+
+        WriteOffDocument.objects.create()
+        documents = [WriteOffDocument() for _ in range(3)]
+        # savepoint, counter lock and update, savepoint release
+        with django_assert_num_queries(4):
+            WriteOffDocument.assign_numbers(documents)
+        assert [x.number for x in documents] == [
+            "WR00000002",
+            "WR00000003",
+            "WR00000004",
+        ]
+
+    def test_prefixes_apart(self, db):
+        from internal_api.models import SaleDocument, WriteOffDocument
+
+        WriteOffDocument.objects.create()
+        assert SaleDocument.objects.create().number == "SL00000001"
+
+
+class TestBulkSales:
+    @pytest.fixture
+    def sales(self):
+        return [
+            {
+                "client_id": "7a0a3f3e-0e0c-4fd8-9f5b-2ad6b1b0c001",
+                "warehouse_records": [
+                    {"warehouse": 1, "quantity": 3, "cost": "100.15", "batch": 1},
+                    {"warehouse": 2, "quantity": 1, "cost": "50.05"},
+                ],
+            },
+            {
+                "client_id": "7a0a3f3e-0e0c-4fd8-9f5b-2ad6b1b0c002",
+                "warehouse_records": [{"warehouse": 1, "quantity": 2}],
+            },
+            {
+                "client_id": "7a0a3f3e-0e0c-4fd8-9f5b-2ad6b1b0c003",
+                "warehouse_records": [{"warehouse": 999, "quantity": 2}],
+            },
+        ]
+
+    def test_bulk(self, db, authenticated_client, sales):
+        from django.db.models import Sum
+
+        from internal_api.models import SaleDocument, SalesFact, Warehouse
+
+        url = url_for("internal_api:saledocument-bulk")
+        result = authenticated_client.post(
+            url, {"sales": sales}, content_type="application/json"
+        )
+        assert result.status_code == status.HTTP_200_OK
+        results = result.json()["results"]
+        assert [x["status"] for x in results] == ["created", "created", "invalid"]
+        assert "warehouse" in results[2]["errors"]["warehouse_records"][0]
+        documents = SaleDocument.objects.filter(client_id__isnull=False)
+        assert documents.count() == 2
+        assert {x.author.email for x in documents} == {"user@localhost"}
+        assert {x.amount_time for x in documents} == {0}
+        assert Warehouse.objects.get(pk=1).remaining == 95
+        assert SalesFact.objects.aggregate(x=Sum("lines"))["x"] == 3
+
+        # uploading again changes nothing
+        result = authenticated_client.post(
+            url, {"sales": sales[:2]}, content_type="application/json"
+        )
+        assert [x["status"] for x in result.json()["results"]] == ["exists"] * 2
+        assert [x["id"] for x in result.json()["results"]] == [
+            x["id"] for x in results[:2]
+        ]
+        assert Warehouse.objects.get(pk=1).remaining == 95
+
+        # batch 1 holds another product unit now
+        sales[2]["warehouse_records"] = [{"warehouse": 2, "quantity": 1, "batch": 1}]
+        result = authenticated_client.post(
+            url, {"sales": sales[2:]}, content_type="application/json"
+        )
+        (result,) = result.json()["results"]
+        assert result["status"] == "invalid"
+        assert "batch" in result["errors"]["warehouse_records"][0]
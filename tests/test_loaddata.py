@@ -0,0 +1,45 @@
+import json
+
+from django.core.management import call_command
+
+from internal_api.models import Supplier
+
+
+def write_fixture(path, names):
+    path.write_text(
+        json.dumps(
+            [
+                {
+                    "model": "internal_api.supplier",
+                    "pk": 1000 + i,
+                    "fields": {"name": name, "payment_deferral": 0},
+                }
+                for i, name in enumerate(names)
+            ]
+        )
+    )
+
+
+def test_bulk_load(db, tmp_path, django_assert_max_num_queries):
+    fixture = tmp_path / "suppliers.json"
+    write_fixture(fixture, [f"поставщик {i}" for i in range(100)])
+
+    # a lookup of existing objects and an insert per chunk
+    with django_assert_max_num_queries(20):
+        call_command("loaddata", fixture, chunk_size=50)
+    assert Supplier.objects.filter(pk__gte=1000).count() == 100
+
+
+def test_reload(db, tmp_path):
+    fixture = tmp_path / "suppliers.json"
+    write_fixture(fixture, ["Первый", "Второй"])
+    call_command("loaddata", fixture)
+
+    # existing objects are updated
+    write_fixture(fixture, ["Первый", "Другой", "Третий"])
+    call_command("loaddata", fixture, chunk_size=2)
+    assert list(
+        Supplier.objects.filter(pk__gte=1000)
+        .order_by("pk")
+        .values_list("name", flat=True)
+    ) == ["Первый", "Другой", "Третий"]
@@ -0,0 +1,94 @@
+from decimal import Decimal
+
+import pytest
+
+from basket.pricing import Line, OfferRule, PricingError, price_basket
+
+
+def rule(pk=1, condition=("count", "1"), benefit=("percentage", "10"), limit=0):
+    return OfferRule(
+        pk=pk,
+        condition_type=condition[0],
+        condition_value=Decimal(condition[1]),
+        benefit_type=benefit[0],
+        benefit_value=Decimal(benefit[1]),
+        order_limit=limit,
+    )
+
+
+def line(unit_id, quantity, price, offers=frozenset({1})):
+    return Line(
+        unit_id=unit_id,
+        quantity=Decimal(quantity),
+        price=None if price is None else Decimal(price),
+        condition_offers=offers,
+        benefit_offers=offers,
+    )
+
+
+def test_percentage_applied_times():
+    result = price_basket(
+        [line(1, "2", "100.00")],
+        {1: rule(condition=("count", "1"), limit=2)},
+    )
+    # 100 * 0.9 * 0.9
+    assert result[0].discounted_price == Decimal("81.00")
+    assert result[0].offers == ((1, 2),)
+
+
+def test_condition_not_met():
+    result = price_basket(
+        [line(1, "2", "100.00")],
+        {1: rule(condition=("value", "500"))},
+    )
+    assert result[0].discounted_price == Decimal("100.00")
+    assert result[0].offers == ()
+
+
+def test_absolute_shared_by_line_totals():
+    result = price_basket(
+        [line(1, "1", "30.00"), line(2, "2", "35.00")],
+        {1: rule(benefit=("absolute", "20"), limit=1)},
+    )
+    # basket total 100.00 becomes 80.00
+    assert [x.discounted_price for x in result] == [
+        Decimal("24.00"),
+        Decimal("28.00"),
+    ]
+
+
+def test_multibuy():
+    result = price_basket(
+        [line(1, "1", "30.00"), line(2, "1", "20.00"), line(3, "1", "25.00")],
+        {1: rule(condition=("coverage", "3"), benefit=("multibuy", "0"))},
+    )
+    assert [x.discounted_price for x in result] == [
+        Decimal("30.00"),
+        Decimal("0.00"),
+        Decimal("25.00"),
+    ]
+
+
+def test_fixed_price():
+    result = price_basket(
+        [line(1, "1", "60.00"), line(2, "1", "40.00")],
+        {1: rule(condition=("count", "2"), benefit=("fixed-price", "50"))},
+    )
+    assert [x.discounted_price for x in result] == [
+        Decimal("30.00"),
+        Decimal("20.00"),
+    ]
+
+
+def test_out_of_stock_line():
+    result = price_basket(
+        [line(1, "1", None), line(2, "1", "10.00")],
+        {1: rule(limit=1)},
+    )
+    assert result[0].discounted_price is None
+    assert result[1].discounted_price == Decimal("9.00")
+
+
+def test_unknown_type():
+    with pytest.raises(PricingError):
+        price_basket([line(1, "1", "1.00")], {1: rule(condition=("bogus", "1"))})
@@ -13,7 +13,7 @@ from pytest_drf import (
 )
 from pytest_drf.util import url_for
 from pytest_lambda import lambda_fixture, static_fixture
-from rest_framework.status import HTTP_200_OK
+from rest_framework.status import HTTP_200_OK, HTTP_304_NOT_MODIFIED
 
 CATEGORY_ID = 2
 
@@ -135,3 +135,250 @@ class TestProductCategoryViewSet(ViewSetTest):
 
     class TestDetail(UsesGetMethod, UsesDetailEndpoint, Returns200):
         id = static_fixture(4)
+
+
+class TestImport:
+    @pytest.fixture
+    def write_workbook(self, tmp_path):
+        from openpyxl import Workbook
+
+        def write_workbook(rows):
+            wb = Workbook()
+            ws = wb.active
+            ws.title = "TDSheet"
+            ws.append(["header"])
+            for row in rows:
+                ws.append(row)
+            path = tmp_path / "import.xlsx"
+            wb.save(path)
+            return path
+
+        return write_workbook
+
+    def test_load_from_xlsx(self, db, write_workbook):
+        from internal_api.models import Shop, Warehouse
+        from products.models import Product, ProductUnit
+
+        shop = Shop.objects.create(name="Импорт", address="Импортная, 1")
+        path = write_workbook(
+            [
+                [None, "Поставщик", "Импортный товар", 4810000000001, "кг", 10, 12],
+                [None, "Поставщик", "Импортный товар", 4810000000001, "кг", 10, 12],
+                [None, "Поставщик", "Другой товар", None, None, 1, 2],
+                [None, "Поставщик", None, None, None, None, None],
+            ]
+        )
+        call_command("load_from_xlsx", path, shop=shop.id, chunk_size=2)
+
+        assert Product.objects.filter(name="Импортный товар").count() == 1
+        product_unit = ProductUnit.objects.get(product__name="Импортный товар")
+        assert product_unit.unit.name == "кг"
+        assert product_unit.barcode == 4810000000001
+        warehouse = Warehouse.objects.get(shop=shop, product_unit=product_unit)
+        assert warehouse.margin == 20
+        assert warehouse.balance.remaining == 0
+        assert Warehouse.objects.filter(shop=shop).count() == 2
+
+    def test_load_receipts(self, db, write_workbook):
+        from internal_api.models import Batch, ReceiptDocument, Warehouse
+
+        row = [
+            "Импортная, 2",
+            "Поступление товаров и услуг 00001 от 01.06.2022 10:00:00",
+            "АА 0000001",
+            None,
+            "Поставщик",
+            "Договор № 1 от 01.01.2022г.",
+            "Принятый товар",
+            4810000000002,
+            2,
+            "10",
+            "15",
+            "20%",
+        ]
+        path = write_workbook([row, row, row])
+        for _ in range(2):
+            call_command("load_receipts", path, chunk_size=2)
+
+        receipt = ReceiptDocument.objects.get(number="00001")
+        assert receipt.warehouse_records.count() == 3
+        warehouse = Warehouse.objects.get(product_unit__product__name="Принятый товар")
+        assert warehouse.balance.remaining == 6
+        batch = Batch.objects.get()
+        assert batch.product_unit_id == warehouse.product_unit_id
+
+    def test_load_receipts_failed_chunk(self, db, write_workbook, monkeypatch):
+        from internal_api import balances
+        from internal_api.models import Batch, WarehouseRecord
+        from products.models import MeasurementUnit, Product, ProductUnit
+
+        # chunks share the product unit, and so the batch
+        ProductUnit.objects.create(
+            product=Product.objects.create(name="Принятый товар"),
+            unit=MeasurementUnit.objects.get_or_create(name="шт")[0],
+        )
+        apply_records = balances.apply_records
+        calls = []
+
+        def failing_apply_records(records):
+            calls.append(records)
+            if len(calls) == 1:
+                raise RuntimeError("connection lost")
+            apply_records(records)
+
+        monkeypatch.setattr(balances, "apply_records", failing_apply_records)
+        row = [
+            "Импортная, 2",
+            "Поступление товаров и услуг 00001 от 01.06.2022 10:00:00",
+            "АА 0000001",
+            None,
+            "Поставщик",
+            "Договор № 1 от 01.01.2022г.",
+            "Принятый товар",
+            4810000000002,
+            2,
+            "10",
+            "15",
+            "20%",
+        ]
+        # the first chunk creates a batch and is rolled back
+        call_command("load_receipts", write_workbook([row, row, row]), chunk_size=2)
+
+        record = WarehouseRecord.objects.get()
+        assert Batch.objects.filter(pk=record.batch_id).exists()
+
+
+class TestResponseCache:
+    @pytest.fixture
+    def products(self, request, db):
+        call_command(
+            "loaddata",
+            Path(request.fspath).parent / "fixtures" / "products.json",
+        )
+
+    def test_etag(self, products, client, django_assert_num_queries):
+        url = url_for("products:product-list")
+        result = client.get(url)
+        assert result.status_code == HTTP_200_OK
+        etag = result["ETag"]
+
+        with django_assert_num_queries(0):
+            result = client.get(url)
+        assert result.status_code == HTTP_200_OK
+        assert result["ETag"] == etag
+
+        result = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert result.status_code == HTTP_304_NOT_MODIFIED
+        assert not result.content
+
+    def test_hosts(self, products, client, settings):
+        settings.ALLOWED_HOSTS = ["testserver", "shop.example"]
+        url = url_for("products:product-list")
+        assert "http://testserver/" in client.get(url).content.decode()
+        # absolute URLs are built for every host
+        content = client.get(url, HTTP_HOST="shop.example").content.decode()
+        assert "testserver" not in content
+        assert "http://shop.example/" in content
+
+    def test_invalidation(self, products, client):
+        from products.models import Product
+
+        url = url_for("products:product-list")
+        etag = client.get(url)["ETag"]
+        # different query parameters are cached separately
+        assert client.get(url, {"page_size": 1})["ETag"] != etag
+
+        product = Product.objects.get(name=client.get(url).json()["results"][0]["name"])
+        product.name = "Переименованный товар"
+        product.save()
+        result = client.get(url)
+        assert result["ETag"] != etag
+        assert "Переименованный товар" in result.content.decode()
+
+    def test_bulk_update_invalidation(self, products, admin_client):
+        from utils.cache import get_tag_versions
+
+        versions = get_tag_versions(["catalog"])
+        # a queryset update, no signals
+        result = admin_client.post(
+            url_for("products:category-change-archive-status"),
+            {"instances": [CATEGORY_ID]},
+            content_type="application/json",
+        )
+        assert result.status_code == HTTP_200_OK
+        assert get_tag_versions(["catalog"]) != versions
+
+    def test_authenticated(self, products, authenticated_client):
+        result = authenticated_client.get(url_for("products:product-list"))
+        assert result.status_code == HTTP_200_OK
+        assert not result.has_header("ETag")
+
+
+class TestCategoryTree:
+    @pytest.fixture
+    def categories(self, request, db):
+        call_command(
+            "loaddata",
+            Path(request.fspath).parent / "fixtures" / "products.json",
+        )
+
+    @staticmethod
+    def get_names(categories: list) -> dict:
+        return {
+            category["name"]: TestCategoryTree.get_names(category["children"])
+            for category in categories
+        }
+
+    def test_list(self, categories, client, django_assert_max_num_queries):
+        with django_assert_max_num_queries(1):
+            result = client.get(url_for("products:category-list"))
+        assert result.status_code == HTTP_200_OK
+        assert self.get_names(result.json()) == {
+            "Продукция собственного производства": {
+                "Хлебобулочные изделия": {"Хлеб": {}},
+                "Кулинария": {},
+            },
+            "Розничный товар и сырьё": {
+                "Розничный товар": {"Напитки": {}},
+                "Сырьё": {},
+                "Бакалея": {},
+            },
+        }
+
+    def test_snapshot_invalidation(self, categories, authenticated_client):
+        from products.models import Category
+
+        url = url_for("products:category-list")
+        authenticated_client.get(url)
+        Category.objects.filter(name="Хлеб").update(name="Батоны")
+        # no signals, the snapshot is stale
+        assert "Батоны" not in authenticated_client.get(url).content.decode()
+
+        Category.objects.get(name="Батоны").save()
+        assert "Батоны" in authenticated_client.get(url).content.decode()
+
+    def test_snapshot_hosts(self, categories, authenticated_client, settings):
+        from products.models import Category
+
+        settings.ALLOWED_HOSTS = ["testserver", "shop.example"]
+        url = url_for("products:category-list")
+        authenticated_client.get(url)
+        Category.objects.filter(name="Хлеб").update(name="Батоны")
+        # another host has a snapshot of its own
+        result = authenticated_client.get(url, HTTP_HOST="shop.example")
+        assert "Батоны" in result.content.decode()
+
+    def test_detail(self, categories, client, django_assert_max_num_queries):
+        with django_assert_max_num_queries(1):
+            result = client.get(url_for("products:category-detail", id=1))
+        assert result.status_code == HTTP_200_OK
+        assert self.get_names(result.json()["children"]) == {
+            "Розничный товар": {"Напитки": {}},
+            "Сырьё": {},
+            "Бакалея": {},
+        }
+
+    def test_detail_missing(self, categories, client):
+        assert (
+            client.get(url_for("products:category-detail", id=100)).status_code == 404
+        )
@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import pytest
+from django.core.management import call_command
+
+from internal_api import search
+from internal_api.models import SearchIndexChange, Supplier, Warehouse
+
+
+@pytest.fixture
+def warehouses(db, request):
+    call_command(
+        "loaddata",
+        Path(request.fspath).parent / "fixtures" / "shops.json",
+        Path(request.fspath).parent / "fixtures" / "units.json",
+        Path(request.fspath).parent / "fixtures" / "warehouses.json",
+    )
+
+
+def get_changes():
+    return set(SearchIndexChange.objects.values_list("model", "object_id"))
+
+
+def test_fixtures_queued(warehouses):
+    assert ("internal_api.Warehouse", "1") in get_changes()
+    # not indexed, and not a document dependency
+    assert not SearchIndexChange.objects.filter(model="products.MeasurementUnit")
+
+
+def test_related_changes(warehouses):
+    from products.models import Product
+
+    SearchIndexChange.objects.all().delete()
+    product = Product.objects.get(id=3)
+    product.name = "Переименованный товар"
+    product.save()
+    assert get_changes() == {("products.Product", "3")}
+
+    changes = list(SearchIndexChange.objects.all())
+    assert search.get_changed_objects(changes) == {Warehouse: {3, 4}}
+
+
+def test_deleted(db):
+    supplier = Supplier.objects.create(name="Поставщик")
+    pk = supplier.pk
+    supplier.delete()
+
+    changes = list(SearchIndexChange.objects.filter(model="internal_api.Supplier"))
+    assert len(changes) == 2
+    # missing objects are removed from the index
+    assert search.get_changed_objects(changes) == {Supplier: {pk}}
+
+
+def test_disconnected(db):
+    from internal_api.management.commands.loaddata import can_bulk_create
+
+    with search.disconnected():
+        # fixtures of the model are bulk created
+        assert can_bulk_create(Supplier)
+        Supplier.objects.create(name="Поставщик 1")
+    assert not SearchIndexChange.objects.filter(model="internal_api.Supplier")
+
+    Supplier.objects.create(name="Поставщик 2")
+    assert SearchIndexChange.objects.filter(model="internal_api.Supplier").count() == 1
@@ -119,6 +119,81 @@ class TestWarehouseViewset(ViewSetTest):
     class TestDetail(UsesGetMethod, UsesDetailEndpoint, Returns200):
         id = static_fixture(1)
 
+    class TestAsOfBeforeRecords(UsesGetMethod, UsesListEndpoint, Returns200):
+        @pytest.fixture
+        def list_url(self, list_url):
+            return list_url + "?as_of=2022-02-28"
+
+        def test_remaining(self, json):
+            assert {x["remaining"] for x in json} == {"0.0000"}
+
+    class TestAsOfSnapshot(UsesGetMethod, UsesListEndpoint, Returns200):
+        @pytest.fixture
+        def list_url(self, list_url, staff_client):
+            # fixture records are dated 2022-03-02 in local time,
+            # the snapshot is followed by another movement
+            call_command("snapshot_balances", "--date", "2022-03-02")
+            staff_client.post(
+                url_for("internal_api:warehouserecord-list", shop_id=1, warehouse_id=1),
+                {"quantity": -1, "document": 1},
+            )
+            return list_url + "?as_of=2022-03-02&remaining_min=100"
+
+        def test_remaining(self, json):
+            assert [(x["id"], x["remaining"]) for x in json] == [(1, "100.0000")]
+
+        def test_snapshots(self, json):
+            from internal_api.models import WarehouseSnapshot
+
+            assert WarehouseSnapshot.objects.filter(date="2022-03-02").count() == 4
+
+    class TestAsOfChangedSnapshot(UsesGetMethod, UsesListEndpoint, Returns200):
+        @pytest.fixture
+        def list_url(self, list_url):
+            from internal_api.models import WarehouseRecord
+
+            # records are changed after the snapshot of their day is taken
+            call_command("snapshot_balances", "--date", "2022-03-02")
+            WarehouseRecord.objects.get(pk=1).delete()
+            record = WarehouseRecord.objects.get(pk=2)
+            record.quantity = 40
+            record.save()
+            return list_url + "?as_of=2022-03-02"
+
+        def test_remaining(self, json):
+            assert {(x["id"], x["remaining"]) for x in json} >= {
+                (1, "0.0000"),
+                (2, "40.0000"),
+            }
+
+
+class TestWarehouseForScales:
+    @pytest.fixture
+    def warehouses(self, db, request):
+        call_command(
+            "loaddata",
+            Path(request.fspath).parent / "fixtures" / "units.json",
+            Path(request.fspath).parent / "fixtures" / "warehouses.json",
+        )
+
+    def test_grouping(self, warehouses, staff_client, django_assert_max_num_queries):
+        from products.models import Category, Product
+
+        subcategory = Category.objects.create(name="Подкатегория", parent_id=2)
+        Product.objects.filter(id=3).update(category=subcategory)
+
+        url = url_for("internal_api:warehouseforscales-list", shop_id=1)
+        result = staff_client.get(url)
+        assert result.status_code == 200
+        # products of subcategories are grouped by root categories
+        assert {
+            category_id: sorted(item["id"] for item in items)
+            for category_id, items in result.json().items()
+        } == {"1": [2], "2": [1, 3, 4]}
+
+        with django_assert_max_num_queries(3):
+            staff_client.get(url)
+
 
 class TestWarehouseRecordViewset(ViewSetTest):
     @pytest.fixture
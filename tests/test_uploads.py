@@ -0,0 +1,148 @@
+from datetime import timedelta
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from openpyxl import Workbook
+from pytest_drf.util import url_for
+from rest_framework import status
+
+from internal_api import uploads
+from internal_api.models import UploadJob
+from products.models import Product, ProductUnit
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+
+
+@pytest.fixture
+def xlsx_file(tmp_path):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Наименование", "Цена", "Штрихкод", "НДС", "Ед."])
+    ws.append(["Загруженный товар 1", 10, 4810000000011, "20%", "кг"])
+    ws.append(["Загруженный товар 2", 12.5, None, 10, None])
+    ws.append(["Без цены", None, None, None, None])
+    ws.append([None, 5, None, None, None])
+    ws.append(["Загруженный товар 3", "7,5 руб.", None, None, None])
+    ws.append(["Загруженный товар 4", 3, 4810000000014, "10%", "шт"])
+    path = tmp_path / "catalog.xlsx"
+    wb.save(path)
+    return SimpleUploadedFile(
+        "catalog.xlsx",
+        path.read_bytes(),
+        content_type="application/vnd.ms-excel",
+    )
+
+
+@pytest.fixture
+def job(db, media_root, xlsx_file):
+    return UploadJob.objects.create(
+        file=xlsx_file,
+        columns={
+            "name_col": 0,
+            "price_col": 1,
+            "barcode_col": 2,
+            "vat_col": 3,
+            "measure_unit_col": 4,
+            "first_row": 0,
+        },
+    )
+
+
+def test_read_rows(job):
+    with job.file.open("rb") as file:
+        rows = uploads.to_records(uploads.read_rows(file, job.columns))
+    assert [row["name"] for row in rows] == [
+        "Загруженный товар 1",
+        "Загруженный товар 2",
+        "Загруженный товар 4",
+    ]
+    assert rows[0]["vat_rate"] == 20
+    assert rows[0]["barcode"] == 4810000000011
+    assert rows[1]["unit"] == uploads.DEFAULT_UNIT
+
+
+def test_upload(db, media_root, staff_client, xlsx_file):
+    result = staff_client.post(
+        url_for("internal_api:csv-upload"),
+        {"csv_file": xlsx_file, "name_col": 0, "price_col": 1, "first_row": 0},
+    )
+    assert result.status_code == status.HTTP_202_ACCEPTED
+    assert result.json()["status"] == "pending"
+
+    job_id = result.json()["id"]
+    uploads.run(job_id, chunk_size=2)
+    result = staff_client.get(url_for("internal_api:uploadjob-detail", id=job_id))
+    assert result.json()["status"] == "done"
+    assert result.json()["rows_done"] == result.json()["rows_total"] == 3
+    assert result.json()["rows_per_second"] > 0
+    assert Product.objects.filter(name__startswith="Загруженный").count() == 3
+
+
+def test_upload_forbidden(db, authenticated_client):
+    result = authenticated_client.post(url_for("internal_api:csv-upload"), {})
+    assert result.status_code == status.HTTP_403_FORBIDDEN
+
+
+def test_resume(job, staff_client, monkeypatch):
+    save_rows = uploads.save_rows
+    saved = []
+
+    def failing_save_rows(rows):
+        if saved:
+            raise RuntimeError("connection lost")
+        save_rows(rows)
+        saved.extend(rows)
+
+    monkeypatch.setattr(uploads, "save_rows", failing_save_rows)
+    uploads.run(job.id, chunk_size=2)
+    job.refresh_from_db()
+    assert job.status == UploadJob.STATUSES.failed
+    assert job.rows_done == 2
+    assert "connection lost" in job.error
+
+    # only the rest of the rows is written again
+    monkeypatch.setattr(uploads, "save_rows", lambda rows: saved.extend(rows))
+    result = staff_client.post(url_for("internal_api:uploadjob-resume", id=job.id))
+    assert result.status_code == status.HTTP_202_ACCEPTED
+    uploads.run(job.id, chunk_size=2)
+    job.refresh_from_db()
+    assert job.status == UploadJob.STATUSES.done
+    assert [row["name"] for row in saved] == [
+        "Загруженный товар 1",
+        "Загруженный товар 2",
+        "Загруженный товар 4",
+    ]
+    assert (
+        ProductUnit.objects.get(product__name="Загруженный товар 1").unit.name == "кг"
+    )
+
+    result = staff_client.post(url_for("internal_api:uploadjob-resume", id=job.id))
+    assert result.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_resume_interrupted(job, staff_client):
+    # the worker died in the middle of the job
+    UploadJob.objects.filter(pk=job.pk).update(
+        status=UploadJob.STATUSES.running,
+        rows_done=2,
+        progressed_at=timezone.now(),
+    )
+    result = staff_client.post(url_for("internal_api:uploadjob-resume", id=job.id))
+    assert result.status_code == status.HTTP_400_BAD_REQUEST
+    uploads.run(job.id, chunk_size=2)
+    job.refresh_from_db()
+    assert job.status == UploadJob.STATUSES.running
+
+    UploadJob.objects.filter(pk=job.pk).update(
+        progressed_at=timezone.now() - UploadJob.STALE_AFTER - timedelta(minutes=1)
+    )
+    result = staff_client.post(url_for("internal_api:uploadjob-resume", id=job.id))
+    assert result.status_code == status.HTTP_202_ACCEPTED
+    uploads.run(job.id, chunk_size=2)
+    job.refresh_from_db()
+    assert job.status == UploadJob.STATUSES.done
+    assert job.run_rows == 1
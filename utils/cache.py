@@ -0,0 +1,138 @@
+"""
+Response cache for read-heavy public endpoints.
+
+A cached response is keyed by the request path, query parameters, rendering
+format, and current versions of the tags the view depends on (e.g. "catalog").
+Invalidating a tag replaces its version, so responses that depend on it
+become unreachable and expire on their own. Tags are invalidated by signal
+receivers (see `invalidate_on_change`) and by views after successful writes,
+which covers queryset updates.
+
+Responses carry ETags, and requests with a matching `If-None-Match` get
+"304 Not Modified" without the response body.
+"""
+import hashlib
+import json
+import uuid
+from typing import List, Sequence
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers, quote_etag
+from django.utils.http import parse_etags
+from rest_framework.permissions import SAFE_METHODS
+
+KEY_PREFIX = "response-cache"
+
+
+def get_tag_key(tag: str) -> str:
+    return f"{KEY_PREFIX}:tag:{tag}"
+
+
+def get_tag_versions(tags: Sequence[str]) -> List[str]:
+    keys = [get_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*tags: str):
+    """
+    Invalidate responses depending on tags. This is repeated once the data is
+    committed, as responses may be cached from the old data in the meantime.
+    """
+    keys = [get_tag_key(tag) for tag in tags]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_on_change(tag: str, *models):
+    """Invalidate a tag when objects of given models are saved or deleted."""
+
+    def receiver(sender, **kwargs):
+        invalidate(tag)
+
+    for model in models:
+        dispatch_uid = f"{KEY_PREFIX}:{tag}:{model._meta.label}"
+        post_save.connect(receiver, sender=model, weak=False, dispatch_uid=dispatch_uid)
+        post_delete.connect(
+            receiver, sender=model, weak=False, dispatch_uid=dispatch_uid
+        )
+
+
+class CacheInvalidatingMixin:
+    """Invalidates `cache_tags` after successful writes through the view."""
+
+    cache_tags: Sequence[str] = ()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            invalidate(*self.cache_tags)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class CachedResponseMixin(CacheInvalidatingMixin):
+    """
+    Caches `list` and `retrieve` responses of anonymous users (responses for
+    users may contain their favourites and such). The browsable API is not
+    cached.
+    """
+
+    cache_timeout = 600
+
+    def get_cache_key(self, request) -> str:
+        key = json.dumps(
+            [
+                # responses contain absolute URLs
+                request.scheme,
+                request.get_host(),
+                request.path,
+                sorted(request.query_params.lists()),
+                request.accepted_renderer.format,
+                get_tag_versions(self.cache_tags),
+            ]
+        )
+        return f"{KEY_PREFIX}:response:{hashlib.sha1(key.encode()).hexdigest()}"
+
+    def get_cached_response(self, request, handler, *args, **kwargs):
+        if request.user.is_authenticated or request.accepted_renderer.format == "api":
+            return handler(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            response.render()
+            cached = {
+                "content": response.content,
+                "content_type": response["Content-Type"],
+                "etag": quote_etag(hashlib.md5(response.content).hexdigest()),
+            }
+            cache.set(key, cached, self.cache_timeout)
+
+        if cached["etag"] in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                cached["content"],
+                content_type=cached["content_type"],
+            )
+        response["ETag"] = cached["etag"]
+        patch_vary_headers(response, ("Accept", "Authorization", "Cookie"))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(request, super().retrieve, *args, **kwargs)
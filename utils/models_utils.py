@@ -1,18 +1,20 @@
 import sys
 from io import BytesIO
 from random import randint
-from typing import Literal
+from typing import Iterable, List, Literal, Optional
 
+from django.apps import apps
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.core.validators import RegexValidator
+from django.db import transaction
 from django.db.models import (
     CharField,
     DateTimeField,
+    Exists,
     Func,
     JSONField,
     Model,
     OuterRef,
-    Q,
     QuerySet,
     Subquery,
 )
@@ -36,6 +38,10 @@ class Timestampable(Model):
 class Enumerable(Model):
     """
     If a document number is not provided, generate one.
+
+    Numbers are given out by a counter per table and prefix
+    (`internal_api.models.NumberCounter`), which is started after the latest
+    existing number.
     """
 
     NUMBER_PREFIX = ""
@@ -44,24 +50,74 @@ class Enumerable(Model):
     number = CharField("номер", max_length=255, unique=True, blank=True)
 
     def save(self, *args, **kwargs):
-        if self.pk is None and not self.number:
-            new_number = 1
-            for latest_number in (
-                self._meta.model.objects.filter(
-                    number__startswith=self.NUMBER_PREFIX,
-                )
-                .order_by("-number")
-                .values_list("number", flat=True)
-                .iterator(chunk_size=1)
-            ):
-                try:
-                    new_number = int(latest_number.lstrip(self.NUMBER_PREFIX)) + 1
-                    break
-                except ValueError:
-                    pass
-
-            self.number = self.NUMBER_PREFIX + str(new_number).zfill(self.NUMBER_DIGITS)
-        super().save(*args, **kwargs)
+        # a number is reserved and saved together, so a failed save leaves
+        # no gap
+        with transaction.atomic():
+            if self.pk is None and not self.number:
+                self.assign_numbers([self])
+            else:
+                self.advance_counter(self.number)
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def get_counter_name(cls) -> str:
+        # numbers are unique within the table that holds them
+        table = cls._meta.get_field("number").model._meta.db_table
+        return f"{table}:{cls.NUMBER_PREFIX}"
+
+    @classmethod
+    def parse_number(cls, number: str) -> Optional[int]:
+        """The numeric part of a number of the series, if any."""
+        if number.startswith(cls.NUMBER_PREFIX):
+            try:
+                return int(number[len(cls.NUMBER_PREFIX) :])
+            except ValueError:
+                pass
+        return None
+
+    @classmethod
+    def get_latest_number(cls) -> int:
+        for latest_number in (
+            cls._base_manager.filter(
+                number__startswith=cls.NUMBER_PREFIX,
+            )
+            .order_by("-number")
+            .values_list("number", flat=True)
+            .iterator(chunk_size=1)
+        ):
+            value = cls.parse_number(latest_number)
+            if value is not None:
+                return value
+        return 0
+
+    @classmethod
+    def advance_counter(cls, number: str):
+        """Keep numbers given out by hand from being given out again."""
+        value = cls.parse_number(number)
+        if value is not None:
+            counter_model = apps.get_model("internal_api", "NumberCounter")
+            counter_model.advance(cls.get_counter_name(), value)
+
+    @classmethod
+    def get_next_number(cls, count: int = 1) -> int:
+        """Reserve `count` consecutive numbers, return the first of them."""
+        counter_model = apps.get_model("internal_api", "NumberCounter")
+        return counter_model.reserve(
+            cls.get_counter_name(),
+            count,
+            get_initial_value=cls.get_latest_number,
+        )
+
+    @classmethod
+    def assign_numbers(cls, objects: Iterable["Enumerable"]):
+        """Number the objects lacking numbers, e.g. before `bulk_create`."""
+        objects = [obj for obj in objects if not obj.number]
+        if not objects:
+            return
+        new_number = cls.get_next_number(len(objects))
+        for obj in objects:
+            obj.number = cls.NUMBER_PREFIX + str(new_number).zfill(cls.NUMBER_DIGITS)
+            new_number += 1
 
     class Meta:
         abstract = True
@@ -120,23 +176,51 @@ def build_offer_subquery(
     by: Literal["condition", "benefit"],
     outer: str = "pk",
 ) -> QuerySet:
-    by += "__range__"
-    return (
-        sqs.filter(
-            Q(**{f"{by}includes_all": True})
-            | Q(**{f"{by}include_product_units": OuterRef(outer)})
-            | Q(**{f"{by}include_products__units": OuterRef(outer)})
-            | Q(**{f"{by}include_categories__products__units": OuterRef(outer)})
-        )
-        .exclude(
-            Q(**{f"{by}exclude_product_units": OuterRef(outer)})
-            | Q(**{f"{by}exclude_products__units": OuterRef(outer)})
-            | Q(**{f"{by}exclude_categories__products__units": OuterRef(outer)})
+    """
+    Filter offers to the ones which condition (or benefit) range covers
+    the outer product unit, using `discounts.RangeMembership`.
+    """
+    # a range covers a product unit once, so offers are not repeated
+    return sqs.filter(
+        **{f"{by}__range__range_memberships__product_unit": OuterRef(outer)}
+    ).order_by("pk")
+
+
+def get_cached_subtrees(nodes: QuerySet) -> List[Model]:
+    """
+    MPTT nodes with their descendants, loaded by a single query in tree order.
+    Children are cached on the nodes, so `get_children` makes no queries.
+    """
+    model = nodes.model
+    opts = model._mptt_meta
+    subtrees = (
+        model._tree_manager.filter(
+            Exists(
+                nodes.filter(
+                    **{
+                        opts.tree_id_attr: OuterRef(opts.tree_id_attr),
+                        f"{opts.left_attr}__lte": OuterRef(opts.left_attr),
+                        f"{opts.right_attr}__gte": OuterRef(opts.right_attr),
+                    }
+                )
+            ),
         )
-        .order_by("pk")
-        .distinct("pk")
+        .annotate(is_top=Exists(nodes.filter(pk=OuterRef("pk"))))
+        .order_by(opts.tree_id_attr, opts.left_attr)
     )
 
+    loaded = {}
+    tops = []
+    for node in subtrees:
+        node._cached_children = []
+        parent = loaded.get(getattr(node, f"{opts.parent_attr}_id"))
+        if parent is not None:
+            parent._cached_children.append(node)
+        loaded[node.pk] = node
+        if node.is_top:
+            tops.append(node)
+    return tops
+
 
 class LiteralJSONField(JSONField):
     """Returns list or dict instead of bytes."""
@@ -46,10 +46,16 @@ class BulkUpdateViewSetMixin:
         serialized_data = BulkUpdateSerializer(data=request.data)
         serialized_data.is_valid(raise_exception=True)
         instances = serialized_data.data["instances"]
+        ids = []
         for instance in instances:
-            self.queryset.filter(id=instance.pop("id")).update(**instance)
+            ids.append(instance.pop("id"))
+            self.queryset.filter(id=ids[-1]).update(**instance)
+        self.perform_bulk_update(ids)
         return Response(status=status.HTTP_200_OK)
 
+    def perform_bulk_update(self, ids):
+        """Called after objects are updated, skipping the signals."""
+
 
 class ChangeDestroyToArchiveMixin:
     def destroy(self, request, *args, **kwargs):